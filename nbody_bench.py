@@ -0,0 +1,253 @@
+from contextlib import contextmanager
+from importlib import import_module
+from itertools import combinations
+from multiprocessing import get_context
+from resource import RUSAGE_SELF, getrusage
+from sys import argv, platform
+from time import perf_counter
+import json
+import numpy as np
+
+import nbody_engines
+import nbody_numpy
+
+"""
+    N-body simulation, unified benchmark harness.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    Every variant records its runtime as a docstring comment, measured once,
+    by hand, on whatever machine was around. This harness drives each backend
+    through the same adapter, on the same random system, and reports numbers
+    that can be compared from run to run:
+
+        median, IQR   -- of :repeats timed runs, after :warmup untimed ones
+                         (which also absorb JIT compilation)
+        pairs/s       -- pair interactions per second at the median
+        peak RSS      -- of a fresh interpreter that only ran that backend
+        energy error  -- relative difference from `nbody_numpy` after the
+                         same steps, so a fast but wrong backend shows up
+
+    Each (backend, N) case runs in its own spawned process, so imports, JIT
+    caches and memory peaks do not leak between cases. A backend whose
+    dependencies are missing (Numba, or a `cythonize -i` build of
+    `nbody_cython`) is reported with an error instead of failing the run.
+    `nbody_cython` is never compiled through pyximport here, which would
+    build it without OpenMP and time its threads running serially.
+
+    Print JSON results from the terminal with:
+
+        $ python nbody_bench.py [N,N,...] [STEPS] [BACKEND,BACKEND,...]
+"""
+
+# Largest relative energy difference from the reference still counted as correct.
+ENERGY_TOLERANCE = 1e-8
+
+
+def _bodies(positions, velocities, masses):
+    """A {name : ([x, y, z], [vx, vy, vz], m)} dictionary for the dict-based variants."""
+
+    return {'body{}'.format(i): (list(r), list(v), float(m))
+            for (i, (r, v, m)) in enumerate(zip(positions.tolist(), velocities.tolist(), masses))}
+
+
+@contextmanager
+def _installed(module, bodies):
+    """Swap :bodies in as `module.BODIES`, restoring the original on exit."""
+
+    original = module.BODIES
+    module.BODIES = bodies
+
+    try:
+        yield
+    finally:
+        module.BODIES = original
+
+
+def _global_dict(name, stepped):
+    """Adapter for variants that advance a module-level BODIES dictionary.
+
+    The random system is only installed while `run` or `energy` execute, so
+    the module's own BODIES (which other callers import) is left untouched.
+    """
+
+    def setup(positions, velocities, masses, dt):
+        module = import_module(name)
+        bodies = _bodies(positions, velocities, masses)
+
+        def run(steps):
+            with _installed(module, bodies):
+                if stepped:
+                    module.advance(dt, steps)
+                else:
+                    for _ in range(steps):
+                        module.advance(dt)
+
+        def energy():
+            with _installed(module, bodies):
+                return module.report_energy()
+
+        return run, energy
+
+    return setup
+
+
+def _nbody_3(positions, velocities, masses, dt):
+    module = import_module('nbody_3')
+    bodies = _bodies(positions, velocities, masses)
+
+    def run(steps):
+        for _ in range(steps):
+            module.advance(dt, bodies)
+
+    return run, lambda: module.report_energy(bodies)
+
+
+def _key_pairs(name):
+    """Adapter for variants that take (bodies, body_names, key_pairs)."""
+
+    def setup(positions, velocities, masses, dt):
+        module = import_module(name)
+        bodies = _bodies(positions, velocities, masses)
+        body_names = list(bodies)
+        key_pairs = list(combinations(body_names, 2))
+
+        def run(steps):
+            module.advance(dt, steps, bodies, body_names, key_pairs)
+
+        return run, lambda: module.report_energy(bodies, body_names, key_pairs)
+
+    return setup
+
+
+def _arrays(name):
+    """Adapter for engines with the `nbody_numpy.advance` signature."""
+
+    def setup(positions, velocities, masses, dt):
+        if name == 'nbody_cython':
+            module = nbody_engines.load('cython')
+        else:
+            module = import_module(name)
+
+        def run(steps):
+            module.advance(dt, steps, positions, velocities, masses)
+
+        return run, lambda: module.report_energy(positions, velocities, masses)
+
+    return setup
+
+
+BACKENDS = {
+    'nbody': _global_dict('nbody', stepped=False),
+    'nbody_1': _global_dict('nbody_1', stepped=True),
+    'nbody_2': _global_dict('nbody_2', stepped=False),
+    'nbody_3': _nbody_3,
+    'nbody_4': _global_dict('nbody_4', stepped=False),
+    'nbody_iter': _key_pairs('nbody_iter'),
+    'nbody_opt': _key_pairs('nbody_opt'),
+    'nbody_numpy': _arrays('nbody_numpy'),
+    'nbody_numba': _arrays('nbody_numba'),
+    'nbody_cython': _arrays('nbody_cython'),
+}
+
+
+def _peak_rss():
+    """Peak resident set size of this process, in bytes."""
+
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes.
+    return peak if platform == 'darwin' else peak * 1024
+
+
+def measure(backend, n, steps, dt=1e-4, warmup=1, repeats=5, seed=0):
+    """Time one backend on a random :n body system (in this process).
+
+    :param backend: name of an adapter in BACKENDS
+    :param n: number of bodies
+    :param steps: number of timesteps per timed run
+    :param dt: timestep
+    :param warmup: number of untimed runs first
+    :param repeats: number of timed runs
+    :param seed: random seed of the system
+    :return: dict of timings, final energy and peak RSS (or of the error)
+    """
+
+    initial = nbody_numpy.random_system(n, seed)
+    times = []
+
+    try:
+        for k in range(warmup + repeats):
+            (positions, velocities, masses) = (a.copy() for a in initial)
+            (run, energy) = BACKENDS[backend](positions, velocities, masses, dt)
+
+            start = perf_counter()
+            run(steps)
+            elapsed = perf_counter() - start
+
+            if k >= warmup:
+                times.append(elapsed)
+
+    except ImportError as error:
+        return {'backend': backend, 'n': n, 'steps': steps, 'error': str(error)}
+
+    (q1, median, q3) = np.percentile(times, [25, 50, 75]).tolist()
+
+    return {'backend': backend, 'n': n, 'steps': steps,
+            'median': median, 'iqr': q3 - q1, 'times': times,
+            'pairs_per_second': steps * n * (n - 1) / 2 / median,
+            'peak_rss': _peak_rss(), 'energy': float(energy())}
+
+
+def suite(sizes=(64, 256), steps=10, backends=None, dt=1e-4, warmup=1, repeats=5, seed=0):
+    """Benchmark every backend at every size, each case in a fresh process.
+
+    :param sizes: numbers of bodies
+    :param steps: number of timesteps per timed run
+    :param backends: names in BACKENDS (defaults to all of them)
+    :param dt: timestep
+    :param warmup: number of untimed runs per case
+    :param repeats: number of timed runs per case
+    :param seed: random seed of the system
+    :return: {'config' : {...}, 'results' : [{...}, ...]}
+    """
+
+    backends = list(BACKENDS if backends is None else backends)
+    unknown = set(backends) - set(BACKENDS)
+
+    if unknown:
+        raise ValueError("Unknown backends {} -- expected some of {}.".format(
+            ', '.join(sorted(unknown)), ', '.join(sorted(BACKENDS))))
+
+    context = get_context('spawn')
+    results = []
+
+    for n in sizes:
+
+        # Reference energy after the same steps.
+        (positions, velocities, masses) = nbody_numpy.random_system(n, seed)
+        nbody_numpy.advance(dt, steps, positions, velocities, masses)
+        reference = nbody_numpy.report_energy(positions, velocities, masses)
+
+        for backend in backends:
+            with context.Pool(1) as pool:
+                result = pool.apply(measure, (backend, n, steps, dt, warmup, repeats, seed))
+
+            if 'energy' in result:
+                result['energy_error'] = abs(result['energy'] / float(reference) - 1)
+                result['energy_ok'] = result['energy_error'] < ENERGY_TOLERANCE
+
+            results.append(result)
+
+    return {'config': {'sizes': list(sizes), 'steps': steps, 'dt': dt, 'warmup': warmup,
+                       'repeats': repeats, 'seed': seed, 'energy_tolerance': ENERGY_TOLERANCE},
+            'results': results}
+
+
+if __name__ == '__main__':
+    report = suite(sizes=[int(n) for n in argv[1].split(',')] if len(argv) > 1 else (64, 256),
+                   steps=int(argv[2]) if len(argv) > 2 else 10,
+                   backends=argv[3].split(',') if len(argv) > 3 else None)
+
+    print(json.dumps(report, indent=2))
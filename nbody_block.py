@@ -0,0 +1,210 @@
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+import nbody_integrators
+import nbody_numpy
+
+"""
+    N-body simulation, hierarchical (block) individual timesteps.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    `advance` pushes every body with the same global dt, so one close
+    encounter forces a tiny dt on the whole system. Here each body i gets its
+    own power-of-two step
+
+        dt_i = dt / 2 ** level_i,    level_i in [0, max_level]
+
+    chosen from its free-fall time to its nearest neighbour. Within one block
+    step of size dt time moves in ticks of dt / 2 ** max_level:
+
+        - every body drifts on every tick (cheap, O(N)),
+        - a body is only active when a tick ends its own step; then its
+          acceleration is recomputed (O(N) per active body, so forces cost
+          O(N_active * N) per tick), it gets its closing half kick, picks a
+          new level and gets its opening half kick.
+
+    Steps are kick-drift-kick leapfrog per body, and at the end of each block
+    step every body is synchronized again. A body may only move to a longer
+    step when the current tick lies on that step's grid.
+
+    Compare against a single global timestep from the terminal with:
+
+        $ python nbody_block.py [N]
+"""
+
+# Accuracy parameter: dt_i is at most ETA times body i's free-fall time.
+ETA = 0.02
+MAX_LEVEL = 10
+
+
+def forces(targets, positions, masses, block=nbody_numpy.BLOCK_SIZE):
+    """Accelerations and nearest free-fall times of the :targets bodies.
+
+    :param targets: (A,) indices of the bodies to compute
+    :param positions: (N, 3) array of positions
+    :param masses: (N,) array of masses
+    :param block: number of target bodies handled per batched sweep
+    :return: ((A, 3) accelerations, (A,) free-fall times)
+    """
+
+    acc = np.empty((len(targets), 3))
+    tau = np.empty(len(targets))
+
+    for start in range(0, len(targets), block):
+        rows = targets[start:start + block]
+
+        d = positions[rows, None, :] - positions[None, :, :]
+        r2 = np.einsum('ijk,ijk->ij', d, d)
+        r2[np.arange(len(rows)), rows] = np.inf
+
+        mag = r2 ** -1.5
+        acc[start:start + block] = -np.einsum('ij,ijk->ik', mag * masses, d)
+
+        # Free-fall time sqrt(r^3 / (m_i + m_j)) to the closest-acting body.
+        tau[start:start + block] = np.sqrt(1.0 / np.max(mag * (masses[rows, None] + masses), axis=1))
+
+    return acc, tau
+
+
+def choose_levels(tau, dt, tick, max_level=MAX_LEVEL, eta=ETA):
+    """Pick each body's level from its free-fall time.
+
+    :param tau: (A,) free-fall times
+    :param dt: largest (block) timestep
+    :param tick: current tick within the block step, in [0, 2 ** max_level)
+    :param max_level: deepest level (smallest step is dt / 2 ** max_level)
+    :param eta: accuracy parameter
+    :return: (A,) integer levels
+    """
+
+    wanted = np.ceil(np.log2(dt / (eta * tau)))
+    wanted = np.clip(wanted, 0, max_level).astype(np.int64)
+
+    # A step of level k can only start on a multiple of 2 ** (max_level - k) ticks.
+    if tick:
+        aligned = max_level - ((tick & -tick).bit_length() - 1)
+        wanted = np.maximum(wanted, aligned)
+
+    return wanted
+
+
+def advance(dt, iterations, positions, velocities, masses,
+            max_level=MAX_LEVEL, eta=ETA):
+    """Advance the system by :iterations block steps of :dt (in place).
+
+    :param dt: largest (block) timestep
+    :param iterations: the number of block steps to take
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param max_level: deepest level (smallest step is dt / 2 ** max_level)
+    :param eta: accuracy parameter
+    :return pairs: number of pair interactions evaluated
+    """
+
+    n = len(masses)
+    ticks = 1 << max_level
+    tick_dt = dt / ticks
+
+    everyone = np.arange(n)
+    (acc, tau) = forces(everyone, positions, masses)
+    levels = choose_levels(tau, dt, 0, max_level, eta)
+    pairs = n * (n - 1)
+
+    for _ in range(iterations):
+
+        # Every body starts a step at the beginning of the block.
+        velocities += (0.5 * dt / (1 << levels))[:, None] * acc
+
+        for tick in range(1, ticks + 1):
+            positions += tick_dt * velocities
+
+            # Bodies whose step ends on this tick.
+            active = np.flatnonzero(tick % (ticks >> levels) == 0)
+            if not active.size:
+                continue
+
+            (a, tau) = forces(active, positions, masses)
+            pairs += active.size * (n - 1)
+
+            velocities[active] += (0.5 * dt / (1 << levels[active]))[:, None] * a
+            acc[active] = a
+            levels[active] = choose_levels(tau, dt, tick % ticks, max_level, eta)
+
+            # The last tick closes the block; the next one reopens everyone.
+            if tick < ticks:
+                velocities[active] += (0.5 * dt / (1 << levels[active]))[:, None] * a
+
+    return pairs
+
+
+def planetary_system(n, seed=0):
+    """A star with :n light planets on orbits from 0.05 to 50 length units.
+
+    Orbital periods span more than four orders of magnitude, which is the
+    case individual timesteps are for.
+
+    :param n: number of planets
+    :param seed: random seed
+    :return: (positions, velocities, masses)
+    """
+
+    rng = np.random.default_rng(seed)
+
+    a = np.exp(rng.uniform(np.log(0.05), np.log(50.0), n))
+    phase = rng.uniform(0, 2 * np.pi, n)
+    incline = rng.normal(0, 0.01, n)
+
+    positions = np.zeros((n + 1, 3))
+    velocities = np.zeros((n + 1, 3))
+    masses = np.concatenate(([1.0], rng.uniform(1e-7, 1e-6, n)))
+
+    positions[1:] = a[:, None] * np.stack((np.cos(phase), np.sin(phase), incline), axis=1)
+    velocities[1:] = (a ** -0.5)[:, None] * np.stack((-np.sin(phase), np.cos(phase), 0 * phase), axis=1)
+    nbody_numpy.offset_momentum(velocities, masses, 0)
+
+    return positions, velocities, masses
+
+
+def benchmark(n=200, dt=1.0, iterations=2, max_level=MAX_LEVEL):
+    """Compare block steps against a global leapfrog at the smallest block step.
+
+    :param n: number of planets
+    :param dt: largest (block) timestep
+    :param iterations: number of block steps
+    :param max_level: deepest level
+    :return: {name : (seconds, pair interactions, relative energy error)}
+    """
+
+    results = {}
+
+    (r, v, m) = planetary_system(n)
+    e0 = nbody_numpy.report_energy(r, v, m)
+
+    start = perf_counter()
+    pairs = advance(dt, iterations, r, v, m, max_level)
+    results['block'] = (perf_counter() - start, pairs, abs(nbody_numpy.report_energy(r, v, m) / e0 - 1))
+
+    # A global step has to be the smallest step any body needs at the start.
+    (r, v, m) = planetary_system(n)
+    (_, tau) = forces(np.arange(n + 1), r, m)
+    level = choose_levels(tau, dt, 0, max_level).max()
+    steps = iterations << level
+
+    start = perf_counter()
+    nbody_integrators.advance(dt / (1 << level), steps, r, v, m, 'leapfrog')
+    results['global'] = (perf_counter() - start, steps * (n + 1) * n,
+                         abs(nbody_numpy.report_energy(r, v, m) / e0 - 1))
+
+    for (name, (seconds, pairs, error)) in results.items():
+        print('{:>6s}  {:8.3f}s  {:.3e} pair interactions  energy error {:.2e}'.format(
+            name, seconds, pairs, error))
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(n=int(argv[1]) if len(argv) > 1 else 200)
@@ -0,0 +1,403 @@
+from sys import argv
+from time import perf_counter
+import json
+import lzma
+import zlib
+import numpy as np
+
+import nbody_numpy
+import nbody_trajectory
+
+"""
+    N-body simulation, compressed trajectory codec.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    `nbody_trajectory` stores every snapshot as raw float64, 48 bytes per body,
+    which fills disks quickly on long runs. This codec trades exactness for a
+    user-given tolerance:
+
+        1. positions (and velocities) are quantized onto a grid of spacing
+           2 * tolerance, so every stored value is off by at most tolerance;
+        2. snapshots are grouped in blocks of KEYFRAME_INTERVAL. The first
+           snapshot of a block (the keyframe) is stored whole, every other one
+           as the integer difference from the previous snapshot. Differences
+           are taken on the quantized grid, so errors never accumulate;
+        3. differences are zigzag-mapped to unsigned integers and bit-packed
+           at the narrowest width that fits each snapshot;
+        4. each block is compressed with zlib or lzma.
+
+    The footer holds an index of block offsets, so snapshot k is read by
+    decoding only its own block. Compare against raw float64 with:
+
+        $ python nbody_codec.py [N]
+"""
+
+MAGIC = b'NBZTRJ01'
+KEYFRAME_INTERVAL = 64
+
+# Largest quantized magnitude. Keyframe differences can be twice as large and
+# are then doubled by the zigzag map, so this keeps both inside int64.
+QUANTIZED_LIMIT = 2.0 ** 61
+
+COMPRESSORS = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+
+def zigzag(values):
+    """Map signed integers to unsigned ones, small magnitudes to small values."""
+
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def unzigzag(values):
+    """Invert :zigzag."""
+
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def pack_bits(values, width):
+    """Pack unsigned 64-bit :values into a byte string using :width bits each."""
+
+    if not width:
+        return b''
+
+    bits = np.unpackbits(values.astype('>u8').view(np.uint8).reshape(-1, 8), axis=1)
+
+    return np.packbits(bits[:, 64 - width:]).tobytes()
+
+
+def unpack_bits(data, width, count):
+    """Invert :pack_bits for :count values."""
+
+    if not width:
+        return np.zeros(count, dtype=np.uint64)
+
+    bits = np.zeros((count, 64), dtype=np.uint8)
+    bits[:, 64 - width:] = np.unpackbits(np.frombuffer(data, dtype=np.uint8),
+                                         count=count * width).reshape(count, width)
+
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def _encode_rows(quantized):
+    """Delta-encode and bit-pack (S, N, 3) quantized values into bytes."""
+
+    deltas = np.diff(quantized, axis=0, prepend=np.zeros_like(quantized[:1]))
+    codes = zigzag(deltas.reshape(len(deltas), -1))
+
+    widths = np.array([int(row.max()).bit_length() for row in codes], dtype=np.uint8)
+    packed = [pack_bits(row, width) for (row, width) in zip(codes, widths)]
+
+    return widths.tobytes() + b''.join(packed)
+
+
+def _decode_rows(data, offset, count, n):
+    """Invert :_encode_rows; returns ((S, N, 3) quantized values, new offset)."""
+
+    widths = np.frombuffer(data, dtype=np.uint8, count=count, offset=offset)
+    offset += count
+    deltas = np.empty((count, 3 * n), dtype=np.int64)
+
+    for (k, width) in enumerate(widths.tolist()):
+        size = -(-3 * n * width // 8)
+        deltas[k] = unzigzag(unpack_bits(data[offset:offset + size], width, 3 * n))
+        offset += size
+
+    return np.cumsum(deltas, axis=0).reshape(count, n, 3), offset
+
+
+def quantize(values, tolerance):
+    """Map values onto the integer grid of spacing 2 * :tolerance.
+
+    :param values: array of floats
+    :param tolerance: largest absolute error
+    :return: int64 array of grid indices
+    """
+
+    scaled = np.rint(np.asarray(values) / (2.0 * tolerance))
+    largest = np.abs(scaled).max(initial=0.0)
+
+    if not largest < QUANTIZED_LIMIT:
+        raise ValueError("Cannot quantize values up to {:g} with tolerance {:g}: the grid index {:g} "
+                         "does not fit in int64 (limit {:g}). Use a larger tolerance.".format(
+                             np.abs(values).max(), tolerance, largest, QUANTIZED_LIMIT))
+
+    return scaled.astype(np.int64)
+
+
+def encode_block(times, steps, positions, velocities, tolerance, velocity_tolerance):
+    """Encode one block of snapshots (uncompressed).
+
+    :param times: (S,) simulation times
+    :param steps: (S,) step counts
+    :param positions: (S, N, 3) positions
+    :param velocities: (S, N, 3) velocities
+    :param tolerance: largest absolute position error
+    :param velocity_tolerance: largest absolute velocity error
+    :return: bytes
+    """
+
+    q_r = quantize(positions, tolerance)
+    q_v = quantize(velocities, velocity_tolerance)
+
+    return (np.asarray(times, dtype='<f8').tobytes() + np.asarray(steps, dtype='<i8').tobytes() +
+            _encode_rows(q_r) + _encode_rows(q_v))
+
+
+def decode_block(data, count, n, tolerance, velocity_tolerance):
+    """Invert :encode_block.
+
+    :return: (times, steps, positions, velocities)
+    """
+
+    times = np.frombuffer(data, dtype='<f8', count=count)
+    steps = np.frombuffer(data, dtype='<i8', count=count, offset=8 * count)
+
+    (q_r, offset) = _decode_rows(data, 16 * count, count, n)
+    (q_v, _) = _decode_rows(data, offset, count, n)
+
+    return times, steps, q_r * (2.0 * tolerance), q_v * (2.0 * velocity_tolerance)
+
+
+class CompressedWriter(object):
+    """Append-only compressed trajectory file.
+
+        with CompressedWriter('run.ztraj', masses, 1e-9) as writer:
+            writer.append(time, step, positions, velocities)
+    """
+
+    def __init__(self, path, masses, tolerance, velocity_tolerance=None, metadata=None,
+                 compression='zlib', keyframe=KEYFRAME_INTERVAL):
+        """Create :path.
+
+        :param path: compressed trajectory file
+        :param masses: (N,) array of masses
+        :param tolerance: largest absolute position error
+        :param velocity_tolerance: largest absolute velocity error (defaults to :tolerance)
+        :param metadata: JSON-serializable dict stored in the footer
+        :param compression: name of a scheme in COMPRESSORS
+        :param keyframe: number of snapshots per block
+        """
+
+        if compression not in COMPRESSORS:
+            raise ValueError("Unknown compression `{}` -- expected one of {}.".format(
+                compression, ', '.join(sorted(COMPRESSORS))))
+
+        self.n = len(masses)
+        self.compress = COMPRESSORS[compression][0]
+        self.footer = {'n': self.n, 'masses': np.asarray(masses, dtype=float).tolist(),
+                       'tolerance': tolerance,
+                       'velocity_tolerance': velocity_tolerance or tolerance,
+                       'compression': compression, 'keyframe': keyframe,
+                       'metadata': metadata or {}, 'blocks': []}
+
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._pending = []
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, time, step, positions, velocities):
+        """Buffer one snapshot, writing out its block once the block is full.
+
+        :param time: simulation time
+        :param step: number of steps taken so far
+        :param positions: (N, 3) array of positions
+        :param velocities: (N, 3) array of velocities
+        """
+
+        self._pending.append((time, step, np.array(positions), np.array(velocities)))
+        self._count += 1
+
+        if len(self._pending) == self.footer['keyframe']:
+            self._flush()
+
+    def _flush(self):
+        """Compress and write the buffered block."""
+
+        if not self._pending:
+            return
+
+        (times, steps, positions, velocities) = zip(*self._pending)
+        block = self.compress(encode_block(times, steps, np.stack(positions), np.stack(velocities),
+                                           self.footer['tolerance'],
+                                           self.footer['velocity_tolerance']))
+
+        self.footer['blocks'].append([self._file.tell(), len(block), len(self._pending)])
+        self._file.write(block)
+        self._pending = []
+
+    def close(self):
+        """Write the last partial block and the footer index."""
+
+        self._flush()
+
+        footer = json.dumps(self.footer).encode('utf-8')
+        self._file.write(footer)
+        self._file.write(np.array([len(footer)], dtype='<i8').tobytes())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CompressedTrajectory(object):
+    """Random-access reader for a compressed trajectory file.
+
+    trajectory[k] returns (time, step, positions, velocities) of snapshot k,
+    decoding only the block that holds it.
+    """
+
+    def __init__(self, path):
+        """Read the footer index of :path.
+
+        :param path: compressed trajectory file
+        """
+
+        self._file = open(path, 'rb')
+
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("`{}` is not a compressed trajectory file.".format(path))
+
+        self._file.seek(-8, 2)
+        length = int(np.frombuffer(self._file.read(8), dtype='<i8')[0])
+        self._file.seek(-8 - length, 2)
+        footer = json.loads(self._file.read(length).decode('utf-8'))
+
+        self.n = footer['n']
+        self.masses = np.array(footer['masses'])
+        self.metadata = footer['metadata']
+        self.keyframe = footer['keyframe']
+        self.tolerances = (footer['tolerance'], footer['velocity_tolerance'])
+        self.decompress = COMPRESSORS[footer['compression']][1]
+        self.blocks = footer['blocks']
+
+        self._cached = (None, None)
+
+    def __len__(self):
+        return sum(count for (_, _, count) in self.blocks)
+
+    def block(self, index):
+        """Decode block :index -> (times, steps, positions, velocities)."""
+
+        if self._cached[0] != index:
+            (offset, length, count) = self.blocks[index]
+            self._file.seek(offset)
+            data = self.decompress(self._file.read(length))
+            self._cached = (index, decode_block(data, count, self.n, *self.tolerances))
+
+        return self._cached[1]
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError("Snapshot {} out of range.".format(k))
+
+        (index, row) = divmod(k, self.keyframe)
+        (times, steps, positions, velocities) = self.block(index)
+
+        return float(times[row]), int(steps[row]), positions[row], velocities[row]
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def compress(source, path, tolerance, velocity_tolerance=None, compression='zlib',
+             keyframe=KEYFRAME_INTERVAL):
+    """Compress a raw `nbody_trajectory` file into :path.
+
+    :param source: raw trajectory file
+    :param path: compressed trajectory file to write
+    :param tolerance: largest absolute position error
+    :param velocity_tolerance: largest absolute velocity error (defaults to :tolerance)
+    :param compression: name of a scheme in COMPRESSORS
+    :param keyframe: number of snapshots per block
+    """
+
+    (masses, snapshots, metadata) = nbody_trajectory.read_trajectory(source)
+
+    with CompressedWriter(path, masses, tolerance, velocity_tolerance, metadata,
+                          compression, keyframe) as writer:
+        for snapshot in snapshots:
+            writer.append(snapshot['time'], snapshot['step'],
+                          snapshot['positions'], snapshot['velocities'])
+
+
+def benchmark(n=1000, snapshots=128, iterations=5, tolerance=1e-6, dt=0.001):
+    """Bytes per snapshot and encode/decode throughput against raw float64.
+
+    :param n: number of bodies
+    :param snapshots: number of snapshots recorded
+    :param iterations: timesteps between snapshots
+    :param tolerance: largest absolute position and velocity error
+    :param dt: timestep
+    :return results: {name : (bytes per snapshot, encode MB/s, decode MB/s)}
+    """
+
+    (r, v, m) = nbody_numpy.random_system(n)
+    times = dt * iterations * np.arange(snapshots)
+    steps = iterations * np.arange(snapshots)
+    positions = np.empty((snapshots, n, 3))
+    velocities = np.empty((snapshots, n, 3))
+
+    for k in range(snapshots):
+        (positions[k], velocities[k]) = (r, v)
+        nbody_numpy.advance(dt, iterations, r, v, m)
+
+    raw = positions.nbytes + velocities.nbytes
+    results = {}
+
+    def measure(name, encode, decode):
+        start = perf_counter()
+        blocks = [encode(s) for s in range(0, snapshots, KEYFRAME_INTERVAL)]
+        encoded = perf_counter() - start
+
+        start = perf_counter()
+        for block in blocks:
+            decode(block)
+        decoded = perf_counter() - start
+
+        results[name] = (sum(map(len, blocks)) / snapshots, raw / encoded / 1e6, raw / decoded / 1e6)
+
+    def window(s):
+        return slice(s, s + KEYFRAME_INTERVAL)
+
+    measure('raw float64',
+            lambda s: positions[window(s)].tobytes() + velocities[window(s)].tobytes(),
+            lambda block: np.frombuffer(block, dtype='<f8').copy())
+    measure('raw + zlib',
+            lambda s: zlib.compress(positions[window(s)].tobytes() + velocities[window(s)].tobytes(), 6),
+            lambda block: np.frombuffer(zlib.decompress(block), dtype='<f8'))
+
+    for (name, (pack, unpack)) in sorted(COMPRESSORS.items()):
+        measure('codec + ' + name,
+                lambda s: pack(encode_block(times[window(s)], steps[window(s)],
+                                            positions[window(s)], velocities[window(s)],
+                                            tolerance, tolerance)),
+                lambda block: decode_block(unpack(block), KEYFRAME_INTERVAL, n, tolerance, tolerance))
+
+    for (name, (size, encode, decode)) in results.items():
+        print('{:>14s}  {:10.0f} bytes/snapshot  ({:5.1f}x)  encode {:7.1f} MB/s  decode {:7.1f} MB/s'.format(
+            name, size, results['raw float64'][0] / size, encode, decode))
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(n=int(argv[1]) if len(argv) > 1 else 1000)
@@ -0,0 +1,270 @@
+from itertools import product
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+import nbody_numpy
+
+"""
+    N-body simulation, collision detection and inelastic merging.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    Bodies get a radius, and two bodies closer than the sum of their radii
+    merge into one. Testing all N^2 pairs every step would cost as much as
+    the force pass, so candidates come from a uniform spatial hash:
+
+        - space is cut into cubic cells of side 2 * max(radius), so any
+          colliding pair sits in the same or in adjacent cells,
+        - bodies are sorted by a hash of their cell, and each body looks up
+          its own cell and 13 of its 26 neighbours (the other 13 are covered
+          from the other side) with a binary search,
+        - candidates are then checked against the actual radii.
+
+    For bounded cell occupancy that is ~O(N log N) for the sort and O(N)
+    otherwise. Colliding bodies are grouped transitively (A hits B, B hits
+    C: all three merge) and each group becomes one body with the total
+    mass, the centre of mass, the total momentum and the total volume.
+
+    Survivors are moved to the front of the same arrays and callers keep
+    working on the leading views, so nothing is reallocated and every later
+    force pass runs over fewer bodies.
+
+    Watch a cold, collapsing cluster merge from the terminal with:
+
+        $ python nbody_collisions.py [N]
+"""
+
+# Cell offsets looked up from every body: itself and half of its neighbours.
+HALF_NEIGHBOURS = [(0, 0, 0)] + [offset for offset in product((-1, 0, 1), repeat=3)
+                                 if offset > (0, 0, 0)]
+
+# Large odd multipliers that spread cell coordinates over the 64-bit hash.
+_PRIMES = np.array([73856093, 19349663, 83492791], dtype=np.int64)
+
+
+def _expand(starts, counts):
+    """Flatten the index ranges [:starts, :starts + :counts) into one array."""
+
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+
+def _hash(cells):
+    """Hash (M, 3) integer cell coordinates; unrelated cells may collide, which only adds candidates."""
+
+    keys = cells * _PRIMES
+    return keys[:, 0] ^ keys[:, 1] ^ keys[:, 2]
+
+
+def candidate_pairs(positions, radii, cell=None):
+    """Find every pair of bodies whose spheres overlap, with a spatial hash.
+
+    :param positions: (N, 3) array of positions
+    :param radii: (N,) array of radii
+    :param cell: cell side (defaults to twice the largest radius)
+    :return: (i, j) index arrays with i < j
+    """
+
+    n = len(radii)
+    if n < 2 or not radii.max() > 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    cell = cell or 2.0 * radii.max()
+    cells = np.floor(positions / cell).astype(np.int64)
+
+    hashes = _hash(cells)
+    order = np.argsort(hashes, kind='stable')
+    keys = hashes[order]
+    everyone = np.arange(n)
+
+    (first, second) = ([], [])
+
+    for offset in HALF_NEIGHBOURS:
+        wanted = _hash(cells + np.array(offset, dtype=np.int64))
+        lo = np.searchsorted(keys, wanted, side='left')
+        counts = np.searchsorted(keys, wanted, side='right') - lo
+
+        first.append(np.repeat(everyone, counts))
+        second.append(order[_expand(lo, counts)])
+
+    (i, j) = (np.concatenate(first), np.concatenate(second))
+    (i, j) = (np.minimum(i, j), np.maximum(i, j))
+
+    # Hash collisions can report a pair twice (or a body with itself).
+    codes = np.unique(i[i != j] * n + j[i != j])
+    (i, j) = (codes // n, codes % n)
+
+    d = positions[i] - positions[j]
+    close = np.einsum('ij,ij->i', d, d) < (radii[i] + radii[j]) ** 2
+
+    return i[close], j[close]
+
+
+def _groups(n, i, j):
+    """Label every body with the smallest index of its collision group."""
+
+    labels = np.arange(n)
+
+    while True:
+        low = np.minimum(labels[i], labels[j])
+        before = labels.copy()
+        np.minimum.at(labels, i, low)
+        np.minimum.at(labels, j, low)
+
+        # Point every body straight at its group's current label.
+        labels = labels[labels]
+
+        if np.array_equal(labels, before):
+            return labels
+
+
+def merge(positions, velocities, masses, radii, i, j, ids=None):
+    """Merge colliding bodies and compact the arrays in place.
+
+    Each group of bodies linked by (:i, :j) pairs becomes one body carrying
+    the group's total mass, momentum and volume, at its centre of mass. The
+    survivors are moved to the front of every array, in their original order.
+
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param radii: (N,) array of radii
+    :param i: first bodies of colliding pairs
+    :param j: second bodies of colliding pairs
+    :param ids: optional (N,) array of body ids, compacted along with the rest
+    :return: number of bodies left (the leading rows of every array)
+    """
+
+    n = len(masses)
+    if not len(i):
+        return n
+
+    labels = _groups(n, i, j)
+    survivors = np.flatnonzero(labels == np.arange(n))
+    merged = np.flatnonzero(np.bincount(labels, minlength=n)[survivors] > 1)
+    roots = survivors[merged]
+
+    def group_sum(weights):
+        return np.bincount(labels, weights, minlength=n)[roots]
+
+    total = group_sum(masses)
+    centre = np.stack([group_sum(masses * positions[:, k]) for k in range(3)], axis=1) / total[:, None]
+    momentum = np.stack([group_sum(masses * velocities[:, k]) for k in range(3)], axis=1)
+    volume = group_sum(radii ** 3)
+
+    # Untouched bodies are copied as they are; only groups are recomputed.
+    k = len(survivors)
+    for array in (positions, velocities, masses, radii) + ((ids,) if ids is not None else ()):
+        array[:k] = array[survivors]
+
+    positions[merged] = centre
+    velocities[merged] = momentum / total[:, None]
+    masses[merged] = total
+    radii[merged] = np.cbrt(volume)
+
+    return k
+
+
+def advance(dt, iterations, positions, velocities, masses, radii, ids=None):
+    """Advance the system :dt time, :iterations times, merging collisions after every step.
+
+    The arrays are updated and compacted in place; since bodies may merge,
+    the leading views that are still in use are returned.
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param radii: (N,) array of radii
+    :param ids: optional (N,) array of body ids
+    :return: (positions, velocities, masses, radii, ids) views of the surviving bodies
+    """
+
+    for _ in range(iterations):
+        velocities += dt * nbody_numpy.accelerations(positions, masses)
+        positions += dt * velocities
+
+        (i, j) = candidate_pairs(positions, radii)
+        n = merge(positions, velocities, masses, radii, i, j, ids)
+
+        (positions, velocities, masses, radii) = (positions[:n], velocities[:n], masses[:n], radii[:n])
+        ids = ids[:n] if ids is not None else None
+
+    return positions, velocities, masses, radii, ids
+
+
+def cluster(n, radius=0.01, seed=0):
+    """A cold, uniform sphere of :n equal bodies that collapses and merges.
+
+    :param n: number of bodies
+    :param radius: radius of every body
+    :param seed: random seed
+    :return: (positions, velocities, masses, radii)
+    """
+
+    rng = np.random.default_rng(seed)
+
+    directions = rng.normal(size=(n, 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+    positions = directions * rng.uniform(0, 1, n)[:, None] ** (1.0 / 3.0)
+
+    return positions, np.zeros((n, 3)), np.full(n, 1.0 / n), np.full(n, radius)
+
+
+def benchmark(sizes=(1000, 4000, 16000, 64000), n=2000, steps=100, dt=0.01):
+    """Time hashed against all-pairs detection, then watch a cluster merge.
+
+    :param sizes: numbers of bodies for the detection comparison
+    :param n: number of bodies in the merging run
+    :param steps: number of steps of the merging run
+    :param dt: timestep
+    :return: ([(n, hash seconds, all-pairs seconds)], [(step, bodies, seconds per step)])
+    """
+
+    detection = []
+
+    for size in sizes:
+        (r, _, _, radii) = cluster(size, radius=0.5 / size ** (1.0 / 3.0))
+
+        start = perf_counter()
+        (i, _) = candidate_pairs(r, radii)
+        hashed = perf_counter() - start
+
+        # All pairs, one block of rows at a time.
+        start = perf_counter()
+        found = 0
+        for lo in range(0, size, 256):
+            d = r[lo:lo + 256, None, :] - r[None, :, :]
+            close = np.einsum('ijk,ijk->ij', d, d) < (radii[lo:lo + 256, None] + radii) ** 2
+            found += np.count_nonzero(np.triu(close, k=lo + 1))
+        brute = perf_counter() - start
+
+        assert found == len(i)
+        detection.append((size, hashed, brute))
+        print('N={:>6d}  {} colliding pairs  hash {:8.4f}s  all pairs {:8.4f}s'.format(
+            size, len(i), hashed, brute))
+
+    (r, v, m, radii) = cluster(n)
+    e0 = nbody_numpy.report_energy(r, v, m)
+    progress = []
+
+    for step in range(0, steps, 10):
+        start = perf_counter()
+        (r, v, m, radii, _) = advance(dt, 10, r, v, m, radii)
+        seconds = (perf_counter() - start) / 10
+
+        progress.append((step + 10, len(m), seconds))
+        print('step {:>4d}  {:>6d} bodies  {:8.4f}s/step  momentum {:.1e}'.format(
+            step + 10, len(m), seconds, np.abs(np.dot(m, v)).max()))
+
+    print('energy lost to merging: {:.3e} (from {:.3e})'.format(
+        e0 - nbody_numpy.report_energy(r, v, m), e0))
+
+    return detection, progress
+
+
+if __name__ == '__main__':
+    benchmark(n=int(argv[1]) if len(argv) > 1 else 2000)
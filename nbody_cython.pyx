@@ -1,5 +1,12 @@
-from itertools import product
-import cython
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+# distutils: extra_compile_args = -O3 -fopenmp
+# distutils: extra_link_args = -fopenmp
+
+from copy import deepcopy
+from cython.parallel import prange
+from libc.math cimport sqrt
+
+import nbody_numpy
 
 """
     N-body simulation.
@@ -10,181 +17,228 @@ import cython
     Original runtime: Average(76s, 76, 75s) = 75.666s
     Improved runtime: Average(6.31s, 6.25s, 6.27s) = 6.2766s
     Relative speedup: (75.666 / 6.2766) = 12.055x
+
+    The version timed above still iterated a dict of Python lists and typed
+    coordinates as 32-bit `float`. The kernels below work on typed
+    `double[:, ::1]` memoryviews over the flat arrays of `nbody_numpy`, run
+    the whole step loop without the GIL, and split target bodies across
+    OpenMP threads with `prange`. Build in place with:
+
+        $ cythonize -i nbody_cython.pyx
 """
 
 
-@cython.boundscheck(False)
-cpdef advance(float dt, int iterations, dict bodies, list body_names, set key_pairs):
-    """Advance the system :dt time, :iterations times.
+cdef void _kick(double dt, double[:, ::1] r, double[:, ::1] v, double[::1] m) noexcept nogil:
+    """Update every velocity by :dt times its acceleration."""
+
+    cdef Py_ssize_t n = m.shape[0]
+    cdef Py_ssize_t i, j
+    cdef double x, y, z, dx, dy, dz, inv, mag, ax, ay, az
+
+    for i in prange(n, schedule='static'):
+        x = r[i, 0]
+        y = r[i, 1]
+        z = r[i, 2]
+        ax = 0.0
+        ay = 0.0
+        az = 0.0
+
+        for j in range(n):
+            if j != i:
+                dx = r[j, 0] - x
+                dy = r[j, 1] - y
+                dz = r[j, 2] - z
+
+                inv = 1.0 / sqrt(dx * dx + dy * dy + dz * dz)
+                mag = m[j] * inv * inv * inv
+
+                ax = ax + dx * mag
+                ay = ay + dy * mag
+                az = az + dz * mag
+
+        v[i, 0] += dt * ax
+        v[i, 1] += dt * ay
+        v[i, 2] += dt * az
+
+
+cdef void _drift(double dt, double[:, ::1] r, double[:, ::1] v) noexcept nogil:
+    """Update every position by :dt times its velocity."""
+
+    cdef Py_ssize_t i
+
+    for i in prange(r.shape[0], schedule='static'):
+        r[i, 0] += dt * v[i, 0]
+        r[i, 1] += dt * v[i, 1]
+        r[i, 2] += dt * v[i, 2]
+
+
+cdef void _tile(double[:, ::1] r, double[::1] m, double[:, ::1] out,
+                Py_ssize_t lo_i, Py_ssize_t hi_i, Py_ssize_t lo_j, Py_ssize_t hi_j) noexcept nogil:
+    """Add the forces between bodies [lo_i, hi_i) and [lo_j, hi_j) to :out, both ways."""
+
+    cdef Py_ssize_t i, j
+    cdef double x, y, z, dx, dy, dz, inv, inv3, ax, ay, az
+
+    for i in range(lo_i, hi_i):
+        x = r[i, 0]
+        y = r[i, 1]
+        z = r[i, 2]
+        ax = 0.0
+        ay = 0.0
+        az = 0.0
+
+        for j in range(max(lo_j, i + 1) if lo_i == lo_j else lo_j, hi_j):
+            dx = r[j, 0] - x
+            dy = r[j, 1] - y
+            dz = r[j, 2] - z
+
+            inv = 1.0 / sqrt(dx * dx + dy * dy + dz * dz)
+            inv3 = inv * inv * inv
+
+            # Newton's third law: one pair evaluation updates both bodies.
+            ax = ax + dx * m[j] * inv3
+            ay = ay + dy * m[j] * inv3
+            az = az + dz * m[j] * inv3
+            out[j, 0] -= dx * m[i] * inv3
+            out[j, 1] -= dy * m[i] * inv3
+            out[j, 2] -= dz * m[i] * inv3
+
+        out[i, 0] += ax
+        out[i, 1] += ay
+        out[i, 2] += az
+
+
+cpdef tiled_accelerations(double[:, ::1] positions, double[::1] masses,
+                          long long[:, :, ::1] rounds, Py_ssize_t tile, double[:, ::1] out):
+    """Tiled, symmetric acceleration kernel (see `nbody_tiled`).
+
+    :param positions: (N, 3) C-contiguous float64 array of positions
+    :param masses: (N,) float64 array of masses
+    :param rounds: (R, S, 2) int64 tile pairs from `nbody_tiled.schedule`;
+        the pairs of one round touch disjoint blocks
+    :param tile: number of bodies per block
+    :param out: (N, 3) C-contiguous float64 array to write the accelerations into
+    """
+
+    cdef Py_ssize_t n = masses.shape[0]
+    cdef Py_ssize_t blocks = (n + tile - 1) // tile
+    cdef Py_ssize_t b, k, s, bi, bj
+
+    out[:, :] = 0.0
+
+    with nogil:
+        for b in prange(blocks, schedule='dynamic'):
+            _tile(positions, masses, out, b * tile, min(b * tile + tile, n),
+                  b * tile, min(b * tile + tile, n))
+
+        # Tiles within a round share no block, so threads never write the same row.
+        for k in range(rounds.shape[0]):
+            for s in prange(rounds.shape[1], schedule='dynamic'):
+                bi = rounds[k, s, 0]
+                bj = rounds[k, s, 1]
+
+                if bi >= 0 and bj >= 0:
+                    _tile(positions, masses, out, bi * tile, min(bi * tile + tile, n),
+                          bj * tile, min(bj * tile + tile, n))
+
+
+cpdef kick(double dt, double[:, ::1] positions, double[:, ::1] velocities, double[::1] masses):
+    """Update every velocity by :dt times its acceleration (first half of a step)."""
+
+    with nogil:
+        _kick(dt, positions, velocities, masses)
+
+
+cpdef drift(double dt, double[:, ::1] positions, double[:, ::1] velocities):
+    """Update every position by :dt times its velocity (second half of a step)."""
+
+    with nogil:
+        _drift(dt, positions, velocities)
+
+
+cpdef advance(double dt, int iterations, double[:, ::1] positions,
+              double[:, ::1] velocities, double[::1] masses):
+    """Advance the system :dt time, :iterations times (in place).
 
     :param dt: the change in time between the previous time and now
     :param iterations: the number of times to do :dt advances in one simulation.
-    :param bodies: {name : body_information} dictionary for all bodies
-    :param body_names: names of bodies (= bodies.keys())
-    :param key_pairs: pairs of bodies in :bodies' keys
+    :param positions: (N, 3) C-contiguous float64 array of positions
+    :param velocities: (N, 3) C-contiguous float64 array of velocities
+    :param masses: (N,) float64 array of masses
     """
-    
-    # Iterator sentinel variables.
-    cdef str body, body2
-    
-    # Body coordinates.
-    cdef float x1, x2, y1, y2, z1, z2
-    
-    # Energy computation variables.
-    cdef float dx, dy, dz, b_m1, b_m2, vx, vy, vz
-    
-    # Result lists.
-    cdef list v1, v2, r
-    
-    for _ in range(iterations):
-
-        for (body, body2) in key_pairs:
-
-            ([x1, y1, z1], v1, m1) = bodies[body]
-            ([x2, y2, z2], v2, m2) = bodies[body2]
-
-            (dx, dy, dz) = (x1 - x2, y1 - y2, z1 - z2)
-
-            inner_mag = dt * ((dx * dx + dy * dy + dz * dz) ** (-1.5))
-            b_m2 = m2 * inner_mag
-            b_m1 = m1 * inner_mag
-            v1[0] -= dx * b_m2
-            v1[1] -= dy * b_m2
-            v1[2] -= dz * b_m2
-            v2[0] += dx * b_m1
-            v2[1] += dy * b_m1
-            v2[2] += dz * b_m1
-
-        for body in body_names:
-
-            (r, [vx, vy, vz], m) = bodies[body]
-
-            r[0] += dt * vx
-            r[1] += dt * vy
-            r[2] += dt * vz
-
-
-@cython.boundscheck(False)
-cpdef float report_energy(dict bodies, list body_names, set key_pairs, float e=0.0):
+
+    cdef int step
+
+    with nogil:
+        for step in range(iterations):
+            _kick(dt, positions, velocities, masses)
+            _drift(dt, positions, velocities)
+
+
+cpdef double report_energy(double[:, ::1] positions, double[:, ::1] velocities,
+                           double[::1] masses, double e=0.0):
     """Compute the energy and return it so that it can be printed
 
-    :param bodies: {name : body_information} dictionary for all bodies
-    :param body_names: names of bodies (= bodies.keys())
-    :param key_pairs: pairs of bodies in :bodies' keys
+    :param positions: (N, 3) C-contiguous float64 array of positions
+    :param velocities: (N, 3) C-contiguous float64 array of velocities
+    :param masses: (N,) float64 array of masses
     :param e: baseline energy
     :return: e
     """
-    
-    # Iterator sentinel variables.
-    cdef str body, body2
-    
-    # Body coordinates.
-    cdef float x1, x2, y1, y2
-    
-    # Energy computation variables.
-    cdef float m1, m2, dx, dy, dz
-
-    for (body, body2) in key_pairs:
-        ((x1, y1, z1), v1, m1) = bodies[body]
-        ((x2, y2, z2), v2, m2) = bodies[body2]
-
-        (dx, dy, dz) = (x1-x2, y1-y2, z1-z2)
-        e -= (m1 * m2) / ((dx * dx + dy * dy + dz * dz) ** 0.5)
-    
-    # Energy computation variables.
-    cdef float vx, vy, vz, m
-    
-    for body in body_names:
-        (r, [vx, vy, vz], m) = bodies[body]
-        e += m * (vx * vx + vy * vy + vz * vz) / 2.
-        
-    return e
-
-
-cpdef nbody(int loops, str reference, int iterations, dict bodies):
+
+    cdef Py_ssize_t n = masses.shape[0]
+    cdef Py_ssize_t i, j
+    cdef double dx, dy, dz, vx, vy, vz, local
+    cdef double total = 0.0
+
+    for i in prange(n, nogil=True, schedule='dynamic'):
+        vx = velocities[i, 0]
+        vy = velocities[i, 1]
+        vz = velocities[i, 2]
+        local = 0.5 * masses[i] * (vx * vx + vy * vy + vz * vz)
+
+        for j in range(i + 1, n):
+            dx = positions[i, 0] - positions[j, 0]
+            dy = positions[i, 1] - positions[j, 1]
+            dz = positions[i, 2] - positions[j, 2]
+            local = local - masses[i] * masses[j] / sqrt(dx * dx + dy * dy + dz * dz)
+
+        total += local
+
+    return e + total
+
+
+def nbody(loops, reference, iterations, bodies, dt=0.01):
     """N-body simulation.
 
+    The dictionary is converted to arrays once on entry and written back once
+    on exit; everything in between runs without the GIL.
+
     :param loops: number of loops to run
     :param reference: body at center of system
     :param iterations: number of timesteps to advance
     :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
     """
 
-    # Set up global state
-    cdef float px, py, pz
-
-    cdef list body_names = list(bodies.keys())
-    cdef set body_pairs = {
-        tuple(sorted(pair)) for pair in product(body_names, body_names)
-              if pair[0] != pair[1]
-    }
-    
-    # Continue intialization
-    cdef float vx, vy, vz, m
-
-    for body in body_names:
-        (r, [vx, vy, vz], m) = bodies[body]
-        px -= vx * m
-        py -= vy * m
-        pz -= vz * m
-    
-    # Initialize our list v
-    cdef list v
-
-    (r, v, m) = bodies[reference]
-    v[0] = px / m
-    v[1] = py / m
-    v[2] = pz / m
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+
+    nbody_numpy.offset_momentum(velocities, masses,
+                                nbody_numpy.reference_index(body_names, reference))
 
     for _ in range(loops):
 
-        advance(0.01, iterations, bodies, body_names, body_pairs)
-
-        print(report_energy(bodies, body_names, body_pairs))
-        
-
-cpdef setup():
-    
-    cdef float PI = 3.14159265358979323
-    cdef float SOLAR_MASS = 4 * PI * PI
-    cdef float DAYS_PER_YEAR = 365.24
-
-    cdef dict bodies = {
-        'sun': ([0.0, 0.0, 0.0], [0.0, 0.0, 0.0], SOLAR_MASS),
-
-        'jupiter': ([4.84143144246472090e+00,
-                     -1.16032004402742839e+00,
-                     -1.03622044471123109e-01],
-                    [1.66007664274403694e-03 * DAYS_PER_YEAR,
-                     7.69901118419740425e-03 * DAYS_PER_YEAR,
-                     -6.90460016972063023e-05 * DAYS_PER_YEAR],
-                    9.54791938424326609e-04 * SOLAR_MASS),
-
-        'saturn': ([8.34336671824457987e+00,
-                    4.12479856412430479e+00,
-                    -4.03523417114321381e-01],
-                   [-2.76742510726862411e-03 * DAYS_PER_YEAR,
-                    4.99852801234917238e-03 * DAYS_PER_YEAR,
-                    2.30417297573763929e-05 * DAYS_PER_YEAR],
-                   2.85885980666130812e-04 * SOLAR_MASS),
-
-        'uranus': ([1.28943695621391310e+01,
-                    -1.51111514016986312e+01,
-                    -2.23307578892655734e-01],
-                   [2.96460137564761618e-03 * DAYS_PER_YEAR,
-                    2.37847173959480950e-03 * DAYS_PER_YEAR,
-                    -2.96589568540237556e-05 * DAYS_PER_YEAR],
-                   4.36624404335156298e-05 * SOLAR_MASS),
-
-        'neptune': ([1.53796971148509165e+01,
-                     -2.59193146099879641e+01,
-                     1.79258772950371181e-01],
-                    [2.68067772490389322e-03 * DAYS_PER_YEAR,
-                     1.62824170038242295e-03 * DAYS_PER_YEAR,
-                     -9.51592254519715870e-05 * DAYS_PER_YEAR],
-                    5.15138902046611451e-05 * SOLAR_MASS)}
-
-    nbody(100, 'sun', 20000, bodies)
+        advance(dt, iterations, positions, velocities, masses)
+
+        print(report_energy(positions, velocities, masses))
+
+    nbody_numpy.to_bodies(bodies, body_names, positions, velocities)
+
+
+def setup():
+
+    from nbody import BODIES
+    nbody(100, 'sun', 20000, deepcopy(BODIES))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,277 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from copy import deepcopy
+from importlib import import_module
+from importlib.machinery import EXTENSION_SUFFIXES
+from importlib.util import find_spec
+from itertools import combinations
+from os import cpu_count
+from sys import argv
+
+import nbody_numpy
+
+"""
+    N-body simulation, engine registry and single entry point.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    Each variant is its own `__main__` script, and importing some of them is
+    expensive (`nbody_numba` pulls in Numba and LLVM, `nbody_cython` has to
+    be compiled). Here every backend is registered by module *name* together
+    with what it needs, and is only imported once it is selected:
+
+        python    -- `nbody_opt`, pure Python over a dictionary
+        numpy     -- `nbody_numpy`, batched array sweeps
+        parallel  -- `nbody_parallel`, shared-memory worker processes
+        numba     -- `nbody_numba`, compiled, multi-threaded (needs numba)
+        cython    -- `nbody_cython`, compiled, OpenMP (needs a build)
+        tree      -- `nbody_tree`, Barnes-Hut, approximate
+
+    All engines are driven through the array interface of `nbody_numpy`
+    (advance and report_energy over positions, velocities and masses).
+    The Cython engine counts as installed only once the extension has been
+    built with `cythonize -i nbody_cython.pyx`: compiling it on import
+    through pyximport takes seconds, drops the OpenMP flags (so its prange
+    loops run on one thread), and races when several workers import it.
+    `select` picks the fastest available one for N bodies on a given number
+    of cores:
+
+        - tiny systems (N <= PYTHON_MAX) run fastest in plain Python,
+          where NumPy's per-call overhead dominates,
+        - otherwise a compiled engine, if one is installed,
+        - otherwise worker processes once N and the core count pay for them,
+        - otherwise NumPy;
+
+    the approximate tree is only picked for N >= TREE_MIN when the caller
+    allows approximate forces. `session` drives an engine over the same
+    arrays for a whole run, starting the workers of 'parallel' only once. Run the solar system (or N random bodies) on
+    an engine from the terminal as such:
+
+        $ python nbody_engines.py [ENGINE|auto] [N]
+
+    or see which engines are installed with:
+
+        $ python nbody_engines.py list
+"""
+
+# Largest N for which pure Python beats NumPy's per-call overhead.
+PYTHON_MAX = 10
+
+# Smallest N (and core count) for which worker processes pay for themselves.
+PARALLEL_MIN = 4096
+PARALLEL_CORES = 4
+
+# Smallest N for which the tree is picked when approximate forces are allowed.
+TREE_MIN = 20000
+
+Engine = namedtuple('Engine', ['name', 'module', 'requires', 'exact', 'extension', 'description'])
+
+ENGINES = {}
+
+
+def register(name, module, requires=(), exact=True, extension=False, description=''):
+    """Register an engine without importing it.
+
+    :param name: engine name
+    :param module: name of a module with advance and report_energy over arrays
+    :param requires: names of modules that must be importable to use it
+    :param exact: whether forces are computed by direct summation
+    :param extension: whether :module must be a built extension module
+    :param description: one line shown by `python nbody_engines.py list`
+    """
+
+    ENGINES[name] = Engine(name, module, tuple(requires), exact, extension, description)
+
+
+register('python', 'nbody_opt', description='pure Python over a dictionary')
+register('numpy', 'nbody_numpy', description='batched NumPy array sweeps')
+register('parallel', 'nbody_parallel', description='shared-memory worker processes')
+register('numba', 'nbody_numba', requires=('numba',), description='Numba, multi-threaded')
+register('cython', 'nbody_cython', extension=True, description='Cython, OpenMP')
+register('tree', 'nbody_tree', exact=False, description='Barnes-Hut octree (approximate)')
+
+
+def built(module):
+    """Whether :module is on the path as a compiled extension (not as a .pyx source)."""
+
+    spec = find_spec(module)
+
+    return spec is not None and (spec.origin or '').endswith(tuple(EXTENSION_SUFFIXES))
+
+
+def available(name):
+    """Whether engine :name can be loaded, checked without importing anything heavy."""
+
+    engine = ENGINES[name]
+
+    if engine.extension and not built(engine.module):
+        return False
+
+    return all(find_spec(module) is not None for module in engine.requires)
+
+
+class _Dictionary(object):
+    """Array interface over the dictionary engine `nbody_opt`."""
+
+    def __init__(self, module):
+        self.module = module
+
+    def advance(self, dt, iterations, positions, velocities, masses):
+        names = list(range(len(masses)))
+        bodies = {i: (list(r), list(v), m) for (i, r, v, m) in
+                  zip(names, positions.tolist(), velocities.tolist(), masses.tolist())}
+
+        self.module.advance(dt, iterations, bodies, names, list(combinations(names, 2)))
+
+        positions[...] = [bodies[i][0] for i in names]
+        velocities[...] = [bodies[i][1] for i in names]
+
+    def report_energy(self, positions, velocities, masses, e=0.0):
+        names = list(range(len(masses)))
+        bodies = {i: (r, v, m) for (i, r, v, m) in
+                  zip(names, positions.tolist(), velocities.tolist(), masses.tolist())}
+
+        return self.module.report_energy(bodies, names, combinations(names, 2), e)
+
+
+def load(name):
+    """Import engine :name (only now) and return its array interface.
+
+    :param name: engine name
+    :return: object with advance(dt, iterations, r, v, m) and report_energy(r, v, m)
+    """
+
+    if name not in ENGINES:
+        raise ValueError("Unknown engine `{}` -- expected one of {}.".format(
+            name, ', '.join(sorted(ENGINES))))
+
+    engine = ENGINES[name]
+
+    if engine.extension and not built(engine.module):
+        raise ImportError("Engine `{}` is not built -- run `cythonize -i {}.pyx`.".format(
+            name, engine.module))
+    if not available(name):
+        raise ImportError("Engine `{}` needs {}.".format(name, ', '.join(engine.requires)))
+
+    module = import_module(engine.module)
+
+    return _Dictionary(module) if name == 'python' else module
+
+
+@contextmanager
+def session(name, positions, velocities, masses):
+    """Run engine :name over the same arrays for many calls (in place).
+
+    Most engines step the arrays directly. 'parallel' keeps one
+    `nbody_parallel.SharedSystem` for the whole session, since its module
+    `advance` starts (spawns) and stops a set of workers on every call, and
+    copies the state back when the session ends.
+
+        with session('parallel', positions, velocities, masses) as (advance, report_energy):
+            advance(0.01, 1000)
+            print(report_energy())
+
+    :param name: engine name
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :return: (advance(dt, iterations), report_energy()) over the arrays
+    """
+
+    backend = load(name)
+
+    if name != 'parallel':
+        yield (lambda dt, iterations: backend.advance(dt, iterations, positions, velocities, masses),
+               lambda: backend.report_energy(positions, velocities, masses))
+        return
+
+    with backend.SharedSystem(positions, velocities, masses) as system:
+        try:
+            yield system.advance, system.report_energy
+
+        finally:
+            positions[...] = system.positions
+            velocities[...] = system.velocities
+
+
+def select(n, cores=None, exact=True):
+    """Pick the fastest available engine for :n bodies.
+
+    :param n: number of bodies
+    :param cores: number of cores to use (defaults to all of them)
+    :param exact: rule out approximate (tree) forces
+    :return: engine name
+    """
+
+    cores = cores or cpu_count() or 1
+
+    if not exact and n >= TREE_MIN:
+        return 'tree'
+    if n <= PYTHON_MAX:
+        return 'python'
+
+    for name in ('cython', 'numba'):
+        if available(name):
+            return name
+
+    if n >= PARALLEL_MIN and cores >= PARALLEL_CORES:
+        return 'parallel'
+
+    return 'numpy'
+
+
+def nbody(loops, reference, iterations, bodies, engine='auto', dt=0.01):
+    """N-body simulation on a registered engine.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param engine: engine name, or 'auto' to `select` one
+    :param dt: timestep
+    :return: name of the engine used
+    """
+
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+
+    if engine == 'auto':
+        engine = select(len(masses))
+
+    nbody_numpy.offset_momentum(velocities, masses,
+                                nbody_numpy.reference_index(body_names, reference))
+
+    with session(engine, positions, velocities, masses) as (advance, report_energy):
+
+        for _ in range(loops):
+
+            advance(dt, iterations)
+
+            print(report_energy())
+
+    nbody_numpy.to_bodies(bodies, body_names, positions, velocities)
+
+    return engine
+
+
+if __name__ == '__main__':
+
+    if len(argv) > 1 and argv[1] == 'list':
+        for engine in ENGINES.values():
+            print('{:>9s}  {:9s}  {}'.format(engine.name,
+                                             'available' if available(engine.name) else 'missing',
+                                             engine.description))
+
+    elif len(argv) > 2:
+        (r, v, m) = nbody_numpy.random_system(int(argv[2]))
+        name = select(len(m)) if argv[1] == 'auto' else argv[1]
+
+        print('engine: {}'.format(name))
+        with session(name, r, v, m) as (advance, report_energy):
+            for _ in range(10):
+                advance(1e-4, 10)
+                print(report_energy())
+
+    else:
+        from nbody import BODIES
+        nbody(100, 'sun', 20000, deepcopy(BODIES), argv[1] if len(argv) > 1 else 'auto')
@@ -0,0 +1,219 @@
+from copy import deepcopy
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+import nbody_numpy
+
+"""
+    N-body simulation, batched ensemble of independent systems.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    Stability studies run thousands of slightly perturbed copies of the same
+    system. Instead of calling `nbody` once per copy, we stack M members into
+
+        positions  -- (M, N, 3)
+        velocities -- (M, N, 3)
+        masses     -- (M, N)
+
+    and advance them all at once; every operation is vectorized across the
+    ensemble axis, so the interpreter overhead of one step is shared by every
+    member. Members are processed in batches so the (batch, N, N, 3)
+    temporaries stay bounded.
+
+    Compare against sequential runs from the terminal with:
+
+        $ python nbody_ensemble.py [MEMBERS]
+"""
+
+# Largest number of pair separations (members x N x N) held at once.
+BATCH_PAIRS = 1 << 20
+
+
+def perturb(positions, velocities, masses, members, scale=1e-6, seed=0):
+    """Stack :members randomly perturbed copies of one system.
+
+    Member 0 is left unperturbed; every other member has each position and
+    velocity component multiplied by (1 + :scale * standard normal noise).
+
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param members: number of copies
+    :param scale: relative size of the perturbation
+    :param seed: random seed
+    :return: ((M, N, 3) positions, (M, N, 3) velocities, (M, N) masses)
+    """
+
+    rng = np.random.default_rng(seed)
+    shape = (members,) + positions.shape
+
+    noise = 1.0 + scale * rng.standard_normal((2,) + shape)
+    noise[:, 0] = 1.0
+
+    return (positions * noise[0],
+            velocities * noise[1],
+            np.broadcast_to(masses, (members, len(masses))).copy())
+
+
+def _batches(members, n):
+    """Yield member slices small enough to keep temporaries under BATCH_PAIRS."""
+
+    step = max(1, BATCH_PAIRS // max(1, n * n))
+
+    for start in range(0, members, step):
+        yield slice(start, min(start + step, members))
+
+
+def accelerations(positions, masses, out=None):
+    """Compute the acceleration on every body of every member.
+
+    :param positions: (M, N, 3) array of positions
+    :param masses: (M, N) array of masses
+    :param out: optional (M, N, 3) array to write the result into
+    :return out: (M, N, 3) array of accelerations
+    """
+
+    (members, n, _) = positions.shape
+    diagonal = np.arange(n)
+
+    if out is None:
+        out = np.empty_like(positions)
+
+    for batch in _batches(members, n):
+        r = positions[batch]
+
+        # (B, N, N, 3) separations and (B, N, N) squared distances.
+        d = r[:, :, None, :] - r[:, None, :, :]
+        r2 = np.einsum('bijk,bijk->bij', d, d)
+        r2[:, diagonal, diagonal] = np.inf
+
+        mag = r2 ** -1.5
+        mag *= masses[batch, None, :]
+        out[batch] = -np.einsum('bij,bijk->bik', mag, d)
+
+    return out
+
+
+def advance(dt, iterations, positions, velocities, masses):
+    """Advance every member :dt time, :iterations times (in place).
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (M, N, 3) array of positions
+    :param velocities: (M, N, 3) array of velocities
+    :param masses: (M, N) array of masses
+    """
+
+    acc = np.empty_like(positions)
+
+    for _ in range(iterations):
+        accelerations(positions, masses, out=acc)
+        acc *= dt
+        velocities += acc
+        positions += dt * velocities
+
+
+def report_energy(positions, velocities, masses, e=0.0):
+    """Compute the energy of every member.
+
+    :param positions: (M, N, 3) array of positions
+    :param velocities: (M, N, 3) array of velocities
+    :param masses: (M, N) array of masses
+    :param e: baseline energy
+    :return: (M,) array of energies
+    """
+
+    (members, n, _) = positions.shape
+    (upper_i, upper_j) = np.triu_indices(n, k=1)
+    energy = np.full(members, e, dtype=np.float64)
+
+    for batch in _batches(members, n):
+        d = positions[batch][:, upper_i] - positions[batch][:, upper_j]
+        r = np.sqrt(np.einsum('bpk,bpk->bp', d, d))
+        mm = masses[batch][:, upper_i] * masses[batch][:, upper_j]
+
+        energy[batch] -= np.sum(mm / r, axis=1)
+
+    energy += 0.5 * np.einsum('bi,bik,bik->b', masses, velocities, velocities)
+
+    return energy
+
+
+def offset_momentum(velocities, masses, ref):
+    """Set body :ref's velocity in every member so that its total momentum is zero.
+
+    :param velocities: (M, N, 3) array of velocities
+    :param masses: (M, N) array of masses
+    :param ref: row index of the body at the center of the system
+    """
+
+    p = -np.einsum('bi,bik->bk', masses, velocities)
+    velocities[:, ref] = p / masses[:, ref, None]
+
+
+def nbody(loops, reference, iterations, bodies, members, scale=1e-6, seed=0, dt=0.01):
+    """Ensemble N-body simulation over perturbed copies of :bodies.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param members: number of perturbed copies
+    :param scale: relative size of the perturbation
+    :param seed: random seed
+    :param dt: timestep
+    :return energies: (loops, members) array of per-member energies after each loop
+    """
+
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+    (positions, velocities, masses) = perturb(positions, velocities, masses,
+                                              members, scale, seed)
+
+    offset_momentum(velocities, masses, nbody_numpy.reference_index(body_names, reference))
+
+    energies = np.empty((loops, members))
+
+    for loop in range(loops):
+
+        advance(dt, iterations, positions, velocities, masses)
+
+        energies[loop] = report_energy(positions, velocities, masses)
+
+    return energies
+
+
+def benchmark(members=1000, iterations=100, dt=0.01):
+    """Compare one ensemble call against :members sequential array-engine runs.
+
+    :param members: number of perturbed copies of the solar system
+    :param iterations: number of timesteps to advance
+    :param dt: timestep
+    :return: (ensemble seconds, sequential seconds)
+    """
+
+    from nbody import BODIES
+    (_, positions, velocities, masses) = nbody_numpy.from_bodies(deepcopy(BODIES))
+    (r, v, m) = perturb(positions, velocities, masses, members)
+
+    start = perf_counter()
+    advance(dt, iterations, r.copy(), v.copy(), m)
+    ensemble = perf_counter() - start
+
+    # Sequential runs are timed on a sample of members and scaled up.
+    sample = min(members, 20)
+    start = perf_counter()
+    for k in range(sample):
+        nbody_numpy.advance(dt, iterations, r[k].copy(), v[k].copy(), m[k])
+    sequential = (perf_counter() - start) * members / sample
+
+    print('members={}  ensemble {:.3f}s  sequential ~{:.3f}s  speedup {:.1f}x'.format(
+        members, ensemble, sequential, sequential / ensemble))
+
+    return ensemble, sequential
+
+
+if __name__ == '__main__':
+    benchmark(members=int(argv[1]) if len(argv) > 1 else 1000)
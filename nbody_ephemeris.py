@@ -0,0 +1,290 @@
+from copy import deepcopy
+from functools import lru_cache
+from sys import argv
+from time import perf_counter
+import json
+import numpy as np
+from numpy.polynomial import chebyshev
+
+import nbody_numpy
+
+"""
+    N-body simulation, Chebyshev ephemeris service.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    "Where is Jupiter at time t" used to mean integrating from t = 0 up to t
+    with `advance`, every time. Here the system is integrated once, and the
+    trajectory of every body is cut into segments of INTERVAL time units;
+    on each segment each coordinate is fitted, in the least-squares sense
+    over every integrator step, by a Chebyshev series of degree DEGREE:
+
+        x(t) = sum_k c_k T_k(s),    s = 2 (t - t_segment) / INTERVAL - 1
+
+    Velocities come from the derivative of the same series, the way
+    planetary ephemerides do it. The coefficients are stored as one
+    (segments, N, 3, DEGREE + 1) float64 block behind a small JSON header:
+
+        [ MAGIC ][ header length: int64 ][ JSON header ][ coefficients ... ]
+
+    `Ephemeris` maps that block read-only and keeps an LRU cache of recently
+    used segments, so a query costs one cached lookup and a short
+    polynomial evaluation. Queries take a scalar time or an array of
+    times; a batch is evaluated with a few array operations whatever its
+    length.
+
+    Build an ephemeris of the solar system and time queries with:
+
+        $ python nbody_ephemeris.py [PATH] [DURATION]
+"""
+
+MAGIC = b'NBEPHM01'
+
+# Time units per segment and degree of the Chebyshev series on each one.
+INTERVAL = 4.0
+DEGREE = 12
+
+# Segments kept in memory by each Ephemeris.
+CACHE_SIZE = 128
+
+
+def _data_offset(header):
+    """Byte offset of the coefficient block after a :header of that many bytes, 64-byte aligned."""
+
+    return -(-(len(MAGIC) + 8 + header) // 64) * 64
+
+
+def precompute(path, bodies, reference='sun', duration=1000.0, interval=INTERVAL,
+               degree=DEGREE, dt=0.01):
+    """Integrate :bodies once and write a Chebyshev ephemeris to :path.
+
+    :param path: ephemeris file to write
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param reference: body at center of system
+    :param duration: time span to cover, starting at t = 0
+    :param interval: length of every segment (a whole number of :dt)
+    :param degree: degree of the Chebyshev series
+    :param dt: integration timestep
+    :return: number of segments written
+    """
+
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+    nbody_numpy.offset_momentum(velocities, masses,
+                                nbody_numpy.reference_index(body_names, reference))
+
+    steps = int(round(interval / dt))
+    if abs(steps * dt - interval) > 1e-9 * interval:
+        raise ValueError("The segment interval {} is not a whole number of timesteps {}.".format(
+            interval, dt))
+    if steps <= degree:
+        raise ValueError("Segments of {} steps cannot determine a degree {} series.".format(
+            steps, degree))
+
+    segments = int(np.ceil(duration / interval))
+    shape = (segments, len(masses), 3, degree + 1)
+
+    header = json.dumps({'names': body_names, 'interval': interval, 'degree': degree,
+                         'segments': segments, 'dt': dt, 't0': 0.0}).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([len(header)], dtype='<i8').tobytes())
+        f.write(header)
+        f.truncate(_data_offset(len(header)) + 8 * int(np.prod(shape)))
+
+    coefficients = np.memmap(path, dtype='<f8', mode='r+', offset=_data_offset(len(header)),
+                             shape=shape)
+
+    # Least-squares fit on every step of a segment, both ends included.
+    fit = np.linalg.pinv(chebyshev.chebvander(np.linspace(-1.0, 1.0, steps + 1), degree))
+    samples = np.empty((steps + 1,) + positions.shape)
+    samples[0] = positions
+
+    for segment in range(segments):
+        for k in range(1, steps + 1):
+            nbody_numpy.advance(dt, 1, positions, velocities, masses)
+            samples[k] = positions
+
+        coefficients[segment] = np.einsum('kt,tbc->bck', fit, samples)
+        samples[0] = samples[-1]
+
+    coefficients.flush()
+    del coefficients
+
+    return segments
+
+
+class Ephemeris(object):
+    """Position and velocity queries on a precomputed ephemeris file.
+
+        ephemeris = Ephemeris('solar.ephem')
+        (r, v) = ephemeris.query(123.4, 'jupiter')
+        (r, v) = ephemeris.query(np.linspace(0, 900, 10000))
+    """
+
+    def __init__(self, path, cache_size=CACHE_SIZE):
+        """Map the coefficients of :path.
+
+        :param path: ephemeris file
+        :param cache_size: number of segments kept in memory
+        """
+
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("`{}` is not an ephemeris file.".format(path))
+
+            length = int(np.frombuffer(f.read(8), dtype='<i8')[0])
+            header = json.loads(f.read(length).decode('utf-8'))
+
+        self.names = header['names']
+        self.interval = header['interval']
+        self.t0 = header['t0']
+        self.segments = header['segments']
+        self.end = self.t0 + self.segments * self.interval
+
+        self._coefficients = np.memmap(path, dtype='<f8', mode='r', offset=_data_offset(length),
+                                       shape=(self.segments, len(self.names), 3,
+                                              header['degree'] + 1))
+        self.segment = lru_cache(maxsize=cache_size)(self._load)
+
+    def _load(self, index):
+        """Copy segment :index out of the file: (N, 3, DEGREE + 1) coefficients."""
+
+        return np.array(self._coefficients[index])
+
+    def query(self, times, body=None):
+        """Positions and velocities at :times.
+
+        :param times: scalar time or array of T times in [t0, end]
+        :param body: name of one body (None for all of them)
+        :return: (positions, velocities), each (N, 3) or (3,) for a scalar
+            time, with a leading T axis for an array of times
+        """
+
+        if np.ndim(times) == 0:
+            return self._scalar(float(times), body)
+
+        t = np.atleast_1d(np.asarray(times, dtype=np.float64))
+
+        if t.size and (t.min() < self.t0 or t.max() > self.end):
+            raise ValueError("Times must lie in [{}, {}].".format(self.t0, self.end))
+
+        # Segment of every time (the end point belongs to the last one) and
+        # its position within the segment, scaled to [-1, 1].
+        u = (t - self.t0) / self.interval
+        index = np.minimum(u.astype(np.int64), self.segments - 1)
+        s = 2.0 * (u - index) - 1.0
+
+        # One coefficient block per segment queried, not per time.
+        (segments, inverse) = np.unique(index, return_inverse=True)
+        inverse = inverse.ravel()
+        coefficients = np.stack([self.segment(int(i)) for i in segments])
+
+        if body is not None:
+            coefficients = coefficients[:, self.names.index(body)]
+
+        # T_k(s) and their derivatives by the three-term recurrence.
+        degree = coefficients.shape[-1] - 1
+        T = np.empty((degree + 1, len(s)))
+        dT = np.empty((degree + 1, len(s)))
+        (T[0], dT[0]) = (1.0, 0.0)
+        if degree:
+            (T[1], dT[1]) = (s, 1.0)
+        for k in range(2, degree + 1):
+            T[k] = 2.0 * s * T[k - 1] - T[k - 2]
+            dT[k] = 2.0 * T[k - 1] + 2.0 * s * dT[k - 1] - dT[k - 2]
+
+        # Sum the series one term at a time, gathering only that term's
+        # coefficients for every time: (T, N, 3) at once, like the result.
+        positions = np.zeros((len(s),) + coefficients.shape[1:-1])
+        velocities = np.zeros_like(positions)
+        axes = (-1,) + (1,) * (positions.ndim - 1)
+
+        for k in range(degree + 1):
+            term = coefficients[..., k][inverse]
+            positions += term * T[k].reshape(axes)
+            velocities += term * dT[k].reshape(axes)
+
+        velocities *= 2.0 / self.interval
+
+        return positions, velocities
+
+    def _scalar(self, t, body):
+        """`query` at one time, in plain Python floats until the final dot products."""
+
+        if not self.t0 <= t <= self.end:
+            raise ValueError("Times must lie in [{}, {}].".format(self.t0, self.end))
+
+        u = (t - self.t0) / self.interval
+        index = min(int(u), self.segments - 1)
+        s = 2.0 * (u - index) - 1.0
+
+        coefficients = self.segment(index)
+        if body is not None:
+            coefficients = coefficients[self.names.index(body)]
+
+        # T_k(s) and their derivatives; T[-2] is T_(k - 1) once T_k is appended.
+        terms = coefficients.shape[-1]
+        (T, dT) = ([1.0, s], [0.0, 1.0])
+        for _ in range(2, terms):
+            T.append(2.0 * s * T[-1] - T[-2])
+            dT.append(2.0 * T[-2] + 2.0 * s * dT[-1] - dT[-2])
+
+        return (coefficients.dot(T[:terms]),
+                coefficients.dot(dT[:terms]) * (2.0 / self.interval))
+
+
+def benchmark(path='solar.ephem', duration=1000.0, queries=100000):
+    """Build a solar-system ephemeris and compare queries against re-integration.
+
+    :param path: ephemeris file to write
+    :param duration: time span to cover
+    :param queries: number of times in the batch query
+    :return: (max position error, seconds per scalar query, seconds per batched time)
+    """
+
+    from nbody import BODIES
+
+    start = perf_counter()
+    precompute(path, deepcopy(BODIES), duration=duration)
+    print('precompute {:.0f} time units: {:.2f}s'.format(duration, perf_counter() - start))
+
+    ephemeris = Ephemeris(path)
+
+    # Accuracy against integrating straight to a few times.
+    (body_names, r, v, m) = nbody_numpy.from_bodies(deepcopy(BODIES))
+    nbody_numpy.offset_momentum(v, m, nbody_numpy.reference_index(body_names, 'sun'))
+    error = 0.0
+    steps = 0
+
+    start = perf_counter()
+    for t in (0.5 * duration - 0.37, 0.9 * duration + 0.11):
+        target = int(round(t / 0.01))
+        nbody_numpy.advance(0.01, target - steps, r, v, m)
+        steps = target
+        error = max(error, np.abs(ephemeris.query(steps * 0.01)[0] - r).max())
+    integrate = (perf_counter() - start) / 2
+
+    rng = np.random.default_rng(0)
+    times = rng.uniform(0, duration, queries)
+
+    start = perf_counter()
+    for t in times[:10000]:
+        ephemeris.query(t, 'jupiter')
+    scalar = (perf_counter() - start) / 10000
+
+    start = perf_counter()
+    ephemeris.query(times)
+    batch = (perf_counter() - start) / queries
+
+    print('max position error {:.2e}'.format(error))
+    print('re-integration ~{:.3f}s per query  scalar query {:.1f}us  batched {:.2f}us per time'.format(
+        integrate, scalar * 1e6, batch * 1e6))
+
+    return error, scalar, batch
+
+
+if __name__ == '__main__':
+    benchmark(argv[1] if len(argv) > 1 else 'solar.ephem',
+              float(argv[2]) if len(argv) > 2 else 1000.0)
@@ -0,0 +1,321 @@
+from copy import deepcopy
+from sys import argv
+from time import perf_counter
+import json
+import numpy as np
+
+import nbody_numpy
+
+"""
+    N-body simulation, initial-condition generators and binary body sets.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    The only real input so far is the 5-body BODIES dictionary. The
+    generators here build large systems directly as the (positions,
+    velocities, masses) arrays of `nbody_numpy.random_system`, without a
+    Python object per body, in the centre-of-mass frame (G = 1):
+
+        plummer    -- Plummer sphere, sampled as in Aarseth, Henon & Wielen
+                      (1974): radii from the inverse cumulative mass,
+                      speeds by rejection from the isotropic distribution
+                      function, so the sphere starts in equilibrium,
+        disk       -- uniform-density disk on circular orbits around an
+                      optional central mass,
+        planetary  -- a star with planets on Keplerian orbits: log-uniform
+                      semi-major axes and masses, small eccentricities and
+                      inclinations.
+
+    A body set is stored in one binary file:
+
+        [ header: HEADER_SIZE bytes ][ positions ][ velocities ][ masses ]
+
+    with the header holding a magic string, N and a small JSON blob of
+    metadata, and each array little-endian float64, C-contiguous and
+    64-byte aligned. `load` memory-maps the three arrays, which the array
+    engines take as they are; copy-on-write by default, so a run never
+    writes back to the file unless asked to.
+
+    Generate a body set, or time generating and loading 10^6 bodies, with:
+
+        $ python nbody_initial.py plummer|disk|planetary N PATH
+        $ python nbody_initial.py [N]
+"""
+
+MAGIC = b'NBBODY01'
+HEADER_SIZE = 4096
+
+# Fraction of the Plummer mass sampled; the rest would sit at huge radii.
+PLUMMER_TRUNCATION = 0.999
+
+
+def _centre(positions, velocities, masses):
+    """Move :positions and :velocities to the centre-of-mass frame (in place)."""
+
+    total = masses.sum()
+    positions -= np.dot(masses, positions) / total
+    velocities -= np.dot(masses, velocities) / total
+
+    return positions, velocities, masses
+
+
+def _directions(rng, n):
+    """(:n, 3) isotropic unit vectors."""
+
+    z = rng.uniform(-1.0, 1.0, n)
+    phi = rng.uniform(0.0, 2.0 * np.pi, n)
+    s = np.sqrt(1.0 - z * z)
+
+    return np.stack([s * np.cos(phi), s * np.sin(phi), z], axis=1)
+
+
+def plummer(n, mass=1.0, scale=1.0, seed=0):
+    """Equal-mass Plummer sphere in equilibrium.
+
+    :param n: number of bodies
+    :param mass: total mass
+    :param scale: Plummer radius (3 * pi / 16 gives Henon units, E = -1/4)
+    :param seed: random seed
+    :return: (positions, velocities, masses)
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # Radius enclosing a uniform fraction of the mass.
+    x = rng.uniform(0.0, PLUMMER_TRUNCATION, n)
+    r = scale / np.sqrt(x ** (-2.0 / 3.0) - 1.0)
+
+    # Speed as a fraction q of the local escape speed, with q drawn from
+    # g(q) = q^2 (1 - q^2)^3.5 (maximum ~0.092) by rejection.
+    q = np.empty(n)
+    pending = np.arange(n)
+    while len(pending):
+        trial = rng.uniform(0.0, 1.0, len(pending))
+        accept = rng.uniform(0.0, 0.1, len(pending)) < trial ** 2 * (1.0 - trial ** 2) ** 3.5
+        q[pending[accept]] = trial[accept]
+        pending = pending[~accept]
+
+    escape = np.sqrt(2.0 * mass / scale) * (1.0 + (r / scale) ** 2) ** -0.25
+
+    return _centre(_directions(rng, n) * r[:, None],
+                   _directions(rng, n) * (q * escape)[:, None],
+                   np.full(n, mass / n))
+
+
+def disk(n, radius=1.0, disk_mass=1.0, central_mass=0.0, thickness=0.0, seed=0):
+    """Uniform-density disk in the xy-plane on circular orbits.
+
+    Orbital speeds balance the central mass plus the disk mass inside each
+    radius, treated as if it were spherical.
+
+    :param n: number of bodies, the first of which is the central mass if it is nonzero
+    :param radius: disk radius
+    :param disk_mass: total mass of the disk bodies
+    :param central_mass: mass of a body at the centre (0 for none)
+    :param thickness: standard deviation of the heights above the plane
+    :param seed: random seed
+    :return: (positions, velocities, masses)
+    """
+
+    rng = np.random.default_rng(seed)
+    k = n - 1 if central_mass else n
+
+    r = radius * np.sqrt(rng.uniform(0.0, 1.0, k))
+    phi = rng.uniform(0.0, 2.0 * np.pi, k)
+    speed = np.sqrt((central_mass + disk_mass * (r / radius) ** 2) / r)
+
+    (c, s) = (np.cos(phi), np.sin(phi))
+    positions = np.stack([r * c, r * s, rng.normal(0.0, thickness, k) if thickness else np.zeros(k)], axis=1)
+    velocities = np.stack([-speed * s, speed * c, np.zeros(k)], axis=1)
+    masses = np.full(k, disk_mass / k)
+
+    if central_mass:
+        positions = np.concatenate([np.zeros((1, 3)), positions])
+        velocities = np.concatenate([np.zeros((1, 3)), velocities])
+        masses = np.concatenate([[central_mass], masses])
+
+    return _centre(positions, velocities, masses)
+
+
+def planetary(n, star_mass=4 * np.pi ** 2, inner=0.3, outer=50.0, planet_masses=(1e-8, 1e-3),
+              eccentricity=0.05, inclination=0.02, seed=0):
+    """A star (body 0) with :n - 1 planets on Keplerian orbits around it.
+
+    The default star mass is the solar mass of BODIES (distances in AU,
+    times in years). Planets do not feel each other while being placed.
+
+    :param n: number of bodies, star included
+    :param star_mass: mass of the star
+    :param inner: smallest semi-major axis
+    :param outer: largest semi-major axis (both log-uniform in between)
+    :param planet_masses: (smallest, largest) planet mass relative to the star, log-uniform
+    :param eccentricity: Rayleigh scale of the eccentricities
+    :param inclination: Rayleigh scale of the inclinations, in radians
+    :param seed: random seed
+    :return: (positions, velocities, masses)
+    """
+
+    rng = np.random.default_rng(seed)
+    k = n - 1
+
+    a = np.exp(rng.uniform(np.log(inner), np.log(outer), k))
+    e = np.minimum(rng.rayleigh(eccentricity, k), 0.9)
+    i = rng.rayleigh(inclination, k)
+    (node, periapsis, f) = rng.uniform(0.0, 2.0 * np.pi, (3, k))
+    masses = star_mass * np.exp(rng.uniform(*np.log(planet_masses), k))
+
+    # Position and velocity in the orbital plane, at true anomaly f.
+    p = a * (1.0 - e * e)
+    r = p / (1.0 + e * np.cos(f))
+    w = np.sqrt((star_mass + masses) / p)
+    plane_r = np.stack([r * np.cos(f), r * np.sin(f)])
+    plane_v = np.stack([-w * np.sin(f), w * (e + np.cos(f))])
+
+    # Rotate by the argument of periapsis, the inclination and the node.
+    (cn, sn, cw, sw, ci, si) = (np.cos(node), np.sin(node), np.cos(periapsis), np.sin(periapsis),
+                                np.cos(i), np.sin(i))
+    rotation = np.array([[cn * cw - sn * sw * ci, -cn * sw - sn * cw * ci],
+                         [sn * cw + cn * sw * ci, -sn * sw + cn * cw * ci],
+                         [sw * si, cw * si]])
+
+    positions = np.einsum('dpk,pk->kd', rotation, plane_r)
+    velocities = np.einsum('dpk,pk->kd', rotation, plane_v)
+
+    return _centre(np.concatenate([np.zeros((1, 3)), positions]),
+                   np.concatenate([np.zeros((1, 3)), velocities]),
+                   np.concatenate([[star_mass], masses]))
+
+
+GENERATORS = {'plummer': plummer, 'disk': disk, 'planetary': planetary}
+
+
+def _offsets(n):
+    """Byte offsets of positions, velocities and masses for :n bodies, each 64-byte aligned."""
+
+    def aligned(size):
+        return -(-size // 64) * 64
+
+    positions = HEADER_SIZE
+    velocities = positions + aligned(24 * n)
+    masses = velocities + aligned(24 * n)
+
+    return positions, velocities, masses, masses + aligned(8 * n)
+
+
+def save(path, positions, velocities, masses, metadata=None):
+    """Write a body set.
+
+    :param path: body-set file
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param metadata: JSON-serializable dict stored in the header
+    """
+
+    n = len(masses)
+    blob = json.dumps(metadata or {}).encode('utf-8')
+
+    if len(MAGIC) + 8 + len(blob) > HEADER_SIZE:
+        raise ValueError("Metadata does not fit in a {} byte header.".format(HEADER_SIZE))
+
+    offsets = _offsets(n)
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([n], dtype='<i8').tobytes())
+        f.write(blob)
+        f.truncate(offsets[-1])
+
+    for (offset, array, shape) in zip(offsets, (positions, velocities, masses), ((n, 3), (n, 3), (n,))):
+        block = np.memmap(path, dtype='<f8', mode='r+', offset=offset, shape=shape)
+        block[...] = array
+        block.flush()
+        del block
+
+
+def read_header(path):
+    """Read the header of a body set.
+
+    :param path: body-set file
+    :return: (N, metadata)
+    """
+
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("`{}` is not a body-set file.".format(path))
+
+        n = int(np.frombuffer(f.read(8), dtype='<i8')[0])
+        blob = f.read(HEADER_SIZE - len(MAGIC) - 8).rstrip(b'\0')
+
+    return n, json.loads(blob.decode('utf-8'))
+
+
+def load(path, mode='c'):
+    """Memory-map a body set.
+
+    :param path: body-set file
+    :param mode: 'c' for private copy-on-write arrays, 'r' for read-only ones,
+        'r+' to have changes (e.g. from `advance`) written back to the file
+    :return: (positions, velocities, masses, metadata)
+    """
+
+    (n, metadata) = read_header(path)
+    arrays = [np.memmap(path, dtype='<f8', mode=mode, offset=offset, shape=shape)
+              for (offset, shape) in zip(_offsets(n), ((n, 3), (n, 3), (n,)))]
+
+    return tuple(arrays) + (metadata,)
+
+
+def benchmark(n=1000000, path='bodies.nbb'):
+    """Time every generator at :n bodies, then saving and loading a body set.
+
+    :param n: number of bodies
+    :param path: body-set file to write
+    :return: {step : seconds}
+    """
+
+    from nbody import BODIES
+
+    timings = {}
+
+    for (name, generate) in sorted(GENERATORS.items()):
+        start = perf_counter()
+        (r, v, m) = generate(n)
+        timings[name] = perf_counter() - start
+        print('{:>9s}  N={}  {:.3f}s'.format(name, n, timings[name]))
+
+    start = perf_counter()
+    save(path, r, v, m, {'generator': 'planetary', 'n': n})
+    timings['save'] = perf_counter() - start
+
+    start = perf_counter()
+    (r2, v2, m2, _) = load(path)
+    timings['load'] = perf_counter() - start
+
+    start = perf_counter()
+    assert np.array_equal(r2, r) and np.array_equal(v2, v) and np.array_equal(m2, m)
+    timings['first read'] = perf_counter() - start
+
+    # The dictionary route, scaled from the 5 BODIES.
+    bodies = deepcopy(BODIES)
+    start = perf_counter()
+    for _ in range(1000):
+        nbody_numpy.from_bodies(bodies)
+    timings['dict per body'] = (perf_counter() - start) / 1000 / len(bodies)
+
+    print('save {save:.3f}s  load (map) {load:.6f}s  first full read {first read:.3f}s'.format(**timings))
+    print('from a BODIES-style dict: {:.2f}us per body, ~{:.2f}s for N={}'.format(
+        timings['dict per body'] * 1e6, timings['dict per body'] * n, n))
+
+    return timings
+
+
+if __name__ == '__main__':
+
+    if len(argv) > 3:
+        (r, v, m) = GENERATORS[argv[1]](int(argv[2]))
+        save(argv[3], r, v, m, {'generator': argv[1], 'n': int(argv[2])})
+
+    else:
+        benchmark(int(argv[1]) if len(argv) > 1 else 1000000)
@@ -0,0 +1,166 @@
+from contextlib import contextmanager
+from copy import deepcopy
+from importlib import import_module
+from sys import argv
+from time import perf_counter
+import json
+
+import nbody_numpy
+import nbody_opt
+
+"""
+    N-body simulation, opt-in instrumentation of the driver loop.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    When a run is slow, the question is where the time goes: the force pass,
+    the drift, the energy report or printing. A `Profile` keeps
+
+        - per-phase wall-clock timers (calls and seconds) for setup (array
+          conversion and momentum offset), advance, energy and io,
+        - a count of pair interactions evaluated by the force pass,
+        - one steps/sec sample per loop,
+
+    and hands itself to an optional callback after every loop, or writes
+    everything to a JSON profile with `export`.
+
+    `nbody` here drives any array backend with the `nbody_numpy` interface
+    (`nbody_numpy`, `nbody_numba`, `nbody_cython`), and hands the profile to
+    the pure-Python dictionary engine's own loop (`nbody_opt.nbody`), which
+    keeps one dictionary for the whole run. There each loop's energy comes
+    out of the next loop's force pass, so it is timed under advance and only
+    the final sweep under energy. Without a profile it is just the backend's
+    own `nbody`, so leaving instrumentation off costs nothing. With
+    `split=True` every step of an array backend is timed as a separate kick
+    (force evaluation) and drift; that costs two timer reads per step, so
+    only use it when the split is what you are after.
+
+    Profile the solar system from the terminal with:
+
+        $ python nbody_instrument.py [BACKEND] [PROFILE_PATH]
+"""
+
+
+class Profile(object):
+    """Phase timers, pair count and throughput samples of one run."""
+
+    def __init__(self, callback=None):
+        """
+        :param callback: function called with this profile after every sample
+        """
+
+        self.callback = callback
+        self.timers = {}
+        self.pairs = 0
+        self.steps = 0
+        self.samples = []
+        self._start = perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of a `with` block under phase :name."""
+
+        start = perf_counter()
+
+        try:
+            yield
+
+        finally:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += perf_counter() - start
+
+    def sample(self, steps, pairs, seconds):
+        """Record :steps steps and :pairs pair interactions done in :seconds."""
+
+        self.steps += steps
+        self.pairs += pairs
+        self.samples.append((perf_counter() - self._start, steps / seconds if seconds else 0.0))
+
+        if self.callback is not None:
+            self.callback(self)
+
+    def summary(self):
+        """The profile as a JSON-serializable dictionary."""
+
+        return {
+            'wall': perf_counter() - self._start,
+            'phases': {name: {'calls': calls, 'seconds': seconds}
+                       for (name, (calls, seconds)) in self.timers.items()},
+            'steps': self.steps,
+            'pairs': self.pairs,
+            'samples': [{'time': time, 'steps_per_second': rate} for (time, rate) in self.samples],
+        }
+
+    def export(self, path):
+        """Write :summary to :path as JSON."""
+
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+def nbody(loops, reference, iterations, bodies, backend=nbody_numpy, profile=None,
+          dt=0.01, split=False):
+    """N-body simulation on :backend, instrumented if a :profile is given.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param backend: `nbody_opt`, or a module with advance, report_energy, kick
+        and drift over arrays
+    :param profile: `Profile` to record into (None runs the backend uninstrumented)
+    :param dt: timestep
+    :param split: time kick and drift separately on every step (array backends only)
+    """
+
+    if profile is None:
+        return backend.nbody(loops, reference, iterations, bodies, dt)
+
+    if backend is nbody_opt:
+        if split:
+            raise ValueError("`nbody_opt` has no separate kick and drift to time.")
+
+        return backend.nbody(loops, reference, iterations, bodies, dt, profile)
+
+    with profile.phase('setup'):
+        (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+        nbody_numpy.offset_momentum(velocities, masses,
+                                    nbody_numpy.reference_index(body_names, reference))
+
+    pairs = len(masses) * (len(masses) - 1) // 2
+
+    for _ in range(loops):
+        start = perf_counter()
+
+        if split:
+            for _ in range(iterations):
+                with profile.phase('kick'):
+                    backend.kick(dt, positions, velocities, masses)
+                with profile.phase('drift'):
+                    backend.drift(dt, positions, velocities)
+        else:
+            with profile.phase('advance'):
+                backend.advance(dt, iterations, positions, velocities, masses)
+
+        profile.sample(iterations, iterations * pairs, perf_counter() - start)
+
+        with profile.phase('energy'):
+            e = backend.report_energy(positions, velocities, masses)
+
+        with profile.phase('io'):
+            print(e)
+
+    with profile.phase('setup'):
+        nbody_numpy.to_bodies(bodies, body_names, positions, velocities)
+
+
+if __name__ == '__main__':
+    from nbody import BODIES
+
+    name = argv[1] if len(argv) > 1 else 'nbody_numpy'
+
+    profile = Profile()
+    nbody(100, 'sun', 20000, deepcopy(BODIES), import_module(name), profile)
+    profile.export(argv[2] if len(argv) > 2 else 'nbody.profile.json')
@@ -0,0 +1,183 @@
+from copy import deepcopy
+from sys import argv
+
+import nbody_numpy
+
+"""
+    N-body simulation, pluggable symplectic integrators.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    Every variant so far hard-codes a first-order kick-then-drift step. Here
+    an integrator is just a list of drift and kick coefficients,
+
+        drift c[0], kick d[0], drift c[1], kick d[1], ..., drift c[s]
+
+    (each scaled by dt) run on top of any force kernel with the
+    `nbody_numpy.accelerations(positions, masses)` signature. Higher-order
+    schemes are symmetric compositions of leapfrog, so one step costs one
+    force evaluation per kick:
+
+        euler     -- 1st order, 1 force evaluation (the original `advance`)
+        leapfrog  -- 2nd order, 1
+        yoshida4  -- 4th order, 3 (Forest-Ruth / Yoshida triple jump)
+        yoshida6  -- 6th order, 7 (Yoshida 1990, solution A)
+
+    Higher order pays for itself with far larger timesteps for the same
+    energy error. Compare accuracy against cost from the terminal with:
+
+        $ python nbody_integrators.py [TARGET_DRIFT]
+"""
+
+
+# Give up on a scheme in the benchmark once it needs more force evaluations than this.
+MAX_EVALUATIONS = 500000
+
+
+def composition(weights):
+    """Turn leapfrog (drift-kick-drift) sub-step :weights into coefficient lists.
+
+    :param weights: leapfrog step weights, which must sum to 1
+    :return: (drifts, kicks)
+    """
+
+    drifts = [weights[0] / 2.0]
+    drifts += [(a + b) / 2.0 for (a, b) in zip(weights, weights[1:])]
+    drifts += [weights[-1] / 2.0]
+
+    return drifts, list(weights)
+
+
+_CBRT2 = 2.0 ** (1.0 / 3.0)
+_Y4 = 1.0 / (2.0 - _CBRT2)
+_Y6 = (-1.17767998417887, 0.235573213359357, 0.784513610477560)
+
+INTEGRATORS = {
+    'euler': ([0.0, 1.0], [1.0]),
+    'leapfrog': composition([1.0]),
+    'yoshida4': composition([_Y4, -_CBRT2 * _Y4, _Y4]),
+    'yoshida6': composition([_Y6[2], _Y6[1], _Y6[0],
+                             1.0 - 2.0 * sum(_Y6),
+                             _Y6[0], _Y6[1], _Y6[2]]),
+}
+
+
+def force_evaluations(integrator):
+    """Number of force evaluations one step of :integrator costs."""
+
+    return len(INTEGRATORS[integrator][1])
+
+
+def advance(dt, iterations, positions, velocities, masses,
+            integrator='leapfrog', force=nbody_numpy.accelerations):
+    """Advance the system :dt time, :iterations times (in place).
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param integrator: name of a scheme in INTEGRATORS
+    :param force: function (positions, masses) -> (N, 3) accelerations
+    """
+
+    try:
+        (drifts, kicks) = INTEGRATORS[integrator]
+
+    except KeyError:
+        raise ValueError("Unknown integrator `{}` -- expected one of {}.".format(
+            integrator, ', '.join(sorted(INTEGRATORS))))
+
+    for _ in range(iterations):
+
+        for (c, d) in zip(drifts, kicks):
+            if c:
+                positions += (c * dt) * velocities
+            velocities += (d * dt) * force(positions, masses)
+
+        positions += (drifts[-1] * dt) * velocities
+
+
+def sample_steps(dt, duration, samples):
+    """Steps between energy checks when :duration is split into :samples checks of whole steps.
+
+    The run actually covers :samples times this many steps, which is only
+    :duration / :dt when :dt divides it evenly.
+    """
+
+    return max(1, int(round(duration / dt / samples)))
+
+
+def energy_drift(integrator, dt, duration, bodies, reference='sun', samples=20):
+    """Largest relative energy error of :integrator over :duration.
+
+    :param integrator: name of a scheme in INTEGRATORS
+    :param dt: timestep
+    :param duration: total time to integrate
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param reference: body at center of system
+    :param samples: number of times the energy is checked along the way,
+        each after `sample_steps` steps
+    :return: max |E(t) - E(0)| / |E(0)|
+    """
+
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(deepcopy(bodies))
+    nbody_numpy.offset_momentum(velocities, masses,
+                                nbody_numpy.reference_index(body_names, reference))
+
+    e0 = nbody_numpy.report_energy(positions, velocities, masses)
+    steps = sample_steps(dt, duration, samples)
+    drift = 0.0
+
+    for _ in range(samples):
+        advance(dt, steps, positions, velocities, masses, integrator)
+        e = nbody_numpy.report_energy(positions, velocities, masses)
+        drift = max(drift, abs((e - e0) / e0))
+
+    return drift
+
+
+def benchmark(target=1e-8, duration=20.0, bodies=None, samples=20):
+    """Force evaluations each integrator needs to keep energy drift under :target.
+
+    For each integrator the timestep is halved, starting from 0.16, until the
+    drift over :duration falls under :target (or MAX_EVALUATIONS is passed).
+    Force evaluations count the steps `energy_drift` actually takes, so for a
+    :dt that does not divide :duration the run (and its cost) is a little
+    shorter or longer than :duration.
+
+    :param target: largest acceptable relative energy drift
+    :param duration: total time to integrate
+    :param bodies: {name : body_information} dictionary (defaults to the solar system)
+    :param samples: number of energy checks per run
+    :return results: {integrator : (dt, drift, force evaluations)}
+    """
+
+    if bodies is None:
+        from nbody import BODIES as bodies
+
+    results = {}
+
+    for integrator in ('euler', 'leapfrog', 'yoshida4', 'yoshida6'):
+        dt = 0.16
+
+        while True:
+            drift = energy_drift(integrator, dt, duration, bodies, samples=samples)
+            steps = sample_steps(dt, duration, samples) * samples
+            evaluations = force_evaluations(integrator) * steps
+
+            if drift < target or evaluations > MAX_EVALUATIONS:
+                break
+            dt /= 2.0
+
+        results[integrator] = (dt, drift, evaluations)
+        print('{:>9s}  dt={:<9g} t={:<7g} drift={:.2e}  force evaluations={}{}'.format(
+            integrator, dt, steps * dt, drift, evaluations,
+            '' if drift < target else ' (target not reached)'))
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(target=float(argv[1]) if len(argv) > 1 else 1e-8)
@@ -12,7 +12,7 @@ from itertools import product
 """
 
 
-def advance(dt, iterations, bodies, body_names, key_pairs):
+def advance(dt, iterations, bodies, body_names, key_pairs, energy=False):
     """Advance the system :dt time, :iterations times.
 
     :param dt: the change in time between the previous time and now
@@ -20,9 +20,27 @@ def advance(dt, iterations, bodies, body_names, key_pairs):
     :param bodies: {name : body_information} dictionary for all bodies
     :param body_names: names of bodies (= bodies.keys())
     :param key_pairs: pairs of bodies in :bodies' keys
+    :param energy: if True, return the energy of the system as it was on entry,
+        accumulated in the first step's pair loop instead of a second sweep
+    :return e: that energy if :energy, else None
     """
 
-    for _ in range(iterations):
+    if energy and not iterations:
+        return report_energy(bodies, body_names, key_pairs)
+
+    e = None
+
+    for step in range(iterations):
+
+        # First step with energy: the same pair loop also sums the potential.
+        potential = energy and not step
+
+        if potential:
+            e = 0.0
+
+            for body in body_names:
+                (r, [vx, vy, vz], m) = bodies[body]
+                e += m * (vx * vx + vy * vy + vz * vz) / 2.
 
         for (body1, body2) in key_pairs:
 
@@ -31,7 +49,11 @@ def advance(dt, iterations, bodies, body_names, key_pairs):
 
             (dx, dy, dz) = (x1 - x2, y1 - y2, z1 - z2)
 
-            inner_mag = dt * ((dx * dx + dy * dy + dz * dz) ** (-1.5))
+            d2 = dx * dx + dy * dy + dz * dz
+            if potential:
+                e -= (m1 * m2) / (d2 ** 0.5)
+
+            inner_mag = dt * (d2 ** (-1.5))
             b_m2 = m2 * inner_mag
             b_m1 = m1 * inner_mag
             v1[0] -= dx * b_m2
@@ -49,6 +71,8 @@ def advance(dt, iterations, bodies, body_names, key_pairs):
             r[1] += dt * vy
             r[2] += dt * vz
 
+    return e
+
 
 def report_energy(bodies, body_names, key_pairs, e=0.0):
     """Compute the energy and return it so that it can be printed
@@ -105,10 +129,16 @@ def nbody(loops, reference, iterations, bodies):
     v[1] = py / m
     v[2] = pz / m
 
-    for _ in range(loops):
+    # The energy at the end of one loop comes out of the next loop's first
+    # pair loop; only the last loop needs a separate sweep.
+    for loop in range(loops):
+
+        e = advance(0.01, iterations, bodies, body_names, body_pairs, energy=loop > 0)
 
-        advance(0.01, iterations, bodies, body_names, body_pairs)
+        if loop > 0:
+            print(e)
 
+    if loops:
         print(report_energy(bodies, body_names, body_pairs))
 
 
@@ -0,0 +1,212 @@
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+import nbody_engines
+import nbody_initial
+import nbody_numpy
+
+"""
+    N-body simulation, mixed-precision force pass.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    For large N the step is all pair arithmetic, and in float64 every pair
+    term moves twice the bytes (and fills half the SIMD lanes) that the
+    force accuracy needs. In this mode:
+
+        - positions and masses are cast to float32 once per step (O(N)),
+        - every pair term -- separation, 1 / r^3, mass * separation / r^3
+          -- is computed in float32,
+        - each body's sum over the pair terms is accumulated either in
+          float64 ('float64') or in float32 with Kahan compensation
+          ('kahan'), so rounding does not grow with N,
+        - velocities and positions stay float64 and are updated in float64,
+          so the state itself never loses precision from step to step.
+
+    Both kernels work on blocks of BLOCK_SIZE sources: the sum over one
+    block is done in float32 -- an einsum over a (block, block) tile of
+    float32 temporaries in NumPy, a loop in `nbody_numba.mixed_kick` that is
+    allowed to reassociate, so it runs 8 or 16 pairs per SIMD instruction --
+    and the block sums are accumulated in order as above.
+
+    What float32 cannot fix is the separation itself: r_j - r_i is computed
+    from float32 positions, so its relative error is ~6e-8 |r| / |r_j - r_i|,
+    large for close pairs far from the origin.
+
+    Compare energy drift and throughput against the float64 kernels with:
+
+        $ python nbody_mixed.py [N] [STEPS]
+"""
+
+ACCUMULATORS = ('float64', 'kahan')
+
+KERNELS = ('numpy', 'numba')
+
+# Sources per float32 block sum (and targets per tile in the NumPy kernel).
+BLOCK_SIZE = 256
+
+
+def accelerations(positions, masses, out=None, accumulate='float64', block=BLOCK_SIZE):
+    """Accelerations with float32 pair arithmetic, in NumPy.
+
+    :param positions: (N, 3) array of positions (float32, or cast here)
+    :param masses: (N,) array of masses (float32, or cast here)
+    :param out: optional (N, 3) float64 array to write the result into
+    :param accumulate: one of ACCUMULATORS
+    :param block: number of targets and of sources per tile
+    :return out: (N, 3) float64 array of accelerations
+    """
+
+    positions = np.asarray(positions, dtype=np.float32)
+    masses = np.asarray(masses, dtype=np.float32)
+    n = len(masses)
+    kahan = accumulate == 'kahan'
+
+    if out is None:
+        out = np.empty((n, 3))
+
+    for lo in range(0, n, block):
+        ri = positions[lo:lo + block]
+        total = np.zeros((len(ri), 3), dtype=np.float32 if kahan else np.float64)
+        compensation = np.zeros((len(ri), 3), dtype=np.float32)
+
+        for lo_j in range(0, n, block):
+            d = positions[None, lo_j:lo_j + block] - ri[:, None]
+            r2 = np.einsum('ijk,ijk->ij', d, d)
+
+            # Remove self-interaction: r ** -1.5 of infinity is zero.
+            if lo_j == lo:
+                np.fill_diagonal(r2, np.inf)
+
+            mag = r2 ** np.float32(-1.5)
+            mag *= masses[lo_j:lo_j + block]
+            partial = np.einsum('ij,ijk->ik', mag, d)
+
+            if kahan:
+                partial -= compensation
+                t = total + partial
+                compensation = (t - total) - partial
+                total = t
+            else:
+                total += partial
+
+        out[lo:lo + block] = total
+        if kahan:
+            out[lo:lo + block] -= compensation
+
+    return out
+
+
+def advance(dt, iterations, positions, velocities, masses, accumulate='float64', kernel='numpy',
+            block=BLOCK_SIZE):
+    """Advance the system :dt time, :iterations times (in place), forces in float32.
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) float64 array of positions
+    :param velocities: (N, 3) float64 array of velocities
+    :param masses: (N,) array of masses
+    :param accumulate: one of ACCUMULATORS
+    :param kernel: one of KERNELS
+    :param block: number of sources per float32 block sum
+    """
+
+    if accumulate not in ACCUMULATORS:
+        raise ValueError("Unknown accumulator `{}` -- expected one of {}.".format(
+            accumulate, ', '.join(ACCUMULATORS)))
+    if kernel not in KERNELS:
+        raise ValueError("Unknown kernel `{}` -- expected one of {}.".format(
+            kernel, ', '.join(KERNELS)))
+
+    masses32 = masses.astype(np.float32)
+
+    if kernel == 'numpy':
+        positions32 = np.empty(positions.shape, dtype=np.float32)
+        acc = np.empty_like(positions)
+
+        def kick():
+            positions32[...] = positions
+            accelerations(positions32, masses32, acc, accumulate, block)
+            velocities[...] += dt * acc
+    else:
+        # One contiguous row per axis, so the compiled block sums vectorize.
+        positions32 = np.empty(positions.shape[::-1], dtype=np.float32)
+        compiled = nbody_engines.load('numba').mixed_kick
+
+        def kick():
+            positions32[...] = positions.T
+            compiled(dt, positions32, velocities, masses32, accumulate == 'kahan', block)
+
+    for _ in range(iterations):
+        kick()
+        positions += dt * velocities
+
+
+def report_energy(positions, velocities, masses, e=0.0):
+    """Compute the energy, in float64, and return it so that it can be printed (see `nbody_numpy`)."""
+
+    return nbody_numpy.report_energy(positions, velocities, masses, e)
+
+
+def benchmark(n=4096, steps=200, dt=1e-3, kernels=KERNELS):
+    """Compare float64 and mixed-precision advance on a Plummer sphere.
+
+    For every kernel and mode: the largest relative force error against
+    float64 forces, the relative energy drift after :steps steps, how far
+    the final energy is from that of the float64 run, and pair interactions
+    per second.
+
+    :param n: number of bodies
+    :param steps: number of timesteps for the drift
+    :param dt: timestep
+    :param kernels: kernels to compare (those that are not installed are skipped)
+    :return: {(kernel, mode) : (force error, energy drift, difference from float64, pairs/s)}
+    """
+
+    (positions, velocities, masses) = nbody_initial.plummer(n)
+    reference = nbody_numpy.accelerations(positions, masses)
+    scale = np.linalg.norm(reference, axis=1)
+    e0 = report_energy(positions, velocities, masses)
+    results = {}
+
+    for kernel in kernels:
+        if not nbody_engines.available(kernel):
+            print('{}: not available'.format(kernel))
+            continue
+
+        module = nbody_engines.load(kernel)
+        runs = [('float64', lambda r, v, k: module.advance(dt, k, r, v, masses))]
+        runs += [('mixed/' + mode, lambda r, v, k, mode=mode: advance(dt, k, r, v, masses, mode, kernel))
+                 for mode in ACCUMULATORS]
+
+        for (mode, run) in runs:
+
+            # Force error: one kick from rest is dt times the acceleration.
+            (r, v) = (positions.copy(), np.zeros_like(velocities))
+            run(r, v, 1)
+            error = np.max(np.linalg.norm(v / dt - reference, axis=1) / scale)
+
+            # Warm up (and compile), then time.
+            run(positions.copy(), velocities.copy(), 1)
+            (r, v) = (positions.copy(), velocities.copy())
+            start = perf_counter()
+            run(r, v, steps)
+            elapsed = perf_counter() - start
+
+            energy = report_energy(r, v, masses)
+            if mode == 'float64':
+                e64 = energy
+
+            results[(kernel, mode)] = (error, abs((energy - e0) / e0), abs((energy - e64) / e0),
+                                       steps * n * (n - 1) / 2 / elapsed)
+            print('{:>6s}  {:>13s}  force error {:.1e}  energy drift {:.3e}  vs float64 {:.1e}  '
+                  '{:.3e} pairs/s'.format(kernel, mode, *results[(kernel, mode)]))
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(n=int(argv[1]) if len(argv) > 1 else 4096,
+              steps=int(argv[2]) if len(argv) > 2 else 200)
@@ -0,0 +1,214 @@
+"""
+    Danny Vilela
+
+    This program is an MPI, domain-decomposed n-body simulation. Each rank
+    owns a contiguous slice of the bodies (their velocities, and the right to
+    update their positions) and keeps a full copy of every position. On each
+    step a rank:
+
+        1. computes the acceleration of its own bodies from all N bodies,
+        2. kicks and drifts its own bodies,
+        3. shares its new positions with every other rank via a buffer-based
+           `Allgatherv` (no pickling).
+
+    Energy is the sum of each rank's share of the pair potential and of its
+    own kinetic energy, combined with `Allreduce`.
+
+    Run from the terminal as such:
+
+        $ mpiexec -n NUMBER_OF_PROCESSES python nbody_mpi.py [MODE] [N] [STEPS]
+
+    where MODE is one of
+
+        solar  -- the five-body system (default), printing energies like nbody_opt.py
+        strong -- N total bodies, whatever the number of processes
+        weak   -- N bodies per process
+
+    Running `strong` and `weak` at several process counts gives strong- and
+    weak-scaling numbers; rank 0 prints one line per run.
+"""
+
+from mpi4py import MPI
+from copy import deepcopy
+from sys import argv
+import numpy as np
+
+import nbody_numpy
+
+# Initialize MPI overhead.
+communicator = MPI.COMM_WORLD
+size, rank = communicator.Get_size(), communicator.Get_rank()
+
+
+def partition(n, parts=size):
+    """Split :n bodies into :parts contiguous slices.
+
+    :param n: number of bodies
+    :param parts: number of slices
+    :return (counts, displacements): bodies per slice and index of each slice's first body
+    """
+
+    bounds = np.linspace(0, n, parts + 1).astype(int)
+    return np.diff(bounds), bounds[:-1]
+
+
+def share_system(positions, velocities, masses, root=0):
+    """Broadcast a system from :root and hand each rank its own velocities.
+
+    :param positions: (N, 3) array of positions (only read on :root)
+    :param velocities: (N, 3) array of velocities (only read on :root)
+    :param masses: (N,) array of masses (only read on :root)
+    :param root: rank that holds the initial system
+    :return: (positions, local velocities, masses, counts, displacements)
+    """
+
+    n = communicator.bcast(len(masses) if rank == root else None, root=root)
+    (counts, displs) = partition(n)
+
+    if rank != root:
+        positions, masses = np.empty((n, 3)), np.empty(n)
+    else:
+        positions = np.ascontiguousarray(positions, dtype=np.float64)
+        masses = np.ascontiguousarray(masses, dtype=np.float64)
+        velocities = np.ascontiguousarray(velocities, dtype=np.float64)
+
+    communicator.Bcast(positions, root=root)
+    communicator.Bcast(masses, root=root)
+
+    local_velocities = np.empty((counts[rank], 3))
+    communicator.Scatterv(
+        [velocities, counts * 3, displs * 3, MPI.DOUBLE] if rank == root else None,
+        local_velocities, root=root)
+
+    return positions, local_velocities, masses, counts, displs
+
+
+def advance(dt, iterations, positions, local_velocities, masses, counts, displs):
+    """Advance the system :dt time, :iterations times (in place).
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of every position, kept in sync across ranks
+    :param local_velocities: (counts[rank], 3) velocities of our own bodies
+    :param masses: (N,) array of masses
+    :param counts: bodies owned by each rank
+    :param displs: index of each rank's first body
+    """
+
+    rows = (displs[rank], displs[rank] + counts[rank])
+    acc = np.empty_like(local_velocities)
+    local_positions = np.empty_like(local_velocities)
+    gathered = [positions, counts * 3, displs * 3, MPI.DOUBLE]
+
+    for _ in range(iterations):
+        nbody_numpy.accelerations(positions, masses, out=acc, rows=rows)
+        acc *= dt
+        local_velocities += acc
+
+        np.multiply(local_velocities, dt, out=local_positions)
+        local_positions += positions[rows[0]:rows[1]]
+
+        communicator.Allgatherv(local_positions, gathered)
+
+
+def report_energy(positions, local_velocities, masses, counts, displs, e=0.0):
+    """Compute the energy of the whole system (on every rank).
+
+    :param positions: (N, 3) array of every position
+    :param local_velocities: (counts[rank], 3) velocities of our own bodies
+    :param masses: (N,) array of masses
+    :param counts: bodies owned by each rank
+    :param displs: index of each rank's first body
+    :param e: baseline energy
+    :return: e
+    """
+
+    rows = (displs[rank], displs[rank] + counts[rank])
+
+    local = np.array([
+        nbody_numpy.potential_energy(positions, masses, rows=rows) +
+        nbody_numpy.kinetic_energy(local_velocities, masses[rows[0]:rows[1]])
+    ])
+    total = np.empty(1)
+    communicator.Allreduce(local, total, op=MPI.SUM)
+
+    return e + total[0]
+
+
+def nbody(loops, reference, iterations, bodies, dt=0.01):
+    """N-body simulation. Energies are printed by rank 0 only.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies (read on rank 0)
+    :param dt: timestep
+    """
+
+    if rank == 0:
+        (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+        nbody_numpy.offset_momentum(velocities, masses,
+                                    nbody_numpy.reference_index(body_names, reference))
+    else:
+        positions = velocities = masses = None
+
+    state = share_system(positions, velocities, masses)
+
+    for _ in range(loops):
+
+        advance(dt, iterations, *state)
+
+        energy = report_energy(*state)
+        if rank == 0:
+            print(energy)
+
+
+def scaling(n, iterations, dt=1e-4):
+    """Time :iterations steps of an :n body system across every rank.
+
+    :param n: total number of bodies
+    :param iterations: number of timesteps to advance
+    :param dt: timestep
+    :return elapsed: wall time of the slowest rank
+    """
+
+    (positions, velocities, masses) = nbody_numpy.random_system(n) if rank == 0 else (None,) * 3
+    state = share_system(positions, velocities, masses)
+
+    # Warm up, then line every rank up before timing.
+    advance(dt, 1, *state)
+    communicator.Barrier()
+
+    start = MPI.Wtime()
+    advance(dt, iterations, *state)
+    elapsed = communicator.allreduce(MPI.Wtime() - start, op=MPI.MAX)
+
+    return elapsed
+
+
+def main():
+
+    mode = argv[1] if len(argv) > 1 else 'solar'
+
+    if mode == 'solar':
+        from nbody import BODIES
+        nbody(100, 'sun', 20000, deepcopy(BODIES))
+
+    elif mode in ('strong', 'weak'):
+        n = int(argv[2]) if len(argv) > 2 else 5000
+        iterations = int(argv[3]) if len(argv) > 3 else 5
+        total = n * size if mode == 'weak' else n
+
+        elapsed = scaling(total, iterations)
+
+        if rank == 0:
+            pairs = iterations * total * (total - 1) / 2
+            print('{} ranks={} N={} steps={} seconds={:.4f} pairs/s={:.3e}'.format(
+                mode, size, total, iterations, elapsed, pairs / elapsed))
+
+    elif rank == 0:
+        print("Unknown mode `{}` -- expected one of solar, strong, weak.".format(mode))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,167 +1,341 @@
-from itertools import combinations
-from numba import jit, int32, float64, vectorize
+from copy import deepcopy
+from math import sqrt
+from sys import argv
+from time import perf_counter
+from numba import njit, prange
 import numpy as np
 
+import nbody_numpy
+
 """
     N-body simulation.
 
     Name: Danny Vilela
     NetID: dov205
 
-    Original runtime: Average(76s, 76, 75s) = 75.666s
-    Improved runtime: Average(22.6s, 22.4s, 22.2s) = 22.4s -- under 30s!
-    Relative speedup: (75.666 / 22.4) = 3.377x
+    The first version of this file declared `@jit` signatures over a dict of
+    Python lists (`float64[:,:,:]` bodies, `char[:]` names), called a
+    `@vectorize` helper per pair (allocating a temporary array each time) and
+    silently fell back to object mode.
+
+    Now every kernel is `njit` (nopython) over the flat arrays of
+    `nbody_numpy`:
+
+        positions  -- (N, 3) float64
+        velocities -- (N, 3) float64
+        masses     -- (N,) float64
+
+    with `prange` over target bodies. The step loop only touches scalars and
+    the arrays passed in, so nothing is allocated inside it. `cache=True`
+    writes the compiled kernels to __pycache__, so JIT warmup is paid once
+    rather than on every process start.
 """
 
-@vectorize([float64(float64, float64)])
-def vec_deltas(a, b):
-    """Takes two floating point vectors and performs pairwise subtraction."""
-    return a - b
+# Fast-math flags for the pair loops. We leave out 'reassoc' so that each
+# body's sum over j is still done in order and, since no kernel here reduces
+# across threads, results are reproducible whatever the number of threads.
+FASTMATH = {'nnan', 'ninf', 'nsz', 'arcp', 'contract', 'afn'}
 
 
-@jit('void(float64, int32, float64[:,:,:], char[:], char[:,:])')
-def advance(dt, iterations, bodies, body_names, key_pairs):
-    """Advance the system :dt time, :iterations times.
+@njit(parallel=True, fastmath=FASTMATH, cache=True)
+def kick(dt, positions, velocities, masses):
+    """Update every velocity by :dt times its acceleration (in place).
 
     :param dt: the change in time between the previous time and now
-    :param iterations: the number of times to do :dt advances in one simulation.
-    :param bodies: {name : body_information} dictionary for all bodies
-    :param body_names: names of bodies (= bodies.keys())
-    :param key_pairs: pairs of bodies in :bodies' keys
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
     """
 
-    for _ in range(iterations):
+    n = masses.shape[0]
+
+    for i in prange(n):
+        (x, y, z) = (positions[i, 0], positions[i, 1], positions[i, 2])
+        ax = ay = az = 0.0
+
+        for j in range(n):
+            if j != i:
+                dx = positions[j, 0] - x
+                dy = positions[j, 1] - y
+                dz = positions[j, 2] - z
+
+                inv = 1.0 / sqrt(dx * dx + dy * dy + dz * dz)
+                mag = masses[j] * inv * inv * inv
+
+                ax += dx * mag
+                ay += dy * mag
+                az += dz * mag
+
+        velocities[i, 0] += dt * ax
+        velocities[i, 1] += dt * ay
+        velocities[i, 2] += dt * az
+
+
+@njit(parallel=True, cache=True)
+def drift(dt, positions, velocities):
+    """Update every position by :dt times its velocity (in place).
+
+    :param dt: the change in time between the previous time and now
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    """
+
+    for i in prange(positions.shape[0]):
+        positions[i, 0] += dt * velocities[i, 0]
+        positions[i, 1] += dt * velocities[i, 1]
+        positions[i, 2] += dt * velocities[i, 2]
+
+
+@njit(fastmath=FASTMATH | {'reassoc'}, cache=True)
+def _mixed_block(x, y, z, xs, ys, zs, masses32):
+    """float32 sum of the pair terms of one target over a block of sources.
+
+    Reassociation is allowed here, and only here, so the sum vectorizes;
+    a body at zero separation (itself) contributes nothing.
+    """
+
+    (zero, one) = (np.float32(0.0), np.float32(1.0))
+    ax = ay = az = zero
+
+    for j in range(masses32.shape[0]):
+        dx = xs[j] - x
+        dy = ys[j] - y
+        dz = zs[j] - z
+
+        r2 = dx * dx + dy * dy + dz * dz
+        inv = one / np.sqrt(r2) if r2 > zero else zero
+        mag = masses32[j] * inv * inv * inv
+
+        ax += dx * mag
+        ay += dy * mag
+        az += dz * mag
+
+    return ax, ay, az
+
+
+@njit(parallel=True, fastmath=FASTMATH, cache=True)
+def mixed_kick(dt, positions32, velocities, masses32, kahan, block):
+    """`kick` with float32 pair arithmetic (see `nbody_mixed`).
+
+    :param dt: the change in time between the previous time and now
+    :param positions32: (3, N) float32 copy of the positions, one row per axis
+    :param velocities: (N, 3) float64 array of velocities
+    :param masses32: (N,) float32 array of masses
+    :param kahan: add up the block sums in float32 with Kahan compensation
+        instead of in float64
+    :param block: number of sources per float32 block sum
+    """
+
+    n = masses32.shape[0]
+    (xs, ys, zs) = (positions32[0], positions32[1], positions32[2])
+
+    for i in prange(n):
+        (x, y, z) = (xs[i], ys[i], zs[i])
+        ax = ay = az = 0.0
+        sx = sy = sz = cx = cy = cz = np.float32(0.0)
 
-        for (body1, body2) in key_pairs:
+        # Blocks in order; passing slices (not bounds) keeps the inner loop vectorized.
+        for lo in range(0, n, block):
+            hi = min(lo + block, n)
+            (px, py, pz) = _mixed_block(x, y, z, xs[lo:hi], ys[lo:hi], zs[lo:hi], masses32[lo:hi])
 
-            (p1, v1, m1) = bodies[body1]
-            (p2, v2, m2) = bodies[body2]
+            if kahan:
+                (tx, ty, tz) = (px - cx, py - cy, pz - cz)
+                (ux, uy, uz) = (sx + tx, sy + ty, sz + tz)
+                (cx, cy, cz) = ((ux - sx) - tx, (uy - sy) - ty, (uz - sz) - tz)
+                (sx, sy, sz) = (ux, uy, uz)
+            else:
+                ax += np.float64(px)
+                ay += np.float64(py)
+                az += np.float64(pz)
 
-            dx, dy, dz = vec_deltas(p1, p2)
+        if kahan:
+            ax = np.float64(sx) - np.float64(cx)
+            ay = np.float64(sy) - np.float64(cy)
+            az = np.float64(sz) - np.float64(cz)
 
-            inner_mag = dt * ((dx * dx + dy * dy + dz * dz) ** (-1.5))
-            b_m2 = m2 * inner_mag
-            b_m1 = m1 * inner_mag
-            
-            v1[0] -= dx * b_m2
-            v1[1] -= dy * b_m2
-            v1[2] -= dz * b_m2
-            v2[0] += dx * b_m1
-            v2[1] += dy * b_m1
-            v2[2] += dz * b_m1
+        velocities[i, 0] += dt * ax
+        velocities[i, 1] += dt * ay
+        velocities[i, 2] += dt * az
 
-        for body in body_names:
 
-            (r, [vx, vy, vz], m) = bodies[body]
+@njit(fastmath=FASTMATH, cache=True)
+def _tile(positions, masses, out, lo_i, hi_i, lo_j, hi_j):
+    """Add the forces between bodies [lo_i, hi_i) and [lo_j, hi_j) to :out, both ways.
+
+    On a diagonal tile (lo_i == lo_j) only pairs with j > i are visited.
+    """
+
+    for i in range(lo_i, hi_i):
+        (x, y, z) = (positions[i, 0], positions[i, 1], positions[i, 2])
+        ax = ay = az = 0.0
+
+        for j in range(max(lo_j, i + 1) if lo_i == lo_j else lo_j, hi_j):
+            dx = positions[j, 0] - x
+            dy = positions[j, 1] - y
+            dz = positions[j, 2] - z
+
+            inv = 1.0 / sqrt(dx * dx + dy * dy + dz * dz)
+            inv3 = inv * inv * inv
+
+            # Newton's third law: one pair evaluation updates both bodies.
+            ax += dx * masses[j] * inv3
+            ay += dy * masses[j] * inv3
+            az += dz * masses[j] * inv3
+            out[j, 0] -= dx * masses[i] * inv3
+            out[j, 1] -= dy * masses[i] * inv3
+            out[j, 2] -= dz * masses[i] * inv3
+
+        out[i, 0] += ax
+        out[i, 1] += ay
+        out[i, 2] += az
+
+
+@njit(parallel=True, cache=True)
+def tiled_accelerations(positions, masses, rounds, tile, out):
+    """Tiled, symmetric acceleration kernel (see `nbody_tiled`).
+
+    :param positions: (N, 3) array of positions
+    :param masses: (N,) array of masses
+    :param rounds: (R, S, 2) int64 tile pairs from `nbody_tiled.schedule`;
+        the pairs of one round touch disjoint blocks
+    :param tile: number of bodies per block
+    :param out: (N, 3) array to write the accelerations into
+    :return out: (N, 3) array of accelerations
+    """
+
+    n = masses.shape[0]
+    blocks = (n + tile - 1) // tile
+    out[:] = 0.0
+
+    for b in prange(blocks):
+        _tile(positions, masses, out, b * tile, min(b * tile + tile, n),
+              b * tile, min(b * tile + tile, n))
+
+    # Tiles within a round share no block, so threads never write the same row.
+    for r in range(rounds.shape[0]):
+        for s in prange(rounds.shape[1]):
+            (bi, bj) = (rounds[r, s, 0], rounds[r, s, 1])
+
+            if bi >= 0 and bj >= 0:
+                _tile(positions, masses, out, bi * tile, min(bi * tile + tile, n),
+                      bj * tile, min(bj * tile + tile, n))
+
+    return out
 
-            r[0] += dt * vx
-            r[1] += dt * vy
-            r[2] += dt * vz
 
+@njit(cache=True)
+def advance(dt, iterations, positions, velocities, masses):
+    """Advance the system :dt time, :iterations times (in place).
 
-@jit('void(float64[:,:,:], char[:], char[:,:], float64)')
-def report_energy(bodies, body_names, key_pairs, e=0.0):
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    """
+
+    for _ in range(iterations):
+        kick(dt, positions, velocities, masses)
+        drift(dt, positions, velocities)
+
+
+@njit(parallel=True, fastmath=FASTMATH, cache=True)
+def report_energy(positions, velocities, masses, e=0.0):
     """Compute the energy and return it so that it can be printed
 
-    :param bodies: {name : body_information} dictionary for all bodies
-    :param body_names: names of bodies (= bodies.keys())
-    :param key_pairs: pairs of bodies in :bodies' keys
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
     :param e: baseline energy
     :return: e
     """
 
-    for (body1, body2) in key_pairs:
-        (p1, v1, m1) = bodies[body1]
-        (p2, v2, m2) = bodies[body2]
+    n = masses.shape[0]
+    terms = np.empty(n)
 
-        (dx, dy, dz) = vec_deltas(p1, p2)
-        e -= (m1 * m2) / ((dx * dx + dy * dy + dz * dz) ** 0.5)
-        
-    for body in body_names:
-        (r, [vx, vy, vz], m) = bodies[body]
-        e += m * (vx * vx + vy * vy + vz * vz) / 2.
-        
-    return e
+    # One term per body in parallel, added up serially below: a `prange`
+    # reduction would sum in an order that depends on the thread count.
+    for i in prange(n):
+        (x, y, z) = (positions[i, 0], positions[i, 1], positions[i, 2])
+        (vx, vy, vz) = (velocities[i, 0], velocities[i, 1], velocities[i, 2])
+        local = 0.5 * masses[i] * (vx * vx + vy * vy + vz * vz)
 
+        for j in range(i + 1, n):
+            dx = x - positions[j, 0]
+            dy = y - positions[j, 1]
+            dz = z - positions[j, 2]
+            local -= masses[i] * masses[j] / sqrt(dx * dx + dy * dy + dz * dz)
 
-@jit('void(int32, char, int32, float64[:,:,:])')
-def nbody(loops, reference, iterations, bodies):
+        terms[i] = local
+
+    total = 0.0
+    for i in range(n):
+        total += terms[i]
+
+    return e + total
+
+
+def nbody(loops, reference, iterations, bodies, dt=0.01):
     """N-body simulation.
 
+    The dictionary is converted to arrays once on entry and written back once
+    on exit; everything in between runs in compiled code.
+
     :param loops: number of loops to run
     :param reference: body at center of system
     :param iterations: number of timesteps to advance
     :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
     """
 
-    # Set up global state
-    px, py, pz = 0, 0, 0
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
 
-    body_names = bodies.keys()
-    
-    # Chose to deprecate product due to Numba's inability to compile correctly.
-    # We previously got the error:
-    #     DataFlowAnalysis' object has no attribute 'op_MAKE_FUNCTION'
-    body_pairs = list(combinations(body_names, 2))
+    nbody_numpy.offset_momentum(velocities, masses,
+                                nbody_numpy.reference_index(body_names, reference))
 
-    for body in body_names:
-        (r, [vx, vy, vz], m) = bodies[body]
-        px -= vx * m
-        py -= vy * m
-        pz -= vz * m
+    for _ in range(loops):
 
-    (r, v, m) = bodies[reference]
-    v[0] = px / m
-    v[1] = py / m
-    v[2] = pz / m
+        advance(dt, iterations, positions, velocities, masses)
 
-    for _ in range(loops):
+        print(report_energy(positions, velocities, masses))
 
-        advance(0.01, iterations, bodies, body_names, body_pairs)
+    nbody_numpy.to_bodies(bodies, body_names, positions, velocities)
 
-        print(report_energy(bodies, body_names, body_pairs))
+
+def benchmark(sizes=(64, 256, 1024, 4096, 16384), iterations=5, dt=1e-4):
+    """Measure throughput (pair interactions/sec) of :advance as N grows.
+
+    :param sizes: numbers of bodies to sweep over
+    :param iterations: number of timesteps to advance per size
+    :param dt: timestep
+    :return results: list of (n, seconds, pair interactions/sec)
+    """
+
+    results = []
+
+    for n in sizes:
+        (positions, velocities, masses) = nbody_numpy.random_system(n)
+
+        # Compile (or load from the cache) before timing.
+        advance(dt, 1, positions, velocities, masses)
+
+        start = perf_counter()
+        advance(dt, iterations, positions, velocities, masses)
+        elapsed = perf_counter() - start
+
+        pairs = iterations * n * (n - 1) / 2
+        results.append((n, elapsed, pairs / elapsed))
+        print('N={:>7d}  {:9.4f}s  {:.3e} pairs/s'.format(n, elapsed, pairs / elapsed))
+
+    return results
 
 
 if __name__ == '__main__':
 
-    PI = 3.14159265358979323
-    SOLAR_MASS = 4 * PI * PI
-    DAYS_PER_YEAR = 365.24
-
-    bodies = {
-        'sun': (np.array([0.0, 0.0, 0.0]), np.array([0.0, 0.0, 0.0]), SOLAR_MASS),
-
-        'jupiter': (np.array([4.84143144246472090e+00,
-                     -1.16032004402742839e+00,
-                     -1.03622044471123109e-01]),
-                    np.array([1.66007664274403694e-03 * DAYS_PER_YEAR,
-                     7.69901118419740425e-03 * DAYS_PER_YEAR,
-                     -6.90460016972063023e-05 * DAYS_PER_YEAR]),
-                    9.54791938424326609e-04 * SOLAR_MASS),
-
-        'saturn': (np.array([8.34336671824457987e+00,
-                    4.12479856412430479e+00,
-                    -4.03523417114321381e-01]),
-                   np.array([-2.76742510726862411e-03 * DAYS_PER_YEAR,
-                    4.99852801234917238e-03 * DAYS_PER_YEAR,
-                    2.30417297573763929e-05 * DAYS_PER_YEAR]),
-                   2.85885980666130812e-04 * SOLAR_MASS),
-
-        'uranus': (np.array([1.28943695621391310e+01,
-                    -1.51111514016986312e+01,
-                    -2.23307578892655734e-01]),
-                   np.array([2.96460137564761618e-03 * DAYS_PER_YEAR,
-                    2.37847173959480950e-03 * DAYS_PER_YEAR,
-                    -2.96589568540237556e-05 * DAYS_PER_YEAR]),
-                   4.36624404335156298e-05 * SOLAR_MASS),
-
-        'neptune': (np.array([1.53796971148509165e+01,
-                     -2.59193146099879641e+01,
-                     1.79258772950371181e-01]),
-                    np.array([2.68067772490389322e-03 * DAYS_PER_YEAR,
-                     1.62824170038242295e-03 * DAYS_PER_YEAR,
-                     -9.51592254519715870e-05 * DAYS_PER_YEAR]),
-                    5.15138902046611451e-05 * SOLAR_MASS)
-    }
-
-    nbody(100, 'sun', 20000, bodies)
\ No newline at end of file
+    if len(argv) > 1 and argv[1] == 'bench':
+        benchmark(iterations=int(argv[2]) if len(argv) > 2 else 5)
+
+    else:
+        from nbody import BODIES
+        nbody(100, 'sun', 20000, deepcopy(BODIES))
@@ -0,0 +1,332 @@
+from copy import deepcopy
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+"""
+    N-body simulation, structure-of-arrays NumPy engine.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    Rather than walking a {name : ([x, y, z], [vx, vy, vz], m)} dictionary and
+    unpacking tuples for every pair on every step, we keep the whole system in
+    three contiguous float64 arrays:
+
+        positions  -- (N, 3)
+        velocities -- (N, 3)
+        masses     -- (N,)
+
+    and compute all pairwise accelerations as batched array operations. The
+    pair sweep is done one block of target bodies at a time so that the
+    (block, N, 3) temporaries stay bounded for large N.
+
+    Run the solar system from the terminal as such:
+
+        $ python nbody_numpy.py
+
+    or sweep throughput (pair interactions/sec) over N with:
+
+        $ python nbody_numpy.py bench [ITERATIONS]
+"""
+
+# Number of target bodies processed per batched pair sweep.
+BLOCK_SIZE = 256
+
+
+def from_bodies(bodies, body_names=None):
+    """Convert a {name : body_information} dictionary into contiguous arrays.
+
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param body_names: order in which to lay out bodies (defaults to bodies.keys())
+    :return: (body_names, positions, velocities, masses)
+    """
+
+    body_names = list(bodies.keys() if body_names is None else body_names)
+
+    positions = np.array([bodies[body][0] for body in body_names], dtype=np.float64)
+    velocities = np.array([bodies[body][1] for body in body_names], dtype=np.float64)
+    masses = np.array([bodies[body][2] for body in body_names], dtype=np.float64)
+
+    return (body_names,
+            positions.reshape(-1, 3),
+            velocities.reshape(-1, 3),
+            masses)
+
+
+def to_bodies(bodies, body_names, positions, velocities):
+    """Write array state back into the (mutable) lists of :bodies in place.
+
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param body_names: names of bodies, in the same order as the array rows
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    """
+
+    for (i, body) in enumerate(body_names):
+        (r, v, m) = bodies[body]
+        r[:] = positions[i].tolist()
+        v[:] = velocities[i].tolist()
+
+
+def accelerations(positions, masses, out=None, block=BLOCK_SIZE, softening=0.0, rows=None,
+                  potential=None):
+    """Compute the gravitational acceleration on every body from every other.
+
+    :param positions: (N, 3) array of positions
+    :param masses: (N,) array of masses
+    :param out: optional array to write the result into
+    :param block: number of target bodies handled per batched sweep
+    :param softening: Plummer softening length
+    :param rows: optional (first, last) range of target bodies to compute
+    :param potential: optional array to write each target's potential into,
+        computed from the same separations as the forces
+    :return out: (N, 3) (or (last - first, 3)) array of accelerations
+    """
+
+    (first, last) = (0, len(masses)) if rows is None else rows
+
+    if out is None:
+        out = np.empty((last - first, 3))
+
+    for start in range(first, last, block):
+        stop = min(start + block, last)
+
+        # (B, N, 3) separations and (B, N) squared distances for this block.
+        d = positions[start:stop, None, :] - positions[None, :, :]
+        r2 = np.einsum('ijk,ijk->ij', d, d)
+        if softening:
+            r2 += softening * softening
+
+        # Remove self-interaction: r ** -1.5 of infinity is zero.
+        diagonal = np.arange(stop - start)
+        r2[diagonal, diagonal + start] = np.inf
+
+        if potential is None:
+            mag = r2 ** -1.5
+        else:
+            inv = r2 ** -0.5
+            potential[start - first:stop - first] = -(inv @ masses)
+            mag = inv * inv * inv
+
+        mag *= masses
+        out[start - first:stop - first] = -np.einsum('ij,ijk->ik', mag, d)
+
+    return out
+
+
+def advance(dt, iterations, positions, velocities, masses, energy=False):
+    """Advance the system :dt time, :iterations times (in place).
+
+    Same kick-then-drift step as `nbody_opt.advance`, over arrays.
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param energy: if True, return the energy of the system as it was on entry,
+        with the potential accumulated by the first step's force pass
+    :return e: that energy if :energy, else None
+    """
+
+    if energy and not iterations:
+        return report_energy(positions, velocities, masses)
+
+    acc = np.empty_like(positions)
+    e = None
+
+    if energy:
+        phi = np.empty(len(masses))
+        e = kinetic_energy(velocities, masses)
+        accelerations(positions, masses, out=acc, potential=phi)
+        e += 0.5 * np.dot(masses, phi)
+
+        acc *= dt
+        velocities += acc
+        positions += dt * velocities
+        iterations -= 1
+
+    for _ in range(iterations):
+        accelerations(positions, masses, out=acc)
+        acc *= dt
+        velocities += acc
+        positions += dt * velocities
+
+    return e
+
+
+def kick(dt, positions, velocities, masses):
+    """Update every velocity by :dt times its acceleration (first half of a step)."""
+
+    velocities += dt * accelerations(positions, masses)
+
+
+def drift(dt, positions, velocities):
+    """Update every position by :dt times its velocity (second half of a step)."""
+
+    positions += dt * velocities
+
+
+def potential_energy(positions, masses, block=BLOCK_SIZE, rows=None):
+    """Compute the total gravitational potential energy of the system.
+
+    :param positions: (N, 3) array of positions
+    :param masses: (N,) array of masses
+    :param block: number of target bodies handled per batched sweep
+    :param rows: optional (first, last) range; only pairs (i, j > i) with i in it are summed
+    :return e: potential energy
+    """
+
+    n = len(masses)
+    (first, last) = (0, n) if rows is None else rows
+    e = 0.0
+
+    for start in range(first, last, block):
+        stop = min(start + block, last)
+
+        # Only pairs (i, j) with j > i, so each pair is counted once.
+        d = positions[start:stop, None, :] - positions[None, start + 1:, :]
+        r = np.sqrt(np.einsum('ijk,ijk->ij', d, d))
+        mm = masses[start:stop, None] * masses[None, start + 1:]
+
+        upper = np.arange(start, stop)[:, None] < np.arange(start + 1, n)[None, :]
+        e -= np.sum(mm[upper] / r[upper])
+
+    return e
+
+
+def kinetic_energy(velocities, masses):
+    """Compute the total kinetic energy of the system.
+
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :return e: kinetic energy
+    """
+
+    return 0.5 * np.dot(masses, np.einsum('ij,ij->i', velocities, velocities))
+
+
+def report_energy(positions, velocities, masses, e=0.0):
+    """Compute the energy and return it so that it can be printed
+
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param e: baseline energy
+    :return: e
+    """
+
+    return e + potential_energy(positions, masses) + kinetic_energy(velocities, masses)
+
+
+def offset_momentum(velocities, masses, ref):
+    """Set the velocity of body :ref so that the total momentum is zero.
+
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param ref: row index of the body at the center of the system
+    """
+
+    p = -np.dot(masses, velocities)
+    velocities[ref] = p / masses[ref]
+
+
+def nbody(loops, reference, iterations, bodies, dt=0.01):
+    """N-body simulation.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
+    """
+
+    (body_names, positions, velocities, masses) = from_bodies(bodies)
+
+    # Zero total momentum around our reference body.
+    offset_momentum(velocities, masses, reference_index(body_names, reference))
+
+    # The energy at the end of one loop comes out of the next loop's first
+    # force pass; only the last loop needs a separate sweep.
+    for loop in range(loops):
+
+        e = advance(dt, iterations, positions, velocities, masses, energy=loop > 0)
+
+        if loop > 0:
+            print(e)
+
+    if loops:
+        print(report_energy(positions, velocities, masses))
+
+    to_bodies(bodies, body_names, positions, velocities)
+
+
+def reference_index(body_names, reference):
+    """Look up the row index of body :reference.
+
+    :param body_names: names of bodies, in the same order as the array rows
+    :param reference: body at center of system
+    :return: row index of :reference
+    """
+
+    try:
+        return body_names.index(reference)
+
+    except ValueError:
+        raise KeyError("Unknown reference body `{}`.".format(reference))
+
+
+def random_system(n, seed=0):
+    """Generate a random, bound-ish :n body system for benchmarking.
+
+    :param n: number of bodies
+    :param seed: random seed
+    :return: (positions, velocities, masses)
+    """
+
+    rng = np.random.default_rng(seed)
+
+    positions = rng.uniform(-1.0, 1.0, size=(n, 3))
+    velocities = rng.normal(0.0, 0.1, size=(n, 3))
+    masses = rng.uniform(0.5, 1.5, size=n) / n
+
+    return positions, velocities, masses
+
+
+def benchmark(sizes=(64, 128, 256, 512, 1024, 2048, 4096), iterations=5, dt=1e-4):
+    """Measure throughput (pair interactions/sec) of :advance as N grows.
+
+    :param sizes: numbers of bodies to sweep over
+    :param iterations: number of timesteps to advance per size
+    :param dt: timestep
+    :return results: list of (n, seconds, pair interactions/sec)
+    """
+
+    results = []
+
+    for n in sizes:
+        (positions, velocities, masses) = random_system(n)
+
+        # Warm up allocations and caches before timing.
+        advance(dt, 1, positions, velocities, masses)
+
+        start = perf_counter()
+        advance(dt, iterations, positions, velocities, masses)
+        elapsed = perf_counter() - start
+
+        pairs = iterations * n * (n - 1) / 2
+        results.append((n, elapsed, pairs / elapsed))
+        print('N={:>7d}  {:9.4f}s  {:.3e} pairs/s'.format(n, elapsed, pairs / elapsed))
+
+    return results
+
+
+if __name__ == '__main__':
+
+    if len(argv) > 1 and argv[1] == 'bench':
+        benchmark(iterations=int(argv[2]) if len(argv) > 2 else 5)
+
+    else:
+        from nbody import BODIES
+        nbody(100, 'sun', 20000, deepcopy(BODIES))
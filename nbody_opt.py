@@ -1,4 +1,6 @@
+from contextlib import nullcontext
 from itertools import product
+from time import perf_counter
 
 """
     N-body simulation.
@@ -12,7 +14,7 @@ from itertools import product
 """
 
 
-def advance(dt, iterations, bodies, body_names, key_pairs):
+def advance(dt, iterations, bodies, body_names, key_pairs, energy=False):
     """Advance the system :dt time, :iterations times.
 
     :param dt: the change in time between the previous time and now
@@ -20,9 +22,27 @@ def advance(dt, iterations, bodies, body_names, key_pairs):
     :param bodies: {name : body_information} dictionary for all bodies
     :param body_names: names of bodies (= bodies.keys())
     :param key_pairs: pairs of bodies in :bodies' keys
+    :param energy: if True, return the energy of the system as it was on entry,
+        accumulated in the first step's pair loop instead of a second sweep
+    :return e: that energy if :energy, else None
     """
 
-    for _ in range(iterations):
+    if energy and not iterations:
+        return report_energy(bodies, body_names, key_pairs)
+
+    e = None
+
+    for step in range(iterations):
+
+        # First step with energy: the same pair loop also sums the potential.
+        potential = energy and not step
+
+        if potential:
+            e = 0.0
+
+            for body in body_names:
+                (r, [vx, vy, vz], m) = bodies[body]
+                e += m * (vx * vx + vy * vy + vz * vz) / 2.
 
         for (body1, body2) in key_pairs:
 
@@ -31,7 +51,11 @@ def advance(dt, iterations, bodies, body_names, key_pairs):
 
             (dx, dy, dz) = (x1 - x2, y1 - y2, z1 - z2)
 
-            inner_mag = dt * ((dx * dx + dy * dy + dz * dz) ** (-1.5))
+            d2 = dx * dx + dy * dy + dz * dz
+            if potential:
+                e -= (m1 * m2) / (d2 ** 0.5)
+
+            inner_mag = dt * (d2 ** (-1.5))
             b_m2 = m2 * inner_mag
             b_m1 = m1 * inner_mag
             v1[0] -= dx * b_m2
@@ -49,6 +73,8 @@ def advance(dt, iterations, bodies, body_names, key_pairs):
             r[1] += dt * vy
             r[2] += dt * vz
 
+    return e
+
 
 def report_energy(bodies, body_names, key_pairs, e=0.0):
     """Compute the energy and return it so that it can be printed
@@ -74,40 +100,63 @@ def report_energy(bodies, body_names, key_pairs, e=0.0):
     return e
 
 
-def nbody(loops, reference, iterations, bodies):
+def nbody(loops, reference, iterations, bodies, dt=0.01, profile=None):
     """N-body simulation.
 
     :param loops: number of loops to run
     :param reference: body at center of system
     :param iterations: number of timesteps to advance
     :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
+    :param profile: optional `nbody_instrument.Profile` to time the setup,
+        advance, energy and io phases of this loop into
     """
 
-    # Set up global state
-    px, py, pz = 0, 0, 0
+    phase = profile.phase if profile is not None else lambda name: nullcontext()
 
-    body_names = bodies.keys()
-    body_pairs = {
-        tuple(sorted(pair)) for pair in product(body_names, body_names)
-              if pair[0] != pair[1]
-    }
+    with phase('setup'):
 
-    for body in body_names:
-        (r, [vx, vy, vz], m) = bodies[body]
-        px -= vx * m
-        py -= vy * m
-        pz -= vz * m
+        # Set up global state
+        px, py, pz = 0, 0, 0
+
+        body_names = bodies.keys()
+        body_pairs = {
+            tuple(sorted(pair)) for pair in product(body_names, body_names)
+                  if pair[0] != pair[1]
+        }
+
+        for body in body_names:
+            (r, [vx, vy, vz], m) = bodies[body]
+            px -= vx * m
+            py -= vy * m
+            pz -= vz * m
+
+        (r, v, m) = bodies[reference]
+        v[0] = px / m
+        v[1] = py / m
+        v[2] = pz / m
+
+    # The energy at the end of one loop comes out of the next loop's first
+    # pair loop; only the last loop needs a separate sweep.
+    for loop in range(loops):
+        start = perf_counter()
+
+        with phase('advance'):
+            e = advance(dt, iterations, bodies, body_names, body_pairs, energy=loop > 0)
 
-    (r, v, m) = bodies[reference]
-    v[0] = px / m
-    v[1] = py / m
-    v[2] = pz / m
+        if profile is not None:
+            profile.sample(iterations, iterations * len(body_pairs), perf_counter() - start)
 
-    for _ in range(loops):
+        if loop > 0:
+            with phase('io'):
+                print(e)
 
-        advance(0.01, iterations, bodies, body_names, body_pairs)
+    if loops:
+        with phase('energy'):
+            e = report_energy(bodies, body_names, body_pairs)
 
-        print(report_energy(bodies, body_names, body_pairs))
+        with phase('io'):
+            print(e)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,373 @@
+from copy import deepcopy
+from multiprocessing import cpu_count, get_context
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from sys import argv
+from threading import BrokenBarrierError
+from time import perf_counter
+import numpy as np
+
+import nbody_numpy
+
+"""
+    N-body simulation, multi-core shared-memory backend.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    Positions, velocities and masses live in `multiprocessing.shared_memory`
+    buffers that every worker maps as NumPy arrays. Each worker owns a fixed,
+    contiguous block of target bodies and, on every step:
+
+        1. computes the acceleration of its own bodies from all N bodies,
+        2. kicks its own velocities,
+        3. waits at a barrier until every worker has finished reading positions,
+        4. drifts its own positions,
+        5. waits at a barrier again before the next force pass.
+
+    Workers are started from `worker_context`, which the other process
+    pools (`nbody_parareal`, `nbody_sweep`) use as well. Only the
+    (dt, iterations) command is sent to the workers per call to :advance --
+    nothing is pickled per step. Because each body's acceleration
+    is written by exactly one worker, summed over the same j order as the
+    serial engine, no cross-worker reduction is needed and the result does
+    not depend on the number of processes.
+
+    A worker that raises sends its exception back and breaks the barrier;
+    one that dies is noticed while the parent waits. Either way the parent
+    aborts the barrier, terminates the workers and raises, instead of every
+    process waiting forever on the others.
+
+    Run the solar system from the terminal as such:
+
+        $ python nbody_parallel.py
+
+    or measure speedup over processes with:
+
+        $ python nbody_parallel.py bench [N]
+"""
+
+# Longest a worker waits at a barrier for the others, in seconds.
+TIMEOUT = 600.0
+
+# How often the parent checks that its workers are alive while waiting, in seconds.
+POLL_INTERVAL = 0.1
+
+
+def worker_context():
+    """The `multiprocessing` context that every worker pool here starts processes from.
+
+    Always 'spawn': a parent that has already run a threaded engine (Numba's
+    TBB or OpenMP layer, OpenMP in `nbody_cython`) cannot be forked safely.
+    The child inherits locks held by threads that were not copied and can
+    deadlock, and the parent can hang at exit.
+    """
+
+    return get_context('spawn')
+
+
+def _attach(name, shape):
+    """Map the shared memory block :name as a float64 array of :shape."""
+
+    shm = SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def _worker(names, n, rows, commands, done, barrier, timeout):
+    """Worker loop: step our block of bodies until told to stop.
+
+    :param names: shared memory names of (positions, velocities, masses)
+    :param n: number of bodies
+    :param rows: (first, last) range of bodies owned by this worker
+    :param commands: queue of (dt, iterations) commands, None to stop
+    :param done: queue to acknowledge finished commands on (None), or to
+        send the exception that stopped this worker
+    :param barrier: barrier shared by every worker
+    :param timeout: longest wait at the barrier, in seconds
+    """
+
+    (first, last) = rows
+    (shm_r, positions) = _attach(names[0], (n, 3))
+    (shm_v, velocities) = _attach(names[1], (n, 3))
+    (shm_m, masses) = _attach(names[2], (n,))
+
+    acc = np.empty((last - first, 3))
+
+    try:
+        for (dt, iterations) in iter(commands.get, None):
+
+            for _ in range(iterations):
+                nbody_numpy.accelerations(positions, masses, out=acc, rows=rows)
+                acc *= dt
+                velocities[first:last] += acc
+                barrier.wait(timeout)
+
+                positions[first:last] += dt * velocities[first:last]
+                barrier.wait(timeout)
+
+            done.put(None)
+
+    # Another worker failed (and reported), or the parent gave up on us.
+    except BrokenBarrierError:
+        pass
+
+    except Exception as error:
+        barrier.abort()
+        done.put(error)
+
+    finally:
+        del positions, velocities, masses
+        for shm in (shm_r, shm_v, shm_m):
+            shm.close()
+
+
+class SharedSystem(object):
+    """A system of bodies in shared memory, stepped by a pool of workers.
+
+    Use as a context manager so that workers and buffers are always released:
+
+        with SharedSystem(positions, velocities, masses, processes=8) as system:
+            system.advance(0.01, 20000)
+            print(system.report_energy())
+    """
+
+    def __init__(self, positions, velocities, masses, processes=None, timeout=TIMEOUT):
+        """Copy the system into shared memory and start the workers.
+
+        :param positions: (N, 3) array of positions
+        :param velocities: (N, 3) array of velocities
+        :param masses: (N,) array of masses
+        :param processes: number of worker processes (defaults to cpu_count())
+        :param timeout: longest a worker waits at a barrier, in seconds
+        """
+
+        n = len(masses)
+        self.timeout = timeout
+        processes = max(1, min(processes or cpu_count(), n))
+
+        self._shm = []
+        (self.positions, self.velocities, self.masses) = [
+            self._share(array) for array in (positions, velocities, masses)
+        ]
+
+        # Split target bodies into one contiguous block per worker.
+        bounds = np.linspace(0, n, processes + 1).astype(int)
+        names = tuple(shm.name for shm in self._shm)
+
+        context = worker_context()
+        self._done = context.Queue()
+        self._commands = [context.Queue() for _ in range(processes)]
+
+        # Held here: spawned workers rebuild it from its name after we return.
+        self._barrier = context.Barrier(processes)
+
+        self._workers = [
+            context.Process(target=_worker,
+                            args=(names, n, (bounds[i], bounds[i + 1]),
+                                  self._commands[i], self._done, self._barrier, timeout),
+                            daemon=True)
+            for i in range(processes)
+        ]
+
+        for worker in self._workers:
+            worker.start()
+
+    def _share(self, array):
+        """Allocate a shared memory block holding a float64 copy of :array."""
+
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        self._shm.append(shm)
+
+        shared = np.ndarray(array.shape, dtype=np.float64, buffer=shm.buf)
+        shared[...] = array
+        return shared
+
+    def advance(self, dt, iterations):
+        """Advance the system :dt time, :iterations times.
+
+        :param dt: the change in time between the previous time and now
+        :param iterations: the number of times to do :dt advances in one simulation.
+        """
+
+        for commands in self._commands:
+            commands.put((dt, iterations))
+
+        for _ in self._workers:
+            error = self._next()
+
+            if error is not None:
+                self._abort()
+                raise error
+
+    def _next(self):
+        """Wait for the next worker to finish its command.
+
+        :return: None, or the exception a worker raised (a RuntimeError if it died)
+        """
+
+        while True:
+            try:
+                return self._done.get(timeout=POLL_INTERVAL)
+
+            except Empty:
+                dead = [worker for worker in self._workers if not worker.is_alive()]
+
+                if dead:
+                    # A worker that raised may still have its report in flight.
+                    try:
+                        return self._done.get(timeout=POLL_INTERVAL)
+                    except Empty:
+                        return RuntimeError("Worker {} stopped during advance (exit code {}).".format(
+                            dead[0].pid, dead[0].exitcode))
+
+    def _abort(self):
+        """Release every worker from the barrier and stop them."""
+
+        self._barrier.abort()
+
+        for worker in self._workers:
+            worker.terminate()
+            worker.join()
+
+    def report_energy(self, e=0.0):
+        """Compute the energy of the shared system.
+
+        :param e: baseline energy
+        :return: e
+        """
+
+        return nbody_numpy.report_energy(self.positions, self.velocities, self.masses, e)
+
+    def close(self):
+        """Stop the workers and release the shared memory."""
+
+        for commands in self._commands:
+            commands.put(None)
+
+        for worker in self._workers:
+            worker.join(self.timeout)
+
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+        del self.positions, self.velocities, self.masses
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+
+        self._shm = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def advance(dt, iterations, positions, velocities, masses, processes=None):
+    """Advance the system :dt time, :iterations times (in place), in parallel.
+
+    Every call starts (spawns) and stops its own workers, ~0.4s on top of
+    the steps; to advance the same system repeatedly, keep one `SharedSystem`
+    (as `nbody` and `nbody_engines.session` do).
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param processes: number of worker processes (defaults to cpu_count())
+    """
+
+    with SharedSystem(positions, velocities, masses, processes) as system:
+        system.advance(dt, iterations)
+        positions[...] = system.positions
+        velocities[...] = system.velocities
+
+
+def report_energy(positions, velocities, masses, e=0.0):
+    """Compute the energy and return it, serially as `SharedSystem.report_energy` does.
+
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param e: baseline energy
+    :return: e
+    """
+
+    return nbody_numpy.report_energy(positions, velocities, masses, e)
+
+
+def nbody(loops, reference, iterations, bodies, dt=0.01, processes=None):
+    """N-body simulation.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
+    :param processes: number of worker processes (defaults to cpu_count())
+    """
+
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+
+    nbody_numpy.offset_momentum(velocities, masses,
+                                nbody_numpy.reference_index(body_names, reference))
+
+    with SharedSystem(positions, velocities, masses, processes) as system:
+
+        for _ in range(loops):
+
+            system.advance(dt, iterations)
+
+            print(system.report_energy())
+
+        nbody_numpy.to_bodies(bodies, body_names, system.positions, system.velocities)
+
+
+def benchmark(n=5000, iterations=3, dt=1e-4, processes=None):
+    """Measure speedup of :advance over 1, 2, 4, ... worker processes.
+
+    :param n: number of bodies
+    :param iterations: number of timesteps to advance per measurement
+    :param dt: timestep
+    :param processes: largest number of worker processes (defaults to cpu_count())
+    :return results: list of (processes, seconds, speedup)
+    """
+
+    counts = [1]
+    while counts[-1] * 2 <= (processes or cpu_count()):
+        counts.append(counts[-1] * 2)
+    if counts[-1] != (processes or cpu_count()):
+        counts.append(processes or cpu_count())
+
+    results = []
+
+    for p in counts:
+        (positions, velocities, masses) = nbody_numpy.random_system(n)
+
+        with SharedSystem(positions, velocities, masses, p) as system:
+
+            # Warm up the workers before timing.
+            system.advance(dt, 1)
+
+            start = perf_counter()
+            system.advance(dt, iterations)
+            elapsed = perf_counter() - start
+
+        results.append((p, elapsed, results[0][1] / elapsed if results else 1.0))
+        print('processes={:>3d}  {:9.4f}s  speedup {:6.2f}x'.format(*results[-1]))
+
+    return results
+
+
+if __name__ == '__main__':
+
+    if len(argv) > 1 and argv[1] == 'bench':
+        benchmark(n=int(argv[2]) if len(argv) > 2 else 5000)
+
+    else:
+        from nbody import BODIES
+        nbody(100, 'sun', 20000, deepcopy(BODIES))
@@ -0,0 +1,232 @@
+from copy import deepcopy
+from multiprocessing import cpu_count
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+import nbody_engines
+import nbody_integrators
+import nbody_numpy
+import nbody_parallel
+
+"""
+    N-body simulation, Parareal parallel-in-time integration.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    The production run is 5 bodies for 2,000,000 steps: there is nothing to
+    split in space, but plenty in time. Parareal cuts a stretch of time into
+    P slices and uses two propagators,
+
+        F -- the fine one: the existing `advance` kernel at the usual dt,
+        G -- a coarse one: 4th-order Yoshida at :ratio times the dt, cheap
+             but close to F over one slice,
+
+    and iterates
+
+        U[0]         = initial state,     U[n + 1] = G(U[n])
+        U'[n + 1]    = G(U'[n]) + F(U[n]) - G(U[n])
+
+    where the P fine solves F(U[n]) of one iteration are independent and run
+    on P workers, and only the cheap G sweep is serial. After k iterations
+    the first k slices are exact, so those are not re-solved and at most P
+    iterations are ever needed; the run stops as soon as no slice boundary
+    moves by more than :tolerance. The wall time is then about k fine
+    slices plus k + 1 coarse sweeps instead of P fine slices.
+
+    Orbits turn small coarse errors into phase errors that grow with time,
+    and over a long stretch Parareal needs nearly P iterations. So a long
+    run is cut into windows of WINDOW fine steps, each one integrated with
+    Parareal before the next one starts from its end.
+
+    Workers come from a `multiprocessing.Pool` started from
+    `nbody_parallel.worker_context` by default. Any executor with a `map`
+    method works, e.g. `mpi4py.futures.MPIPoolExecutor` to spread slices
+    over MPI ranks.
+
+    Compare against a serial run from the terminal with:
+
+        $ python nbody_parareal.py [SLICES] [STEPS]
+"""
+
+# Fine steps per Parareal window. Longer windows let coarse phase errors grow
+# until the iteration needs nearly as many passes as there are slices.
+WINDOW = 40000
+
+
+def yoshida4(dt, iterations, positions, velocities, masses):
+    """Default coarse propagator: 4th-order Yoshida, accurate at large timesteps."""
+
+    nbody_integrators.advance(dt, iterations, positions, velocities, masses, 'yoshida4')
+
+
+def _propagate(task):
+    """Advance one (positions, velocities, masses) state; run in a worker.
+
+    The propagator is an engine name in `nbody_engines` or a function with
+    the `nbody_numpy.advance` signature.
+    """
+
+    (propagator, dt, steps, positions, velocities, masses) = task
+
+    if isinstance(propagator, str):
+        propagator = nbody_engines.load(propagator).advance
+
+    (positions, velocities) = (positions.copy(), velocities.copy())
+    propagator(dt, steps, positions, velocities, masses)
+
+    return positions, velocities
+
+
+def _window(dt, steps, state, masses, slices, ratio, tolerance, fine, coarse, executor):
+    """Run Parareal over one window of :steps fine steps from :state.
+
+    :return: ((positions, velocities) at the end of the window, list of changes)
+    """
+
+    (fine_steps, coarse_steps) = (steps // slices, steps // slices // ratio)
+
+    def coarse_solve(state):
+        return _propagate((coarse, dt * ratio, coarse_steps, state[0], state[1], masses))
+
+    # Initial guess: one serial coarse sweep.
+    states = [state]
+    guesses = []
+    for _ in range(slices):
+        guesses.append(coarse_solve(states[-1]))
+        states.append(guesses[-1])
+
+    scale = np.abs(np.concatenate(state)).max()
+    changes = []
+
+    for k in range(slices):
+
+        # Slices before k are already exact; only re-solve the rest.
+        solved = list(executor.map(_propagate, [(fine, dt, fine_steps, r, v, masses)
+                                                for (r, v) in states[k:slices]]))
+
+        change = 0.0
+        for n in range(k, slices):
+            guess = coarse_solve(states[n]) if n > k else guesses[n]
+            update = tuple(g + f - c for (g, f, c) in zip(guess, solved[n - k], guesses[n]))
+
+            change = max(change, max(np.abs(a - b).max() for (a, b) in zip(update, states[n + 1])))
+            (guesses[n], states[n + 1]) = (guess, update)
+
+        changes.append(change / scale)
+        if changes[-1] < tolerance:
+            break
+
+    return states[-1], changes
+
+
+def parareal(dt, steps, positions, velocities, masses, slices=None, window=WINDOW, ratio=25,
+             tolerance=1e-8, fine='auto', coarse=yoshida4, executor=None):
+    """Advance the system :dt time, :steps times with Parareal (in place).
+
+    The run is cut into windows of :window fine steps, each integrated by
+    Parareal over :slices time slices, one window after the other.
+
+    :param dt: fine timestep
+    :param steps: total number of fine timesteps (a multiple of :window)
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param slices: number of time slices per window (defaults to cpu_count())
+    :param window: number of fine timesteps per window (None for a single window)
+    :param ratio: coarse timestep / fine timestep
+    :param tolerance: stop once no slice boundary moves more than this,
+        relative to the size of the state
+    :param fine: engine name in `nbody_engines` for F ('auto' selects one),
+        or a module-level function with the `nbody_numpy.advance` signature
+    :param coarse: engine name or function for G
+    :param executor: object with a `map` method to run fine solves on
+        (defaults to a process pool of :slices workers)
+    :return: for every window, the list of its largest boundary change per iteration
+    """
+
+    slices = slices or cpu_count()
+    window = min(window or steps, steps)
+
+    if steps % window or window % slices or (window // slices) % ratio:
+        raise ValueError("{} steps do not split into windows of {} steps, each of {} slices of "
+                         "whole coarse steps (ratio {}).".format(steps, window, slices, ratio))
+
+    fine = nbody_engines.select(len(masses)) if fine == 'auto' else fine
+    state = (positions.copy(), velocities.copy())
+    history = []
+
+    own = executor is None
+    executor = nbody_parallel.worker_context().Pool(slices) if own else executor
+
+    try:
+        for _ in range(steps // window):
+            (state, changes) = _window(dt, window, state, masses, slices, ratio, tolerance,
+                                       fine, coarse, executor)
+            history.append(changes)
+
+    finally:
+        if own:
+            executor.close()
+            executor.join()
+
+    (positions[...], velocities[...]) = state
+
+    return history
+
+
+def benchmark(slices=None, steps=WINDOW, dt=0.01, ratio=25, tolerance=1e-8):
+    """Compare Parareal against a serial fine run of the solar system.
+
+    This machine may have fewer cores than slices, so besides the wall time
+    here the expected wall time on :slices cores is modelled from measured
+    costs: k fine slices plus k + 1 coarse sweeps per window.
+
+    :param slices: number of time slices (defaults to cpu_count(), at least 16)
+    :param steps: total number of fine timesteps
+    :param dt: fine timestep
+    :param ratio: coarse timestep / fine timestep
+    :param tolerance: convergence tolerance
+    :return: (iterations per window, max position error, serial seconds,
+        parareal seconds here, modelled speedup on :slices cores)
+    """
+
+    from nbody import BODIES
+
+    slices = slices or max(cpu_count(), 16)
+    window = min(WINDOW, steps)
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(deepcopy(BODIES))
+    nbody_numpy.offset_momentum(velocities, masses, nbody_numpy.reference_index(body_names, 'sun'))
+
+    fine = nbody_engines.select(len(masses))
+
+    start = perf_counter()
+    (r, v) = _propagate((fine, dt, steps, positions, velocities, masses))
+    serial = perf_counter() - start
+
+    start = perf_counter()
+    _propagate((yoshida4, dt * ratio, window // ratio, positions, velocities, masses))
+    sweep = perf_counter() - start
+
+    start = perf_counter()
+    history = parareal(dt, steps, positions, velocities, masses, slices, window, ratio, tolerance)
+    elapsed = perf_counter() - start
+
+    iterations = [len(changes) for changes in history]
+    model = serial / sum(k * serial * window / steps / slices + (k + 1) * sweep
+                         for k in iterations)
+    error = np.abs(positions - r).max()
+
+    print('engine={}  slices={}  windows={}  iterations={}'.format(
+        fine, slices, len(history), iterations))
+    print('max position error vs serial {:.2e}'.format(error))
+    print('serial {:.2f}s  parareal {:.2f}s here ({} cores)  modelled speedup on {} cores {:.2f}x'.format(
+        serial, elapsed, cpu_count(), slices, model))
+
+    return iterations, error, serial, elapsed, model
+
+
+if __name__ == '__main__':
+    benchmark(slices=int(argv[1]) if len(argv) > 1 else None,
+              steps=int(argv[2]) if len(argv) > 2 else 20000)
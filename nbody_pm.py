@@ -0,0 +1,242 @@
+from itertools import product
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+import nbody_numpy
+
+"""
+    N-body simulation, particle-mesh (PM) backend for periodic boxes.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    Instead of summing pairs, every step we:
+
+        1. deposit mass onto a G x G x G grid with cloud-in-cell (CIC) weights,
+        2. solve Poisson's equation, k^2 phi_k = -4 pi rho_k, with NumPy FFTs,
+        3. take a = -grad(phi) by finite differences on the grid and
+           interpolate it back to the bodies with the same CIC weights.
+
+    That costs roughly O(N + G^3 log G) per step. Forces are periodic (the box
+    wraps around) and smoothed below a couple of grid cells, so this is meant
+    for uniform, high-N boxes rather than the five-body solar system.
+
+    Compare accuracy and wall time against direct summation with:
+
+        $ python nbody_pm.py [GRID]
+"""
+
+# Default number of grid cells per side.
+GRID_SIZE = 64
+
+
+def _cic(positions, box_size, grid):
+    """Cloud-in-cell indices and weights for each body.
+
+    :return: (lower cell, upper cell, fractional offset), each (N, 3)
+    """
+
+    u = positions * (grid / box_size)
+    lower = np.floor(u)
+    frac = u - lower
+    lower = lower.astype(np.int64) % grid
+    upper = (lower + 1) % grid
+
+    return lower, upper, frac
+
+
+def _corners(lower, upper, frac, grid):
+    """Yield (flat grid index, weight) for each of the eight CIC corners."""
+
+    for corner in product((0, 1), repeat=3):
+        index = np.zeros(len(frac), dtype=np.int64)
+        weight = np.ones(len(frac))
+
+        for (axis, c) in enumerate(corner):
+            index = index * grid + (upper[:, axis] if c else lower[:, axis])
+            weight = weight * (frac[:, axis] if c else 1.0 - frac[:, axis])
+
+        yield index, weight
+
+
+def deposit(positions, masses, box_size, grid=GRID_SIZE):
+    """Deposit mass onto the grid and return the density field.
+
+    :param positions: (N, 3) array of positions inside [0, :box_size)
+    :param masses: (N,) array of masses
+    :param box_size: side length of the periodic box
+    :param grid: number of grid cells per side
+    :return: (grid, grid, grid) density field
+    """
+
+    (lower, upper, frac) = _cic(positions, box_size, grid)
+    rho = np.zeros(grid ** 3)
+
+    for (index, weight) in _corners(lower, upper, frac, grid):
+        rho += np.bincount(index, masses * weight, minlength=grid ** 3)
+
+    return rho.reshape(grid, grid, grid) * (grid / box_size) ** 3
+
+
+def interpolate(fields, positions, box_size):
+    """Interpolate grid fields back to the bodies with CIC weights.
+
+    :param fields: (grid, grid, grid, C) array of C fields
+    :param positions: (N, 3) array of positions
+    :param box_size: side length of the periodic box
+    :return: (N, C) interpolated values
+    """
+
+    grid = fields.shape[0]
+    flat = fields.reshape(grid ** 3, -1)
+
+    (lower, upper, frac) = _cic(positions, box_size, grid)
+    out = np.zeros((len(positions), flat.shape[1]))
+
+    for (index, weight) in _corners(lower, upper, frac, grid):
+        out += weight[:, None] * flat[index]
+
+    return out
+
+
+def _wavenumbers(box_size, grid):
+    """Wavenumbers of the real FFT of a (grid, grid, grid) field."""
+
+    k = 2 * np.pi * np.fft.fftfreq(grid, d=box_size / grid)
+    kz = 2 * np.pi * np.fft.rfftfreq(grid, d=box_size / grid)
+
+    return k[:, None, None], k[None, :, None], kz[None, None, :]
+
+
+def solve(positions, masses, box_size, grid=GRID_SIZE, softening=0.0, potential=False):
+    """Compute the mesh accelerations (and optionally potentials) at each body.
+
+    :param positions: (N, 3) array of positions inside [0, :box_size)
+    :param masses: (N,) array of masses
+    :param box_size: side length of the periodic box
+    :param grid: number of grid cells per side
+    :param softening: Gaussian softening length
+    :param potential: whether to also return the potential at each body
+    :return: (N, 3) accelerations (and (N,) potentials)
+    """
+
+    rho_k = np.fft.rfftn(deposit(positions, masses, box_size, grid))
+    (kx, ky, kz) = _wavenumbers(box_size, grid)
+    k2 = kx * kx + ky * ky + kz * kz
+
+    # Green's function, with the mean density (k = 0) removed.
+    k2[0, 0, 0] = 1.0
+    phi_k = -4 * np.pi * rho_k / k2
+    phi_k[0, 0, 0] = 0.0
+
+    if softening:
+        phi_k *= np.exp(-0.5 * k2 * softening * softening)
+
+    phi = np.fft.irfftn(phi_k, s=(grid,) * 3, axes=(0, 1, 2))
+
+    # a = -grad(phi) by fourth-order centered differences on the grid.
+    h = box_size / grid
+    fields = [-(8 * (np.roll(phi, -1, axis) - np.roll(phi, 1, axis)) -
+                (np.roll(phi, -2, axis) - np.roll(phi, 2, axis))) / (12 * h)
+              for axis in range(3)]
+    if potential:
+        fields.append(phi)
+
+    values = interpolate(np.stack(fields, axis=-1), positions, box_size)
+
+    return (values[:, :3], values[:, 3]) if potential else values
+
+
+def accelerations(positions, masses, box_size, grid=GRID_SIZE, softening=0.0):
+    """Compute the mesh acceleration on every body.
+
+    :param positions: (N, 3) array of positions inside [0, :box_size)
+    :param masses: (N,) array of masses
+    :param box_size: side length of the periodic box
+    :param grid: number of grid cells per side
+    :param softening: Gaussian softening length
+    :return: (N, 3) array of accelerations
+    """
+
+    return solve(positions, masses, box_size, grid, softening)
+
+
+def advance(dt, iterations, positions, velocities, masses,
+            box_size, grid=GRID_SIZE, softening=0.0):
+    """Advance the system :dt time, :iterations times (in place).
+
+    Positions are wrapped back into the periodic box after every drift.
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param box_size: side length of the periodic box
+    :param grid: number of grid cells per side
+    :param softening: Gaussian softening length
+    """
+
+    for _ in range(iterations):
+        velocities += dt * accelerations(positions, masses, box_size, grid, softening)
+        positions += dt * velocities
+        positions %= box_size
+
+
+def report_energy(positions, velocities, masses, box_size, e=0.0,
+                  grid=GRID_SIZE, softening=0.0):
+    """Compute the energy, with the potential taken from the mesh.
+
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param box_size: side length of the periodic box
+    :param e: baseline energy
+    :param grid: number of grid cells per side
+    :param softening: Gaussian softening length
+    :return: e
+    """
+
+    (_, phi) = solve(positions, masses, box_size, grid, softening, potential=True)
+
+    return e + 0.5 * np.dot(masses, phi) + nbody_numpy.kinetic_energy(velocities, masses)
+
+
+def benchmark(sizes=(2000, 8000, 32000), grid=GRID_SIZE, box_size=1.0, softening=0.02):
+    """Compare one mesh force evaluation against direct summation.
+
+    Bodies fill a small cluster in the middle of the box, so the periodic
+    images the mesh also feels are far away compared with the cluster.
+
+    :param sizes: numbers of bodies to sweep over
+    :param grid: number of grid cells per side
+    :param box_size: side length of the periodic box
+    :param softening: Gaussian softening length of the mesh (and Plummer of the direct sum)
+    :return results: list of (n, mesh seconds, direct seconds, median error)
+    """
+
+    results = []
+
+    for n in sizes:
+        (positions, _, masses) = nbody_numpy.random_system(n)
+        positions = box_size * (0.5 + 0.125 * positions)
+
+        start = perf_counter()
+        approx = accelerations(positions, masses, box_size, grid, softening)
+        mesh_time = perf_counter() - start
+
+        start = perf_counter()
+        exact = nbody_numpy.accelerations(positions, masses, softening=softening)
+        direct_time = perf_counter() - start
+
+        err = np.linalg.norm(approx - exact, axis=1) / np.linalg.norm(exact, axis=1)
+        results.append((n, mesh_time, direct_time, np.median(err)))
+        print('N={:>7d}  mesh {:8.3f}s  direct {:8.3f}s  '
+              'median err {:.2e}'.format(*results[-1]))
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(grid=int(argv[1]) if len(argv) > 1 else GRID_SIZE)
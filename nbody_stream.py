@@ -0,0 +1,202 @@
+from copy import deepcopy
+from sys import argv
+
+import nbody_numpy
+
+"""
+    N-body simulation, generator-based streaming API.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    `nbody` prints energies to stdout, so anything downstream has to parse
+    text. Here `simulate` is a generator that yields a `State` every :every
+    steps:
+
+        for state in simulate(positions, velocities, masses, every=100):
+            plot(state.time, state.positions[:, 0])
+
+    A `State` holds read-only views of the live arrays rather than copies,
+    and its energy is only computed if a consumer asks for it. Because the
+    generator does not step again until the consumer asks for the next state,
+    a slow sink naturally holds the simulation back instead of letting it
+    race ahead and queue snapshots in memory.
+
+    The views change once the generator resumes, so a consumer that keeps a
+    state around has to `copy()` it first; reading the energy of a stale
+    state raises instead of silently returning the wrong number.
+
+    Stages such as `record` and `monitor` take and yield states, so they can
+    be chained lazily:
+
+        states = simulate(r, v, m, every=20000)
+        for state in monitor(record(states, writer), tolerance=1e-6):
+            ...
+
+    Run the solar system from the terminal as such:
+
+        $ python nbody_stream.py [LOOPS]
+"""
+
+
+def _read_only(array):
+    """A view of :array that cannot be written through."""
+
+    view = array.view()
+    view.flags.writeable = False
+
+    return view
+
+
+class State(object):
+    """One point of a simulation: time, step, positions, velocities and masses.
+
+    Arrays are read-only views of the simulation's own arrays, valid until the
+    generator that yielded this state resumes.
+    """
+
+    __slots__ = ('time', 'step', 'positions', 'velocities', 'masses', '_energy', '_clock', '_tick')
+
+    def __init__(self, time, step, positions, velocities, masses, clock=None, energy=None):
+        self.time = time
+        self.step = step
+        self.positions = positions
+        self.velocities = velocities
+        self.masses = masses
+
+        self._energy = energy
+        self._clock = clock
+        self._tick = clock[0] if clock else None
+
+    @property
+    def stale(self):
+        """Whether the simulation has moved on since this state was yielded."""
+
+        return self._clock is not None and self._clock[0] != self._tick
+
+    @property
+    def energy(self):
+        """Total energy, computed on first access."""
+
+        if self._energy is None:
+            if self.stale:
+                raise RuntimeError("State at step {} is stale; copy() it before resuming the "
+                                   "simulation.".format(self.step))
+
+            self._energy = nbody_numpy.report_energy(self.positions, self.velocities, self.masses)
+
+        return self._energy
+
+    def copy(self):
+        """Detach this state from the simulation (copies arrays, fixes the energy)."""
+
+        return State(self.time, self.step, self.positions.copy(), self.velocities.copy(),
+                     self.masses.copy(), energy=self.energy)
+
+
+def simulate(positions, velocities, masses, dt=0.01, every=1, steps=None, time=0.0,
+             advance=nbody_numpy.advance):
+    """Advance the system in place, yielding a `State` every :every steps.
+
+    The first state is the one passed in (step 0).
+
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param dt: timestep
+    :param every: number of timesteps between yielded states
+    :param steps: stop after this many timesteps (None runs until the consumer stops)
+    :param time: simulation time of the initial state
+    :param advance: engine with the `nbody_numpy.advance` signature
+    :return: generator of states
+    """
+
+    # Checked here, not on the first next(): 0 would never advance.
+    if every < 1:
+        raise ValueError("States must be at least one step apart (every={}).".format(every))
+
+    return _simulate(positions, velocities, masses, dt, every, steps, time, advance)
+
+
+def _simulate(positions, velocities, masses, dt, every, steps, time, advance):
+    """The generator behind `simulate`."""
+
+    views = (_read_only(positions), _read_only(velocities), _read_only(masses))
+    clock = [0]
+    step = 0
+
+    while True:
+        yield State(time + step * dt, step, *views, clock=clock)
+        clock[0] += 1
+
+        if steps is not None and step >= steps:
+            return
+
+        iterations = every if steps is None else min(every, steps - step)
+        advance(dt, iterations, positions, velocities, masses)
+        step += iterations
+
+
+def stream(reference, bodies, dt=0.01, every=1, steps=None):
+    """`simulate` a {name : body_information} system around :reference.
+
+    :param reference: body at center of system
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
+    :param every: number of timesteps between yielded states
+    :param steps: stop after this many timesteps (None runs until the consumer stops)
+    """
+
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+    nbody_numpy.offset_momentum(velocities, masses,
+                                nbody_numpy.reference_index(body_names, reference))
+
+    return simulate(positions, velocities, masses, dt, every, steps)
+
+
+def record(states, writer):
+    """Append every state to :writer (e.g. a `nbody_trajectory.TrajectoryWriter`) and pass it on."""
+
+    for state in states:
+        writer.append(state.time, state.step, state.positions, state.velocities)
+        yield state
+
+
+def monitor(states, tolerance):
+    """Pass states on, raising once the relative energy drift exceeds :tolerance."""
+
+    e0 = None
+
+    for state in states:
+        if e0 is None:
+            e0 = state.energy
+
+        drift = abs((state.energy - e0) / e0)
+        if drift > tolerance:
+            raise RuntimeError("Relative energy drift {:.3e} at step {} exceeds {:.3e}.".format(
+                drift, state.step, tolerance))
+
+        yield state
+
+
+def nbody(loops, reference, iterations, bodies, dt=0.01):
+    """N-body simulation as a consumer of :stream.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
+    :return energies: list of the energy after each loop
+    """
+
+    states = stream(reference, bodies, dt, iterations, loops * iterations)
+
+    # Step 0 is the initial state, whose energy is never asked for.
+    return [state.energy for state in states if state.step]
+
+
+if __name__ == '__main__':
+    from nbody import BODIES
+    for e in nbody(int(argv[1]) if len(argv) > 1 else 100, 'sun', 20000, deepcopy(BODIES)):
+        print(e)
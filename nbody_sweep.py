@@ -0,0 +1,275 @@
+from copy import deepcopy
+from hashlib import sha256
+from itertools import product
+from multiprocessing import cpu_count
+from sys import argv
+from time import perf_counter
+import json
+import os
+import tempfile
+import numpy as np
+
+import nbody_engines
+import nbody_numpy
+import nbody_parallel
+
+"""
+    N-body simulation, parameter sweeps with a content-addressed result cache.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    A sweep is a list of jobs -- one initial `bodies` dictionary, a timestep,
+    a number of steps and an engine each -- usually a grid over dt, steps
+    and small perturbations of the initial conditions. Sweeps overlap and
+    get rerun, so every job is named by the SHA-256 of its inputs:
+
+        - the bodies in their dictionary order (the order changes the
+          floating-point sums), every float written out exactly,
+        - dt, steps, the reference body and the engine, with 'auto'
+          resolved first, since engines do not agree to the last bit,
+        - CACHE_VERSION, bumped whenever results would change.
+
+    `ResultCache` keeps one JSON file per key in a directory. A hit touches
+    the file, and whenever a write takes the directory past :max_bytes the
+    least recently used results are deleted until it fits again.
+
+    `sweep` answers what it can from the cache, runs each missing key once
+    (duplicates within a sweep share the run) on a process pool, stores
+    the new results and returns everything in job order.
+
+    Run a grid over the solar system twice -- the second run comes from the
+    cache -- from the terminal with:
+
+        $ python nbody_sweep.py [CACHE_DIRECTORY]
+"""
+
+# Part of every key; bump when a change to the engines changes results.
+CACHE_VERSION = 1
+
+# Default size limit of a cache directory, in bytes.
+MAX_BYTES = 256 << 20
+
+
+def job(bodies, dt=0.01, steps=1000, engine='auto', reference='sun'):
+    """Describe one run. The bodies are copied, so the job does not change with them.
+
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
+    :param steps: number of timesteps
+    :param engine: engine name in `nbody_engines`, or 'auto' to `select` one now
+    :param reference: body whose velocity cancels the total momentum
+    :return: job dictionary
+    """
+
+    if engine == 'auto':
+        engine = nbody_engines.select(len(bodies))
+
+    return {'bodies': [[name, list(r), list(v), float(m)] for (name, (r, v, m)) in bodies.items()],
+            'dt': float(dt), 'steps': int(steps), 'engine': engine, 'reference': reference}
+
+
+def key(job):
+    """Content address of :job: hex SHA-256 of its canonical JSON form."""
+
+    text = json.dumps([CACHE_VERSION, job], sort_keys=True, separators=(',', ':'))
+    return sha256(text.encode('utf-8')).hexdigest()
+
+
+def perturbed(bodies, scale, seed=0):
+    """A copy of :bodies with every position and velocity component multiplied
+    by (1 + :scale * standard normal noise), as in `nbody_ensemble.perturb`.
+
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param scale: relative size of the perturbation (0 for an exact copy)
+    :param seed: random seed
+    :return: perturbed {name : body_information} dictionary
+    """
+
+    rng = np.random.default_rng(seed)
+    copy = {}
+
+    for (name, (r, v, m)) in bodies.items():
+        noise = 1.0 + scale * rng.standard_normal(6) if scale else np.ones(6)
+        copy[name] = ((np.array(r) * noise[:3]).tolist(), (np.array(v) * noise[3:]).tolist(), m)
+
+    return copy
+
+
+def grid(bodies, dts=(0.01,), steps=(1000,), scales=(0.0,), seeds=(0,), engine='auto',
+         reference='sun'):
+    """Jobs for every combination of timestep, step count and perturbation.
+
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param dts: timesteps
+    :param steps: numbers of timesteps
+    :param scales: perturbation sizes (see `perturbed`)
+    :param seeds: perturbation seeds
+    :param engine: engine name, or 'auto'
+    :param reference: body whose velocity cancels the total momentum
+    :return: list of jobs
+    """
+
+    return [job(perturbed(bodies, scale, seed), dt, n, engine, reference)
+            for (dt, n, scale, seed) in product(dts, steps, scales, seeds)]
+
+
+def run(job):
+    """Run :job from scratch; executed in a worker.
+
+    :param job: job dictionary
+    :return: result dictionary: final 'bodies' (same layout as the job's),
+        'energy' before and after, and 'seconds' of integration
+    """
+
+    names = [name for (name, _, _, _) in job['bodies']]
+    bodies = {name: (r, v, m) for (name, r, v, m) in deepcopy(job['bodies'])}
+
+    (_, positions, velocities, masses) = nbody_numpy.from_bodies(bodies, names)
+    nbody_numpy.offset_momentum(velocities, masses,
+                                nbody_numpy.reference_index(names, job['reference']))
+
+    backend = nbody_engines.load(job['engine'])
+    before = backend.report_energy(positions, velocities, masses)
+
+    start = perf_counter()
+    backend.advance(job['dt'], job['steps'], positions, velocities, masses)
+    seconds = perf_counter() - start
+
+    return {'bodies': [[name, r, v, m] for (name, r, v, m) in
+                       zip(names, positions.tolist(), velocities.tolist(), masses.tolist())],
+            'energy': [float(before), float(backend.report_energy(positions, velocities, masses))],
+            'seconds': seconds}
+
+
+class ResultCache(object):
+    """Directory of JSON results named by job key, evicted least recently used first."""
+
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        """
+        :param directory: cache directory (created if needed)
+        :param max_bytes: size the directory is trimmed back to after a write
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """Stored result for :key, or None; a hit makes it the most recently used."""
+
+        try:
+            with open(self._path(key)) as f:
+                result = json.load(f)
+            os.utime(self._path(key))
+
+        # Missing, or evicted by another sweep sharing the directory.
+        except (FileNotFoundError, ValueError):
+            return None
+
+        return result
+
+    def put(self, key, result):
+        """Store :result under :key, then evict until the directory fits in :max_bytes."""
+
+        # Write to a temporary file and rename, so readers never see half a result.
+        (fd, temporary) = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(result, f)
+        os.replace(temporary, self._path(key))
+
+        self.evict()
+
+    def size(self):
+        """Total bytes of stored results."""
+
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                   if entry.name.endswith('.json'))
+
+    def evict(self):
+        """Delete least recently used results until the directory fits in :max_bytes.
+
+        :return: number of results deleted
+        """
+
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.directory) if entry.name.endswith('.json'))
+        total = sum(size for (_, size, _) in entries)
+        deleted = 0
+
+        for (_, size, path) in entries:
+            if total <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total -= size
+            deleted += 1
+
+        return deleted
+
+
+def sweep(jobs, cache, processes=None):
+    """Run :jobs, serving every job already in :cache without running it.
+
+    :param jobs: list of job dictionaries
+    :param cache: ResultCache
+    :param processes: worker processes for the misses (defaults to cpu_count())
+    :return: (results in job order, number of jobs served from the cache)
+    """
+
+    keys = [key(j) for j in jobs]
+    results = {k: cache.get(k) for k in set(keys)}
+    hits = sum(results[k] is not None for k in keys)
+
+    # Each missing key runs once, however many jobs share it.
+    missing = {k: j for (k, j) in zip(keys, jobs) if results[k] is None}
+
+    if missing:
+        with nbody_parallel.worker_context().Pool(min(processes or cpu_count(), len(missing))) as pool:
+            for (k, result) in zip(missing, pool.imap(run, missing.values())):
+                cache.put(k, result)
+                results[k] = result
+
+    return [results[k] for k in keys], hits
+
+
+def benchmark(directory='sweep_cache', steps=(10000, 20000), dts=(0.01, 0.005),
+              scales=(0.0, 1e-6), seeds=(0, 1)):
+    """Run a grid over the solar system twice; the second time comes from the cache.
+
+    :param directory: cache directory
+    :param steps: numbers of timesteps
+    :param dts: timesteps
+    :param scales: perturbation sizes
+    :param seeds: perturbation seeds
+    :return: (seconds cold, seconds warm)
+    """
+
+    from nbody import BODIES
+
+    cache = ResultCache(directory)
+    timings = []
+
+    for label in ('cold', 'warm'):
+        start = perf_counter()
+        jobs = grid(BODIES, dts, steps, scales, seeds)
+        (results, hits) = sweep(jobs, cache)
+        timings.append(perf_counter() - start)
+
+        print('{}: {} jobs ({} unique), {} from cache, {:.3f}s'.format(
+            label, len(jobs), len({key(j) for j in jobs}), hits, timings[-1]))
+
+    print('cache holds {} bytes'.format(cache.size()))
+
+    return tuple(timings)
+
+
+if __name__ == '__main__':
+    benchmark(argv[1] if len(argv) > 1 else 'sweep_cache')
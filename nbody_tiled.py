@@ -0,0 +1,186 @@
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+import nbody_engines
+import nbody_numpy
+
+"""
+    N-body simulation, cache-blocked tiled force kernel.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    The all-pairs kernels stream every body's data past each target body,
+    so for N in the 10k-100k range the sources are re-read from memory N
+    times. Here bodies are cut into blocks of :tile bodies and forces are
+    computed one (i-block, j-block) tile at a time, with j-block >= i-block:
+
+        - a tile touches 2 * :tile bodies, which stay in L1/L2 while all
+          :tile ** 2 pairs in it are evaluated,
+        - every pair is visited once and updates both bodies (Newton's third
+          law), which halves the pair evaluations of the one-sided kernels.
+
+    The compiled kernels (`nbody_numba.tiled_accelerations`,
+    `nbody_cython.tiled_accelerations`) run tiles on several threads. Two
+    tiles that share a block would race on its rows, so the off-diagonal
+    tiles are grouped into rounds by `schedule` (the round-robin "circle
+    method"), in which no block appears twice, and a round's tiles run in
+    parallel.
+
+    In the NumPy kernel a tile is a (tile, tile, 3) batch of separations,
+    so the tile size also trades NumPy's per-call overhead against
+    temporaries that fit in cache.
+
+    Sweep tile sizes for every available kernel from the terminal with:
+
+        $ python nbody_tiled.py [N]
+"""
+
+TILE_SIZE = 128
+
+KERNELS = ('numpy', 'numba', 'cython')
+
+
+def schedule(blocks):
+    """Group every pair of distinct blocks into rounds of disjoint pairs.
+
+    :param blocks: number of blocks
+    :return: (rounds, slots, 2) int64 array of block pairs, -1 marking an empty slot
+    """
+
+    players = list(range(blocks)) + ([-1] if blocks % 2 else [])
+    m = len(players)
+    rounds = np.full((max(m - 1, 0), m // 2, 2), -1, dtype=np.int64)
+
+    for k in range(m - 1):
+        for s in range(m // 2):
+            (a, b) = (players[s], players[m - 1 - s])
+            rounds[k, s] = (a, b) if a >= 0 and b >= 0 else (-1, -1)
+
+        # Keep the first player fixed and rotate everyone else.
+        players = [players[0], players[-1]] + players[1:-1]
+
+    return rounds
+
+
+def accelerations(positions, masses, out=None, tile=TILE_SIZE):
+    """Tiled, symmetric acceleration kernel in NumPy.
+
+    :param positions: (N, 3) array of positions
+    :param masses: (N,) array of masses
+    :param out: optional (N, 3) array to write the result into
+    :param tile: number of bodies per block
+    :return out: (N, 3) array of accelerations
+    """
+
+    n = len(masses)
+
+    if out is None:
+        out = np.empty_like(positions)
+    out[...] = 0.0
+
+    for lo in range(0, n, tile):
+        (ri, mi) = (positions[lo:lo + tile], masses[lo:lo + tile])
+
+        # Diagonal tile: every pair inside the block, both ways.
+        d = ri[None, :, :] - ri[:, None, :]
+        r2 = np.einsum('ijk,ijk->ij', d, d)
+        np.fill_diagonal(r2, np.inf)
+        out[lo:lo + tile] += np.einsum('ij,ijk->ik', r2 ** -1.5 * mi, d)
+
+        for lo_j in range(lo + tile, n, tile):
+            (rj, mj) = (positions[lo_j:lo_j + tile], masses[lo_j:lo_j + tile])
+
+            d = rj[None, :, :] - ri[:, None, :]
+            inv3 = np.einsum('ijk,ijk->ij', d, d) ** -1.5
+
+            out[lo:lo + tile] += np.einsum('ij,ijk->ik', inv3 * mj, d)
+            out[lo_j:lo_j + tile] -= np.einsum('ij,ijk->jk', inv3 * mi[:, None], d)
+
+    return out
+
+
+def advance(dt, iterations, positions, velocities, masses, tile=TILE_SIZE, kernel='numpy'):
+    """Advance the system :dt time, :iterations times (in place).
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param tile: number of bodies per block
+    :param kernel: one of KERNELS
+    """
+
+    if kernel not in KERNELS:
+        raise ValueError("Unknown kernel `{}` -- expected one of {}.".format(
+            kernel, ', '.join(KERNELS)))
+
+    acc = np.empty_like(positions)
+
+    if kernel == 'numpy':
+        def force():
+            accelerations(positions, masses, acc, tile)
+    else:
+        compiled = nbody_engines.load(kernel).tiled_accelerations
+        rounds = schedule(-(-len(masses) // tile))
+
+        def force():
+            compiled(positions, masses, rounds, tile, acc)
+
+    for _ in range(iterations):
+        force()
+        acc *= dt
+        velocities += acc
+        positions += dt * velocities
+
+
+def report_energy(positions, velocities, masses, e=0.0):
+    """Compute the energy and return it so that it can be printed (see `nbody_numpy`)."""
+
+    return nbody_numpy.report_energy(positions, velocities, masses, e)
+
+
+def benchmark(n=10000, tiles=(32, 64, 128, 256, 512, 1024, 2048), kernels=KERNELS, iterations=1):
+    """Sweep tile sizes against the untiled kernel of each backend.
+
+    :param n: number of bodies
+    :param tiles: tile sizes to sweep
+    :param kernels: kernels to time (those that are not installed are skipped)
+    :param iterations: number of timesteps per measurement
+    :return results: {kernel : [(tile or 'untiled', seconds, pair interactions/sec)]}
+    """
+
+    (positions, velocities, masses) = nbody_numpy.random_system(n)
+    pairs = iterations * n * (n - 1) / 2
+    results = {}
+
+    for kernel in kernels:
+        if not nbody_engines.available(kernel):
+            print('{}: not available'.format(kernel))
+            continue
+
+        module = nbody_engines.load(kernel)
+        runs = [('untiled', lambda r, v: module.advance(1e-6, iterations, r, v, masses))]
+        runs += [(tile, lambda r, v, tile=tile: advance(1e-6, iterations, r, v, masses, tile, kernel))
+                 for tile in tiles]
+
+        results[kernel] = []
+        for (tile, run) in runs:
+
+            # Warm up (and compile) before timing.
+            run(positions.copy(), velocities.copy())
+
+            start = perf_counter()
+            run(positions.copy(), velocities.copy())
+            elapsed = perf_counter() - start
+
+            results[kernel].append((tile, elapsed, pairs / elapsed))
+            print('{:>7s}  tile={:>7}  {:9.4f}s  {:.3e} pairs/s'.format(kernel, tile, elapsed, pairs / elapsed))
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(n=int(argv[1]) if len(argv) > 1 else 10000)
@@ -0,0 +1,260 @@
+from copy import deepcopy
+from os.path import exists
+from sys import argv
+import json
+import numpy as np
+
+import nbody_numpy
+
+"""
+    N-body simulation, memory-mapped trajectory recorder with restart.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    `nbody` used to print one energy per loop and keep everything else in
+    memory, so a crash lost the whole run. Here snapshots of (time, step,
+    positions, velocities) are streamed into a preallocated `np.memmap` file
+    that grows in fixed-size chunks. The file layout is
+
+        [ header: HEADER_SIZE bytes ][ masses: N float64 ][ snapshots ... ]
+
+    where the header holds a magic string, the index (N, complete snapshots,
+    allocated snapshots) and a small JSON blob of metadata (body names, dt).
+    Each snapshot is written and flushed before the snapshot count in the
+    header is bumped and flushed, so after a crash the header only ever
+    points at complete snapshots, and :restart resumes from the last one.
+
+    Run (or resume) the solar system with a trajectory file as such:
+
+        $ python nbody_trajectory.py PATH
+"""
+
+MAGIC = b'NBTRAJ01'
+HEADER_SIZE = 4096
+
+# Snapshots allocated at a time when the file has to grow.
+CHUNK_SIZE = 256
+
+
+def snapshot_dtype(n):
+    """Record layout of one snapshot of :n bodies."""
+
+    return np.dtype([('time', '<f8'), ('step', '<i8'),
+                     ('positions', '<f8', (n, 3)), ('velocities', '<f8', (n, 3))])
+
+
+def _data_offset(n):
+    """Byte offset of the first snapshot, after the masses, 64-byte aligned."""
+
+    return HEADER_SIZE + -(-8 * n // 64) * 64
+
+
+class TrajectoryWriter(object):
+    """Append-only, memory-mapped trajectory file.
+
+        with TrajectoryWriter('run.traj', masses, {'dt': 0.01}) as writer:
+            writer.append(time, step, positions, velocities)
+    """
+
+    def __init__(self, path, masses=None, metadata=None, chunk=CHUNK_SIZE):
+        """Create :path (if :masses are given) or reopen it to append.
+
+        :param path: trajectory file
+        :param masses: (N,) array of masses for a new file, None to reopen
+        :param metadata: JSON-serializable dict stored in the header of a new file
+        :param chunk: number of snapshots allocated each time the file grows
+        """
+
+        self.path = path
+        self.chunk = chunk
+
+        if masses is not None:
+            _create(path, np.asarray(masses, dtype='<f8'), metadata or {}, chunk)
+
+        self.n = read_header(path)[0]
+        self._index = np.memmap(path, dtype='<i8', mode='r+', offset=len(MAGIC), shape=(3,))
+        self._map()
+
+    def _map(self):
+        """(Re)map the snapshot region for the current capacity."""
+
+        self._data = np.memmap(self.path, dtype=snapshot_dtype(self.n), mode='r+',
+                               offset=_data_offset(self.n), shape=(int(self._index[2]),))
+
+    def __len__(self):
+        return int(self._index[1])
+
+    def append(self, time, step, positions, velocities):
+        """Write one snapshot and commit it to the index.
+
+        :param time: simulation time
+        :param step: number of steps taken so far
+        :param positions: (N, 3) array of positions
+        :param velocities: (N, 3) array of velocities
+        """
+
+        (count, capacity) = (int(self._index[1]), int(self._index[2]))
+
+        if count == capacity:
+            self._grow(capacity + self.chunk)
+
+        self._data['time'][count] = time
+        self._data['step'][count] = step
+        self._data['positions'][count] = positions
+        self._data['velocities'][count] = velocities
+
+        # Data first, then the index that makes it visible.
+        self._data.flush()
+        self._index[1] = count + 1
+        self._index.flush()
+
+    def _grow(self, capacity):
+        """Extend the file to hold :capacity snapshots and remap it."""
+
+        self._data.flush()
+        del self._data
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(_data_offset(self.n) + capacity * snapshot_dtype(self.n).itemsize)
+
+        self._index[2] = capacity
+        self._index.flush()
+        self._map()
+
+    def close(self):
+        """Flush and unmap the file."""
+
+        self._data.flush()
+        self._index.flush()
+        del self._data, self._index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _create(path, masses, metadata, chunk):
+    """Write an empty trajectory file with room for :chunk snapshots."""
+
+    n = len(masses)
+    blob = json.dumps(metadata).encode('utf-8')
+    fixed = len(MAGIC) + 4 * 8
+
+    if fixed + len(blob) > HEADER_SIZE:
+        raise ValueError("Trajectory metadata is {} bytes; at most {} fit in the header.".format(
+            len(blob), HEADER_SIZE - fixed))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([n, 0, chunk, len(blob)], dtype='<i8').tobytes())
+        f.write(blob)
+        f.seek(HEADER_SIZE)
+        f.write(masses.tobytes())
+        f.truncate(_data_offset(n) + chunk * snapshot_dtype(n).itemsize)
+
+
+def read_header(path):
+    """Read the header of a trajectory file.
+
+    :param path: trajectory file
+    :return: (n, complete snapshots, allocated snapshots, metadata)
+    """
+
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("`{}` is not a trajectory file.".format(path))
+
+        (n, count, capacity, length) = np.frombuffer(f.read(4 * 8), dtype='<i8').tolist()
+        metadata = json.loads(f.read(length).decode('utf-8'))
+
+    return n, count, capacity, metadata
+
+
+def read_trajectory(path):
+    """Map the complete snapshots of a trajectory file, read-only.
+
+    :param path: trajectory file
+    :return: (masses, snapshots, metadata); snapshots is a structured memmap
+        with fields time, step, positions and velocities
+    """
+
+    (n, count, _, metadata) = read_header(path)
+
+    masses = np.fromfile(path, dtype='<f8', count=n, offset=HEADER_SIZE)
+    snapshots = np.memmap(path, dtype=snapshot_dtype(n), mode='r',
+                          offset=_data_offset(n), shape=(count,)) if count else \
+        np.empty(0, dtype=snapshot_dtype(n))
+
+    return masses, snapshots, metadata
+
+
+def restart(path):
+    """Load the last complete snapshot of a trajectory file.
+
+    :param path: trajectory file
+    :return: (time, step, positions, velocities, masses, metadata), arrays copied
+    """
+
+    (masses, snapshots, metadata) = read_trajectory(path)
+
+    if not len(snapshots):
+        raise ValueError("`{}` has no complete snapshots to restart from.".format(path))
+
+    last = snapshots[-1]
+
+    return (float(last['time']), int(last['step']),
+            np.array(last['positions']), np.array(last['velocities']), masses, metadata)
+
+
+def nbody(loops, reference, iterations, bodies, path, dt=0.01):
+    """N-body simulation, recording one snapshot per loop to :path.
+
+    If :path already holds snapshots of this system, the run resumes from the
+    last complete one instead of starting over. Resuming with a different dt,
+    iterations or body count than the file was recorded with raises ValueError.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param path: trajectory file
+    :param dt: timestep
+    """
+
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+
+    if exists(path) and read_header(path)[1]:
+        (_, step, positions, velocities, masses, metadata) = restart(path)
+        recorded = (metadata.get('dt'), metadata.get('iterations'), len(masses))
+        if recorded != (dt, iterations, len(body_names)):
+            raise ValueError("`{}` was recorded with (dt, iterations, bodies) = {}; "
+                             "cannot resume with {}.".format(path, recorded,
+                                                             (dt, iterations, len(body_names))))
+        body_names = metadata['names']
+        writer = TrajectoryWriter(path)
+    else:
+        nbody_numpy.offset_momentum(velocities, masses,
+                                    nbody_numpy.reference_index(body_names, reference))
+        step = 0
+        writer = TrajectoryWriter(path, masses, {'names': body_names, 'dt': dt,
+                                                'iterations': iterations})
+        writer.append(0.0, 0, positions, velocities)
+
+    with writer:
+        for _ in range(step // iterations, loops):
+
+            nbody_numpy.advance(dt, iterations, positions, velocities, masses)
+            step += iterations
+            writer.append(step * dt, step, positions, velocities)
+
+            print(nbody_numpy.report_energy(positions, velocities, masses))
+
+    nbody_numpy.to_bodies(bodies, body_names, positions, velocities)
+
+
+if __name__ == '__main__':
+    from nbody import BODIES
+    nbody(100, 'sun', 20000, deepcopy(BODIES), argv[1] if len(argv) > 1 else 'nbody.traj')
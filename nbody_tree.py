@@ -0,0 +1,371 @@
+from collections import namedtuple
+from copy import deepcopy
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+import nbody_numpy
+
+"""
+    N-body simulation, Barnes-Hut octree backend.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    Every other variant sums all N(N - 1)/2 pairs. Here we rebuild an octree
+    over the bodies on every step and let distant cells stand in for all of
+    the bodies they contain whenever
+
+        (cell side) / (distance to cell center of mass) < theta
+
+    which brings a force evaluation down to roughly O(N log N).
+
+    The tree is built level by level from sorted Morton (Z-order) keys, so
+    each cell owns a contiguous range of the sorted bodies and both the build
+    and the walk are batched array operations rather than per-node Python.
+
+    Run the solar system from the terminal as such:
+
+        $ python nbody_tree.py
+
+    or compare accuracy and wall time against direct summation with:
+
+        $ python nbody_tree.py bench [THETA]
+"""
+
+# Bits per dimension in a Morton key (3 * 21 = 63 bits fit in a uint64).
+MORTON_BITS = 21
+
+# Default opening angle, leaf bucket size and bodies per tree walk batch.
+THETA = 0.5
+LEAF_SIZE = 8
+CHUNK_SIZE = 4096
+
+Octree = namedtuple('Octree', [
+    'order',        # permutation that sorts bodies by Morton key
+    'positions',    # (N, 3) positions in sorted order
+    'masses',       # (N,) masses in sorted order
+    'start',        # first sorted body in each cell
+    'count',        # number of bodies in each cell
+    'first_child',  # index of each cell's first child (children are contiguous)
+    'n_children',   # number of (non-empty) children of each cell
+    'side2',        # squared side length of each cell
+    'mass',         # total mass of each cell
+    'com',          # (cells, 3) center of mass of each cell
+])
+
+
+def _spread_bits(v):
+    """Spread the low 21 bits of :v so there are two zero bits between each."""
+
+    v = v & np.uint64(0x1fffff)
+    v = (v | v << np.uint64(32)) & np.uint64(0x1f00000000ffff)
+    v = (v | v << np.uint64(16)) & np.uint64(0x1f0000ff0000ff)
+    v = (v | v << np.uint64(8)) & np.uint64(0x100f00f00f00f00f)
+    v = (v | v << np.uint64(4)) & np.uint64(0x10c30c30c30c30c3)
+    v = (v | v << np.uint64(2)) & np.uint64(0x1249249249249249)
+    return v
+
+
+def morton_keys(positions, low, side):
+    """Compute the Morton key of every body inside the cube [:low, :low + :side).
+
+    :param positions: (N, 3) array of positions
+    :param low: (3,) lower corner of the root cube
+    :param side: side length of the root cube
+    :return: (N,) uint64 array of Morton keys
+    """
+
+    scale = (1 << MORTON_BITS) / side
+    cells = np.floor((positions - low) * scale)
+    cells = np.clip(cells, 0, (1 << MORTON_BITS) - 1).astype(np.uint64)
+
+    return ((_spread_bits(cells[:, 0]) << np.uint64(2)) |
+            (_spread_bits(cells[:, 1]) << np.uint64(1)) |
+            _spread_bits(cells[:, 2]))
+
+
+def build_tree(positions, masses, leaf_size=LEAF_SIZE):
+    """Build an octree over the bodies.
+
+    :param positions: (N, 3) array of positions
+    :param masses: (N,) array of masses
+    :param leaf_size: largest number of bodies left unsplit in a cell
+    :return: Octree
+    """
+
+    n = len(masses)
+
+    # Root cube: the bounding box, made cubic and padded so nothing sits on the far edge.
+    low = positions.min(axis=0)
+    side = float(np.max(positions.max(axis=0) - low)) or 1.0
+    side *= 1.0 + 1e-9
+
+    keys = morton_keys(positions, low, side)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    pos = positions[order]
+    m = masses[order]
+
+    # Level 0 is the root cell.
+    start = [np.zeros(1, dtype=np.int64)]
+    count = [np.array([n], dtype=np.int64)]
+    side2 = [np.array([side * side])]
+    mass = [np.array([m.sum()])]
+    com = [(m @ pos / m.sum()).reshape(1, 3)]
+    first_child = []
+    n_children = []
+    total = 1
+
+    for level in range(1, MORTON_BITS + 1):
+        parent_start, parent_count = start[-1], count[-1]
+        split = np.flatnonzero(parent_count > leaf_size)
+
+        children_of = np.zeros(len(parent_start), dtype=np.int64)
+        first_of = np.zeros(len(parent_start), dtype=np.int64)
+
+        if split.size == 0:
+            first_child.append(first_of)
+            n_children.append(children_of)
+            break
+
+        # Sorted bodies that live in a cell we are splitting at this level.
+        lengths = parent_count[split]
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        sub = np.repeat(parent_start[split], lengths) + offsets
+
+        # A new child starts wherever the level-:level key prefix changes.
+        prefix = keys[sub] >> np.uint64(3 * (MORTON_BITS - level))
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(prefix)) + 1))
+        child_start = sub[bounds]
+        child_count = np.diff(np.append(bounds, sub.size))
+
+        child_mass = np.add.reduceat(m[sub], bounds)
+        child_com = np.add.reduceat(m[sub, None] * pos[sub], bounds) / child_mass[:, None]
+
+        # Children were created in sorted order, so each parent's are contiguous.
+        firsts = np.searchsorted(child_start, parent_start[split])
+        first_of[split] = total + firsts
+        children_of[split] = np.diff(np.append(firsts, child_start.size))
+        first_child.append(first_of)
+        n_children.append(children_of)
+
+        total += len(child_start)
+        start.append(child_start)
+        count.append(child_count)
+        side2.append(np.full(len(child_start), side2[-1][0] / 4.0))
+        mass.append(child_mass)
+        com.append(child_com)
+
+    else:
+        first_child.append(np.zeros(len(start[-1]), dtype=np.int64))
+        n_children.append(np.zeros(len(start[-1]), dtype=np.int64))
+
+    return Octree(order, pos, m,
+                  np.concatenate(start), np.concatenate(count),
+                  np.concatenate(first_child), np.concatenate(n_children),
+                  np.concatenate(side2), np.concatenate(mass), np.concatenate(com))
+
+
+def _expand(starts, counts):
+    """Flatten the index ranges [:starts, :starts + :counts) into one array."""
+
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+
+def walk_tree(tree, theta=THETA, softening=0.0, potential=False, chunk=CHUNK_SIZE):
+    """Compute accelerations (and optionally potentials) by walking :tree.
+
+    Each batch keeps a frontier of (body, cell) interactions. Cells that are
+    far enough away are accepted as point masses, leaves are summed body by
+    body, and everything else is replaced by its children.
+
+    :param tree: Octree from :build_tree
+    :param theta: opening angle
+    :param softening: Plummer softening length
+    :param potential: whether to also accumulate the potential at each body
+    :param chunk: number of bodies walked per batch
+    :return: (N, 3) accelerations (and (N,) potentials) in the original order
+    """
+
+    pos, m = tree.positions, tree.masses
+    n = len(m)
+    theta2, eps2 = theta * theta, softening * softening
+
+    acc = np.zeros((n, 3))
+    phi = np.zeros(n) if potential else None
+
+    def accumulate(lo, pi, d, r2, mj):
+        inv = (r2 + eps2) ** -0.5
+        weight = mj * inv ** 3
+        for k in range(3):
+            acc[lo:lo + chunk, k] += np.bincount(pi - lo, d[:, k] * weight, minlength=min(chunk, n - lo))
+        if potential:
+            phi[lo:lo + chunk] -= np.bincount(pi - lo, mj * inv, minlength=min(chunk, n - lo))
+
+    for lo in range(0, n, chunk):
+        pi = np.arange(lo, min(lo + chunk, n))
+        ni = np.zeros(pi.size, dtype=np.int64)
+
+        while pi.size:
+            d = tree.com[ni] - pos[pi]
+            r2 = np.einsum('ij,ij->i', d, d)
+
+            start, count = tree.start[ni], tree.count[ni]
+            inside = (pi >= start) & (pi < start + count)
+            leaf = tree.n_children[ni] == 0
+            accept = ~inside & ((count == 1) | (tree.side2[ni] < theta2 * r2))
+
+            if accept.any():
+                accumulate(lo, pi[accept], d[accept], r2[accept], tree.mass[ni[accept]])
+
+            # Leaves we could not accept whole: sum their bodies directly.
+            direct = leaf & ~accept
+            if direct.any():
+                counts = count[direct]
+                pj = _expand(start[direct], counts)
+                pd = np.repeat(pi[direct], counts)
+                keep = pj != pd
+                (pj, pd) = (pj[keep], pd[keep])
+                dd = pos[pj] - pos[pd]
+                accumulate(lo, pd, dd, np.einsum('ij,ij->i', dd, dd), m[pj])
+
+            # Everything else is opened into its children.
+            opened = ~leaf & ~accept
+            counts = tree.n_children[ni[opened]]
+            ni = _expand(tree.first_child[ni[opened]], counts)
+            pi = np.repeat(pi[opened], counts)
+
+    # Undo the Morton sort.
+    out = np.empty_like(acc)
+    out[tree.order] = acc
+
+    if not potential:
+        return out
+
+    unsorted_phi = np.empty_like(phi)
+    unsorted_phi[tree.order] = phi
+    return out, unsorted_phi
+
+
+def accelerations(positions, masses, theta=THETA, softening=0.0, leaf_size=LEAF_SIZE):
+    """Compute the (approximate) acceleration on every body.
+
+    :param positions: (N, 3) array of positions
+    :param masses: (N,) array of masses
+    :param theta: opening angle
+    :param softening: Plummer softening length
+    :param leaf_size: largest number of bodies left unsplit in a cell
+    :return: (N, 3) array of accelerations
+    """
+
+    return walk_tree(build_tree(positions, masses, leaf_size), theta, softening)
+
+
+def advance(dt, iterations, positions, velocities, masses,
+            theta=THETA, softening=0.0, leaf_size=LEAF_SIZE):
+    """Advance the system :dt time, :iterations times (in place).
+
+    The tree is rebuilt from the current positions on every step.
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param theta: opening angle
+    :param softening: Plummer softening length
+    :param leaf_size: largest number of bodies left unsplit in a cell
+    """
+
+    for _ in range(iterations):
+        velocities += dt * accelerations(positions, masses, theta, softening, leaf_size)
+        positions += dt * velocities
+
+
+def report_energy(positions, velocities, masses, e=0.0,
+                  theta=THETA, softening=0.0, leaf_size=LEAF_SIZE):
+    """Compute the energy, with the potential taken from a tree walk.
+
+    :param positions: (N, 3) array of positions
+    :param velocities: (N, 3) array of velocities
+    :param masses: (N,) array of masses
+    :param e: baseline energy
+    :param theta: opening angle
+    :param softening: Plummer softening length
+    :param leaf_size: largest number of bodies left unsplit in a cell
+    :return: e
+    """
+
+    tree = build_tree(positions, masses, leaf_size)
+    (_, phi) = walk_tree(tree, theta, softening, potential=True)
+
+    return e + 0.5 * np.dot(masses, phi) + nbody_numpy.kinetic_energy(velocities, masses)
+
+
+def nbody(loops, reference, iterations, bodies, dt=0.01, theta=THETA, softening=0.0):
+    """N-body simulation.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
+    :param theta: opening angle
+    :param softening: Plummer softening length
+    """
+
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies)
+
+    nbody_numpy.offset_momentum(velocities, masses,
+                                nbody_numpy.reference_index(body_names, reference))
+
+    for _ in range(loops):
+
+        advance(dt, iterations, positions, velocities, masses, theta, softening)
+
+        print(report_energy(positions, velocities, masses, theta=theta, softening=softening))
+
+    nbody_numpy.to_bodies(bodies, body_names, positions, velocities)
+
+
+def benchmark(sizes=(1000, 2000, 4000, 8000, 16000), theta=THETA, softening=1e-3):
+    """Compare one tree force evaluation against direct summation.
+
+    :param sizes: numbers of bodies to sweep over
+    :param theta: opening angle
+    :param softening: Plummer softening length (keeps the direct sum finite)
+    :return results: list of (n, tree seconds, direct seconds, median error, max error)
+    """
+
+    results = []
+
+    for n in sizes:
+        (positions, _, masses) = nbody_numpy.random_system(n)
+
+        start = perf_counter()
+        approx = accelerations(positions, masses, theta, softening)
+        tree_time = perf_counter() - start
+
+        # Direct sum with the same softening, via the array engine's blocked sweep.
+        start = perf_counter()
+        exact = nbody_numpy.accelerations(positions, masses, softening=softening)
+        direct_time = perf_counter() - start
+
+        err = np.linalg.norm(approx - exact, axis=1) / np.linalg.norm(exact, axis=1)
+        results.append((n, tree_time, direct_time, np.median(err), err.max()))
+        print('N={:>7d}  tree {:8.3f}s  direct {:8.3f}s  '
+              'median err {:.2e}  max err {:.2e}'.format(*results[-1]))
+
+    return results
+
+
+if __name__ == '__main__':
+
+    if len(argv) > 1 and argv[1] == 'bench':
+        benchmark(theta=float(argv[2]) if len(argv) > 2 else THETA)
+
+    else:
+        from nbody import BODIES
+        nbody(100, 'sun', 20000, deepcopy(BODIES))
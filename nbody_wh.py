@@ -0,0 +1,369 @@
+from copy import deepcopy
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+import nbody_numpy
+
+"""
+    N-body simulation, Wisdom-Holman mixed-variable integrator.
+
+    Name: Danny Vilela
+    NetID: dov205
+
+    In the solar system SOLAR_MASS dwarfs everything else, so each planet's
+    motion is almost exactly a Kepler orbit about the sun. Wisdom-Holman
+    splits the Hamiltonian into
+
+        H = H_kepler + H_interaction
+
+    and alternates an exact Kepler drift (solved analytically, here with
+    universal variables so any orbit type works) with a kick from the small
+    planet-planet interaction. The error scales with the planet/sun mass
+    ratio, which allows timesteps 10-100x larger than the Cartesian
+    kick-then-drift step of `advance` for the same accuracy.
+
+    Two coordinate systems are supported:
+
+        jacobi     -- Jacobi coordinates (Wisdom & Holman 1991)
+        democratic -- democratic heliocentric coordinates (Duncan, Levison & Lee 1998)
+
+    The central body must be row 0 of the arrays; `nbody` takes care of that.
+
+    Compare against `nbody_opt` on the 100 x 20,000-step run with:
+
+        $ python nbody_wh.py [DT]
+"""
+
+COORDINATES = ('jacobi', 'democratic')
+
+# Newton iterations allowed in the Kepler solver before giving up on convergence.
+KEPLER_ITERATIONS = 50
+
+
+def stumpff(z):
+    """Stumpff functions C(z) and S(z), with series near z = 0.
+
+    :param z: array of alpha * chi ** 2
+    :return: (C(z), S(z))
+    """
+
+    # Fast path: every orbit is elliptic and away from the series region.
+    if z.min() > 1e-4:
+        w = np.sqrt(z)
+        return (1 - np.cos(w)) / z, (w - np.sin(w)) / (w * w * w)
+
+    c = np.empty_like(z)
+    s = np.empty_like(z)
+
+    small = np.abs(z) < 1e-4
+    pos = (z > 0) & ~small
+    neg = (z < 0) & ~small
+
+    zs = z[small]
+    c[small] = 1 / 2. - zs / 24. + zs * zs / 720.
+    s[small] = 1 / 6. - zs / 120. + zs * zs / 5040.
+
+    w = np.sqrt(z[pos])
+    c[pos] = (1 - np.cos(w)) / z[pos]
+    s[pos] = (w - np.sin(w)) / (w * w * w)
+
+    w = np.sqrt(-z[neg])
+    c[neg] = (np.cosh(w) - 1) / -z[neg]
+    s[neg] = (np.sinh(w) - w) / (w * w * w)
+
+    return c, s
+
+
+def kepler_drift(dt, positions, velocities, mu, guess=None):
+    """Move every body along its two-body orbit for :dt (in place).
+
+    Solves the universal Kepler equation for the universal anomaly chi with
+    Newton's method, then applies the Lagrange f and g functions.
+
+    :param dt: the change in time between the previous time and now
+    :param positions: (K, 3) positions relative to each orbit's focus
+    :param velocities: (K, 3) velocities relative to each orbit's focus
+    :param mu: (K,) gravitational parameter of each orbit
+    :param guess: optional (K,) starting chi, e.g. the previous step's solution
+    :return chi: (K,) universal anomaly of each orbit
+    """
+
+    r0 = np.sqrt(np.einsum('ij,ij->i', positions, positions))
+    v2 = np.einsum('ij,ij->i', velocities, velocities)
+    eta = np.einsum('ij,ij->i', positions, velocities)
+    sqrt_mu = np.sqrt(mu)
+
+    alpha = 2.0 / r0 - v2 / mu
+    sigma = eta / sqrt_mu
+
+    # Elliptic first guess; good for the near-circular orbits we expect.
+    if guess is None:
+        chi = sqrt_mu * np.abs(alpha) * dt
+        chi = np.where(alpha > 0, chi, dt * sqrt_mu / r0)
+    else:
+        chi = guess.copy()
+
+    for _ in range(KEPLER_ITERATIONS):
+        x2 = chi * chi
+        (c, s) = stumpff(alpha * x2)
+
+        f = sigma * x2 * c + (1 - alpha * r0) * x2 * chi * s + r0 * chi - sqrt_mu * dt
+        df = sigma * chi * (1 - alpha * x2 * s) + (1 - alpha * r0) * x2 * c + r0
+
+        delta = f / df
+        chi -= delta
+
+        if np.all(np.abs(delta) <= 1e-15 * np.maximum(np.abs(chi), 1.0)):
+            break
+
+    else:
+        raise RuntimeError("Kepler solver did not converge in {} iterations.".format(KEPLER_ITERATIONS))
+
+    x2 = chi * chi
+    (c, s) = stumpff(alpha * x2)
+
+    f = 1 - x2 / r0 * c
+    g = dt - x2 * chi / sqrt_mu * s
+
+    new_positions = f[:, None] * positions + g[:, None] * velocities
+    r = np.sqrt(np.einsum('ij,ij->i', new_positions, new_positions))
+
+    df = sqrt_mu / (r * r0) * (alpha * x2 * chi * s - chi)
+    dg = 1 - x2 / r * c
+
+    velocities[...] = df[:, None] * positions + dg[:, None] * velocities
+    positions[...] = new_positions
+
+    return chi
+
+
+def jacobi_matrix(masses):
+    """Matrix taking inertial coordinates to Jacobi coordinates.
+
+    Row 0 is the center of mass; row i >= 1 is body i relative to the center
+    of mass of bodies 0..i-1.
+
+    :param masses: (N,) array of masses, central body first
+    :return: (N, N) transformation matrix
+    """
+
+    n = len(masses)
+    eta = np.cumsum(masses)
+    a = np.zeros((n, n))
+
+    a[0] = masses / eta[-1]
+    for i in range(1, n):
+        a[i, :i] = -masses[:i] / eta[i - 1]
+        a[i, i] = 1.0
+
+    return a
+
+
+class _Jacobi(object):
+    """Wisdom-Holman map in Jacobi coordinates."""
+
+    def __init__(self, positions, velocities, masses):
+
+        eta = np.cumsum(masses)
+        self.masses = masses
+        self.a = jacobi_matrix(masses)
+        self.a_inv = np.linalg.inv(self.a)
+
+        # Jacobi masses and Kepler parameters, G m'_i M_i = G m_0 m_i.
+        self.jacobi_masses = masses[1:] * eta[:-1] / eta[1:]
+        self.mu = masses[0] * eta[1:] / eta[:-1]
+
+        self.r = self.a @ positions
+        self.v = self.a @ velocities
+        self.chi = None
+
+    def kick(self, dt):
+        """Kick Jacobi velocities by the interaction Hamiltonian."""
+
+        x = self.a_inv @ self.r
+        forces = self.masses[:, None] * nbody_numpy.accelerations(x, self.masses)
+        forces = self.a_inv.T @ forces
+
+        # Remove the Kepler part that the drift already accounts for.
+        r = self.r[1:]
+        inv3 = np.einsum('ij,ij->i', r, r) ** -1.5
+        forces[1:] += (self.masses[0] * self.masses[1:] * inv3)[:, None] * r
+
+        self.v[1:] += dt * forces[1:] / self.jacobi_masses[:, None]
+
+    def drift(self, dt):
+        """Kepler drift of each Jacobi coordinate, free drift of the center of mass."""
+
+        self.r[0] += dt * self.v[0]
+        self.chi = kepler_drift(dt, self.r[1:], self.v[1:], self.mu, self.chi)
+
+    def inertial(self):
+        """Return (positions, velocities) in inertial coordinates."""
+
+        return self.a_inv @ self.r, self.a_inv @ self.v
+
+
+class _Democratic(object):
+    """Wisdom-Holman map in democratic heliocentric coordinates."""
+
+    def __init__(self, positions, velocities, masses):
+
+        self.masses = masses
+        total = masses.sum()
+
+        # Heliocentric positions, barycentric velocities.
+        self.com = masses @ positions / total
+        self.vcom = masses @ velocities / total
+        self.r = positions[1:] - positions[0]
+        self.v = velocities[1:] - self.vcom
+        self.mu = np.full(len(masses) - 1, masses[0])
+        self.chi = None
+
+    def kick(self, dt):
+        """Kick barycentric velocities by the planet-planet interaction."""
+
+        self.v += dt * nbody_numpy.accelerations(self.r, self.masses[1:])
+
+    def jump(self, dt):
+        """Shift heliocentric positions by the sun's share of the total momentum."""
+
+        self.r += dt * (self.masses[1:] @ self.v) / self.masses[0]
+
+    def drift(self, dt):
+        """Jump, Kepler drift about the central body, jump."""
+
+        self.com += dt * self.vcom
+        self.jump(dt / 2.0)
+        self.chi = kepler_drift(dt, self.r, self.v, self.mu, self.chi)
+        self.jump(dt / 2.0)
+
+    def inertial(self):
+        """Return (positions, velocities) in inertial coordinates."""
+
+        m = self.masses
+        x0 = self.com - m[1:] @ self.r / m.sum()
+        v0 = self.vcom - m[1:] @ self.v / m[0]
+
+        return (np.vstack((x0, self.r + x0)),
+                np.vstack((v0, self.v + self.vcom)))
+
+
+def advance(dt, iterations, positions, velocities, masses, coordinates='jacobi'):
+    """Advance the system :dt time, :iterations times (in place).
+
+    Converts to Wisdom-Holman coordinates once on entry and back once on
+    exit. Consecutive half kicks are merged, so each step costs one
+    interaction evaluation.
+
+    :param dt: the change in time between the previous time and now
+    :param iterations: the number of times to do :dt advances in one simulation.
+    :param positions: (N, 3) array of positions, central body first
+    :param velocities: (N, 3) array of velocities, central body first
+    :param masses: (N,) array of masses, central body first
+    :param coordinates: one of COORDINATES
+    """
+
+    if coordinates == 'jacobi':
+        system = _Jacobi(positions, velocities, masses)
+    elif coordinates == 'democratic':
+        system = _Democratic(positions, velocities, masses)
+    else:
+        raise ValueError("Unknown coordinates `{}` -- expected one of {}.".format(
+            coordinates, ', '.join(COORDINATES)))
+
+    if iterations < 1:
+        return
+
+    system.kick(dt / 2.0)
+
+    for step in range(iterations):
+        system.drift(dt)
+        system.kick(dt if step < iterations - 1 else dt / 2.0)
+
+    (positions[...], velocities[...]) = system.inertial()
+
+
+def nbody(loops, reference, iterations, bodies, dt=0.01, coordinates='jacobi'):
+    """N-body simulation.
+
+    :param loops: number of loops to run
+    :param reference: body at center of system
+    :param iterations: number of timesteps to advance
+    :param bodies: {name : body_information} dictionary for all bodies
+    :param dt: timestep
+    :param coordinates: one of COORDINATES
+    """
+
+    # Put the central body first, as the Wisdom-Holman splitting expects.
+    body_names = [reference] + [body for body in bodies if body != reference]
+    (body_names, positions, velocities, masses) = nbody_numpy.from_bodies(bodies, body_names)
+
+    nbody_numpy.offset_momentum(velocities, masses, 0)
+
+    for _ in range(loops):
+
+        advance(dt, iterations, positions, velocities, masses, coordinates)
+
+        print(nbody_numpy.report_energy(positions, velocities, masses))
+
+    nbody_numpy.to_bodies(bodies, body_names, positions, velocities)
+
+
+def benchmark(dt=0.5, loops=100, iterations=20000, reference_dt=0.01):
+    """Compare against `nbody_opt` over the same span of time.
+
+    `nbody_opt` runs :loops x :iterations steps of :reference_dt; each
+    Wisdom-Holman variant covers the same time with steps of :dt.
+
+    :param dt: Wisdom-Holman timestep
+    :param loops: number of energy reports
+    :param iterations: `nbody_opt` steps between reports
+    :param reference_dt: `nbody_opt` timestep
+    :return results: {name : (seconds, largest relative energy error)}
+    """
+
+    import nbody_opt
+    from nbody import BODIES
+
+    results = {}
+    span = iterations * reference_dt
+
+    # Reference run, through nbody_opt's own dictionary kernel.
+    bodies = deepcopy(BODIES)
+    body_names = list(bodies.keys())
+    key_pairs = [(a, b) for (i, a) in enumerate(body_names) for b in body_names[i + 1:]]
+    (_, _, v, m) = nbody_numpy.from_bodies(bodies, body_names)
+    nbody_numpy.offset_momentum(v, m, 0)
+    for (i, body) in enumerate(body_names):
+        bodies[body][1][:] = v[i].tolist()
+
+    e0 = nbody_opt.report_energy(bodies, body_names, key_pairs)
+    worst = 0.0
+    start = perf_counter()
+    for _ in range(loops):
+        nbody_opt.advance(reference_dt, iterations, bodies, body_names, key_pairs)
+        worst = max(worst, abs(nbody_opt.report_energy(bodies, body_names, key_pairs) / e0 - 1))
+    results['nbody_opt'] = (perf_counter() - start, worst)
+
+    for coordinates in COORDINATES:
+        (_, r, v, m) = nbody_numpy.from_bodies(deepcopy(BODIES))
+        nbody_numpy.offset_momentum(v, m, 0)
+
+        e0 = nbody_numpy.report_energy(r, v, m)
+        steps = int(round(span / dt))
+        worst = 0.0
+        start = perf_counter()
+        for _ in range(loops):
+            advance(dt, steps, r, v, m, coordinates)
+            worst = max(worst, abs(nbody_numpy.report_energy(r, v, m) / e0 - 1))
+        results[coordinates] = (perf_counter() - start, worst)
+
+    for (name, (seconds, worst)) in results.items():
+        print('{:>11s}  {:9.3f}s  max relative energy error {:.2e}'.format(name, seconds, worst))
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(dt=float(argv[1]) if len(argv) > 1 else 0.5)
@@ -0,0 +1,62 @@
+"""
+    Danny Vilela
+
+    Unit tests for the benchmark harness in `nbody_bench.py`. To run these
+    tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import json
+import unittest
+from unittest import mock
+from nbody_bench import *
+
+
+class BenchTest(unittest.TestCase):
+
+    def test_adapters_agree(self):
+        """Verify that dict-based and array-based adapters follow the same system."""
+
+        energies = [measure(backend, 12, 3, warmup=0, repeats=1)['energy']
+                    for backend in ('nbody', 'nbody_3', 'nbody_opt', 'nbody_numpy')]
+
+        for e in energies[:-1]:
+            self.assertAlmostEqual(e / energies[-1], 1.0, places=12)
+
+    def test_module_bodies_restored(self):
+        """Verify that benchmarking a module-level variant leaves its BODIES in place."""
+
+        import nbody
+        original = nbody.BODIES
+
+        measure('nbody', 4, 2, warmup=0, repeats=1)
+        self.assertIs(nbody.BODIES, original)
+        self.assertIn('sun', nbody.BODIES)
+
+    def test_suite_reports_json(self):
+        """Verify that a suite run is JSON-serializable and checks energy."""
+
+        report = suite(sizes=(8,), steps=2, backends=['nbody_iter'], warmup=0, repeats=3)
+        (result,) = json.loads(json.dumps(report))['results']
+
+        self.assertEqual(len(result['times']), 3)
+        self.assertGreater(result['pairs_per_second'], 0)
+        self.assertGreater(result['peak_rss'], 0)
+        self.assertTrue(result['energy_ok'])
+
+    def test_unbuilt_cython(self):
+        """Verify that an unbuilt `nbody_cython` is reported as an error rather than compiled on import."""
+
+        with mock.patch('nbody_engines.built', lambda module: False):
+            result = measure('nbody_cython', 8, 1, warmup=0, repeats=1)
+
+        self.assertIn('cythonize', result['error'])
+        self.assertNotIn('median', result)
+
+    def test_unknown_backend(self):
+        """Verify that misspelled backends are rejected up front."""
+
+        with self.assertRaises(ValueError):
+            suite(backends=['nbody_fortran'])
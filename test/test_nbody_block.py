@@ -0,0 +1,37 @@
+"""
+    Danny Vilela
+
+    Unit tests for the block timesteps in `nbody_block.py`. To run these
+    tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+import nbody_integrators
+from nbody_block import *
+
+
+class BlockTimestepTest(unittest.TestCase):
+
+    def test_levels(self):
+        """Verify that levels are clipped and respect the block grid."""
+
+        tau = np.array([1e-9, 1e9, 1.0])
+        np.testing.assert_array_equal(choose_levels(tau, 1.0, 0, max_level=4, eta=1.0), [4, 0, 0])
+
+        # On tick 4 of 16 a step can be at most 4 ticks long (level 2).
+        np.testing.assert_array_equal(choose_levels(tau, 1.0, 4, max_level=4, eta=1.0), [4, 2, 2])
+
+    def test_accuracy(self):
+        """Verify that block steps track a fine global integration."""
+
+        (r, v, m) = planetary_system(8)
+        (r_ref, v_ref) = (r.copy(), v.copy())
+
+        pairs = advance(0.5, 2, r, v, m, max_level=12)
+        nbody_integrators.advance(1.0 / 8192, 8192, r_ref, v_ref, m, 'yoshida4')
+
+        np.testing.assert_allclose(r, r_ref, atol=1e-3)
+        self.assertLess(pairs, 2 * 4096 * 9 * 8)
@@ -0,0 +1,88 @@
+"""
+    Danny Vilela
+
+    Unit tests for the compressed trajectory codec in `nbody_codec.py`. To run
+    these tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import os
+import tempfile
+import unittest
+import nbody_numpy
+import nbody_trajectory
+from nbody_codec import *
+
+
+class CodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'run.ztraj')
+
+        (r, v, self.masses) = nbody_numpy.random_system(20)
+        self.positions = np.empty((10, 20, 3))
+        self.velocities = np.empty((10, 20, 3))
+
+        for k in range(10):
+            (self.positions[k], self.velocities[k]) = (r, v)
+            nbody_numpy.advance(0.001, 3, r, v, self.masses)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_bit_packing(self):
+        """Verify that zigzag and bit-packing round-trip signed integers."""
+
+        values = np.array([0, 1, -1, 5, -300, 2 ** 40, -(2 ** 40)], dtype=np.int64)
+        codes = zigzag(values)
+        width = int(codes.max()).bit_length()
+
+        unpacked = unpack_bits(pack_bits(codes, width), width, len(values))
+        np.testing.assert_array_equal(unzigzag(unpacked), values)
+
+    def test_tolerance_and_random_access(self):
+        """Verify every snapshot is within tolerance, read in any order."""
+
+        for compression in ('zlib', 'lzma'):
+            with CompressedWriter(self.path, self.masses, 1e-7, 1e-5, {'dt': 0.001},
+                                  compression, keyframe=4) as writer:
+                for k in range(10):
+                    writer.append(0.003 * k, 3 * k, self.positions[k], self.velocities[k])
+
+            with CompressedTrajectory(self.path) as trajectory:
+                self.assertEqual(len(trajectory), 10)
+                self.assertEqual(trajectory.metadata, {'dt': 0.001})
+                np.testing.assert_array_equal(trajectory.masses, self.masses)
+
+                for k in (9, 0, 5, 4, -1):
+                    (time, step, positions, velocities) = trajectory[k]
+                    self.assertEqual(step, 3 * (k % 10))
+                    self.assertLessEqual(np.abs(positions - self.positions[k]).max(), 1e-7)
+                    self.assertLessEqual(np.abs(velocities - self.velocities[k]).max(), 1e-5)
+
+    def test_quantize_range(self):
+        """Verify that values too large for the tolerance raise instead of overflowing."""
+
+        np.testing.assert_array_equal(quantize(np.array([-3.0, 0.4, 5.0]), 0.5), [-3, 0, 5])
+
+        for values in (np.array([1e9, 0.0]), np.array([np.nan]), np.array([np.inf])):
+            with self.assertRaises(ValueError):
+                quantize(values, 1e-12)
+
+    def test_compress_raw_trajectory(self):
+        """Verify that a raw trajectory file converts snapshot for snapshot."""
+
+        source = os.path.join(self.directory.name, 'run.traj')
+
+        with nbody_trajectory.TrajectoryWriter(source, self.masses) as writer:
+            for k in range(10):
+                writer.append(0.003 * k, 3 * k, self.positions[k], self.velocities[k])
+
+        compress(source, self.path, 1e-9)
+
+        with CompressedTrajectory(self.path) as trajectory:
+            self.assertEqual(len(trajectory), 10)
+            self.assertLessEqual(np.abs(trajectory[7][2] - self.positions[7]).max(), 1e-9)
@@ -0,0 +1,64 @@
+"""
+    Danny Vilela
+
+    Unit tests for collision detection and merging in `nbody_collisions.py`.
+    To run these tests from the terminal, run the following from the
+    project's root directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+from nbody_collisions import *
+
+
+class CollisionsTest(unittest.TestCase):
+
+    def test_hash_matches_all_pairs(self):
+        """Verify that the spatial hash finds exactly the overlapping pairs."""
+
+        rng = np.random.default_rng(1)
+        positions = rng.uniform(-1, 1, (500, 3))
+        radii = rng.uniform(0.01, 0.06, 500)
+
+        (i, j) = candidate_pairs(positions, radii)
+
+        d = positions[:, None, :] - positions[None, :, :]
+        close = np.einsum('ijk,ijk->ij', d, d) < (radii[:, None] + radii) ** 2
+        expected = set(zip(*np.nonzero(np.triu(close, k=1))))
+
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(set(zip(i.tolist(), j.tolist())), expected)
+
+    def test_merge_conserves(self):
+        """Verify that a chain A-B-C merges into one body, conserving mass and momentum."""
+
+        positions = np.array([[0.0, 0, 0], [0.15, 0, 0], [0.3, 0, 0], [5.0, 0, 0]])
+        velocities = np.array([[1.0, 0, 0], [0, 1.0, 0], [0, 0, 1.0], [0, 0, 0]])
+        masses = np.array([1.0, 2.0, 3.0, 4.0])
+        radii = np.full(4, 0.1)
+        ids = np.arange(4)
+
+        (p0, x0) = (np.dot(masses, velocities), np.dot(masses, positions))
+        (i, j) = candidate_pairs(positions, radii)
+        n = merge(positions, velocities, masses, radii, i, j, ids)
+
+        self.assertEqual(n, 2)
+        np.testing.assert_array_equal(ids[:n], [0, 3])
+        np.testing.assert_allclose(masses[:n], [6.0, 4.0])
+        np.testing.assert_allclose(np.dot(masses[:n], velocities[:n]), p0)
+        np.testing.assert_allclose(np.dot(masses[:n], positions[:n]), x0)
+        self.assertAlmostEqual(radii[0], 0.1 * 3 ** (1.0 / 3.0))
+
+    def test_advance_compacts_in_place(self):
+        """Verify that a collapsing cluster shrinks without reallocating its arrays."""
+
+        (r, v, m, radii) = cluster(300, radius=0.02)
+        total = m.sum()
+
+        (r2, v2, m2, radii2, _) = advance(0.01, 60, r, v, m, radii)
+
+        self.assertLess(len(m2), 300)
+        self.assertTrue(np.shares_memory(r2, r))
+        self.assertAlmostEqual(m2.sum(), total)
+        np.testing.assert_allclose(np.dot(m2, v2), 0.0, atol=1e-14)
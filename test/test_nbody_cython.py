@@ -0,0 +1,66 @@
+"""
+    Danny Vilela
+
+    Unit tests for the Cython kernels in `nbody_cython.pyx`. They are skipped
+    until the extension is built. To run these tests from the terminal, run
+    the following from the project's root directory
+
+        $ cythonize -i nbody_cython.pyx
+        $ python -m unittest discover
+"""
+
+import unittest
+import numpy as np
+import nbody_engines
+import nbody_numpy
+import nbody_tiled
+
+if nbody_engines.available('cython'):
+    from nbody_cython import *
+
+
+@unittest.skipUnless(nbody_engines.available('cython'), 'nbody_cython is not built')
+class CythonTest(unittest.TestCase):
+
+    def setUp(self):
+        (self.r, self.v, self.m) = nbody_numpy.random_system(150)
+
+    def test_advance_matches_numpy(self):
+        """Verify that the compiled step follows the NumPy engine, whole or as kick and drift."""
+
+        (r, v) = (self.r.copy(), self.v.copy())
+        nbody_numpy.advance(1e-4, 5, r, v, self.m)
+
+        (r_c, v_c) = (self.r.copy(), self.v.copy())
+        advance(1e-4, 5, r_c, v_c, self.m)
+
+        np.testing.assert_allclose(r_c, r, rtol=1e-12, atol=1e-14)
+        np.testing.assert_allclose(v_c, v, rtol=1e-10, atol=1e-12)
+
+        (r_split, v_split) = (self.r.copy(), self.v.copy())
+        for _ in range(5):
+            kick(1e-4, r_split, v_split, self.m)
+            drift(1e-4, r_split, v_split)
+
+        np.testing.assert_array_equal(r_split, r_c)
+        np.testing.assert_array_equal(v_split, v_c)
+
+    def test_report_energy(self):
+        """Verify that the compiled energy matches `nbody_numpy.report_energy`."""
+
+        self.assertAlmostEqual(report_energy(self.r, self.v, self.m) /
+                               nbody_numpy.report_energy(self.r, self.v, self.m), 1.0, places=12)
+        self.assertAlmostEqual(report_energy(self.r, self.v, self.m, 1.5) -
+                               report_energy(self.r, self.v, self.m), 1.5, places=12)
+
+    def test_tiled_accelerations(self):
+        """Verify the tiled kernel against direct summation, for ragged last tiles too."""
+
+        expected = nbody_numpy.accelerations(self.r, self.m)
+
+        for tile in (16, 64, 512):
+            rounds = nbody_tiled.schedule(-(-len(self.m) // tile))
+            out = np.full_like(self.r, np.nan)
+            tiled_accelerations(self.r, self.m, rounds, tile, out)
+
+            np.testing.assert_allclose(out, expected, rtol=1e-10, atol=1e-12)
@@ -0,0 +1,101 @@
+"""
+    Danny Vilela
+
+    Unit tests for the engine registry in `nbody_engines.py`. To run these
+    tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import subprocess
+import sys
+import unittest
+from importlib.machinery import EXTENSION_SUFFIXES, ModuleSpec
+from unittest import mock
+import numpy as np
+import nbody_numpy
+import nbody_parallel
+from nbody_engines import *
+
+
+class EnginesTest(unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        """Verify that importing the registry does not import compiled backends."""
+
+        code = 'import sys, nbody_engines; print("numba" in sys.modules, "nbody_tree" in sys.modules)'
+        out = subprocess.check_output([sys.executable, '-c', code], text=True)
+        self.assertEqual(out.split(), ['False', 'False'])
+
+    def test_select(self):
+        """Verify auto-selection by N, core count and installed engines."""
+
+        with mock.patch('nbody_engines.available', lambda name: False):
+            self.assertEqual(select(5), 'python')
+            self.assertEqual(select(1000, cores=8), 'numpy')
+            self.assertEqual(select(10000, cores=1), 'numpy')
+            self.assertEqual(select(10000, cores=8), 'parallel')
+            self.assertEqual(select(50000, cores=8), 'parallel')
+            self.assertEqual(select(50000, cores=8, exact=False), 'tree')
+
+        with mock.patch('nbody_engines.available', lambda name: name == 'numba'):
+            self.assertEqual(select(1000), 'numba')
+
+    def test_cython_needs_a_build(self):
+        """Verify that an importable Cython without a built extension neither counts as available nor wins `select`."""
+
+        def finder(suffix):
+            return lambda name: ModuleSpec(name, None, origin='/lib/' + name + suffix)
+
+        with mock.patch('nbody_engines.find_spec', finder('.pyx')):
+            self.assertFalse(available('cython'))
+            self.assertTrue(available('numba'))
+            self.assertEqual(select(100), 'numba')
+
+            with self.assertRaises(ImportError):
+                load('cython')
+
+        with mock.patch('nbody_engines.find_spec', finder(EXTENSION_SUFFIXES[0])):
+            self.assertTrue(available('cython'))
+            self.assertEqual(select(100), 'cython')
+
+    def test_engines_agree(self):
+        """Verify that the exact engines follow the array engine."""
+
+        (r0, v0, m) = nbody_numpy.random_system(12)
+        (r, v) = (r0.copy(), v0.copy())
+        nbody_numpy.advance(1e-3, 4, r, v, m)
+
+        for name in ('python', 'numpy', 'parallel'):
+            (rr, vv) = (r0.copy(), v0.copy())
+            backend = load(name)
+            backend.advance(1e-3, 4, rr, vv, m)
+
+            np.testing.assert_allclose(rr, r, rtol=1e-12)
+            self.assertAlmostEqual(backend.report_energy(rr, vv, m),
+                                   nbody_numpy.report_energy(r, v, m), places=12)
+
+    def test_parallel_session(self):
+        """Verify that a run on 'parallel' starts its workers once, not on every advance."""
+
+        (r0, v0, m) = nbody_numpy.random_system(12)
+        (r, v) = (r0.copy(), v0.copy())
+        nbody_numpy.advance(1e-3, 6, r, v, m)
+
+        (rr, vv) = (r0.copy(), v0.copy())
+        with mock.patch.object(nbody_parallel, 'SharedSystem', wraps=nbody_parallel.SharedSystem) as system:
+            with session('parallel', rr, vv, m) as (advance, report_energy):
+                for _ in range(3):
+                    advance(1e-3, 2)
+                    report_energy()
+
+        self.assertEqual(system.call_count, 1)
+        np.testing.assert_allclose(rr, r, rtol=1e-12)
+        np.testing.assert_allclose(vv, v, rtol=1e-12)
+
+    def test_unknown_engine(self):
+        """Verify that unknown engines are rejected."""
+
+        with self.assertRaises(ValueError):
+            load('fortran')
@@ -0,0 +1,41 @@
+"""
+    Danny Vilela
+
+    Unit tests for the batched ensemble in `nbody_ensemble.py`. To run these
+    tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+import nbody_numpy
+from nbody_ensemble import *
+
+
+class EnsembleTest(unittest.TestCase):
+
+    def test_members_match_single_runs(self):
+        """Verify that every member evolves exactly like its own single run."""
+
+        (r, v, m) = nbody_numpy.random_system(6)
+        (er, ev, em) = perturb(r, v, m, members=3, scale=1e-3)
+        (sr, sv) = (er.copy(), ev.copy())
+
+        advance(1e-3, 10, er, ev, em)
+        energies = report_energy(er, ev, em)
+
+        for k in range(3):
+            nbody_numpy.advance(1e-3, 10, sr[k], sv[k], em[k])
+            np.testing.assert_allclose(er[k], sr[k], rtol=1e-12)
+            self.assertAlmostEqual(energies[k], nbody_numpy.report_energy(sr[k], sv[k], em[k]))
+
+    def test_perturb(self):
+        """Verify that member 0 is the unperturbed system."""
+
+        (r, v, m) = nbody_numpy.random_system(4)
+        (er, ev, em) = perturb(r, v, m, members=5)
+        self.assertEqual(er.shape, (5, 4, 3))
+        self.assertEqual(em.shape, (5, 4))
+        np.testing.assert_array_equal(er[0], r)
+        self.assertFalse(np.array_equal(er[1], r))
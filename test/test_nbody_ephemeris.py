@@ -0,0 +1,75 @@
+"""
+    Danny Vilela
+
+    Unit tests for the Chebyshev ephemeris in `nbody_ephemeris.py`. To run
+    these tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import os
+import tempfile
+import unittest
+from copy import deepcopy
+import nbody_numpy
+from nbody import BODIES
+from nbody_ephemeris import *
+
+
+class EphemerisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'solar.ephem')
+        precompute(self.path, deepcopy(BODIES), duration=40.0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_matches_integration(self):
+        """Verify that queried positions and velocities match a direct integration."""
+
+        (names, r, v, m) = nbody_numpy.from_bodies(deepcopy(BODIES))
+        nbody_numpy.offset_momentum(v, m, nbody_numpy.reference_index(names, 'sun'))
+        nbody_numpy.advance(0.01, 2537, r, v, m)
+
+        (positions, velocities) = Ephemeris(self.path).query(25.37)
+
+        np.testing.assert_allclose(positions, r, atol=1e-8)
+        np.testing.assert_allclose(velocities, v, atol=1e-2)
+
+    def test_interval_of_whole_steps(self):
+        """Verify that a segment interval that is not a whole number of timesteps is rejected."""
+
+        with self.assertRaises(ValueError):
+            precompute(self.path, deepcopy(BODIES), duration=3.0, interval=1.0, dt=0.3, degree=2)
+
+    def test_batch_matches_scalar(self):
+        """Verify that a batch query agrees with one query per time, for all bodies and one."""
+
+        ephemeris = Ephemeris(self.path)
+        times = np.array([0.0, 3.99, 4.0, 17.25, 40.0])
+        (positions, velocities) = ephemeris.query(times)
+        (jupiter, _) = ephemeris.query(times, 'jupiter')
+
+        for (k, t) in enumerate(times):
+            (r, v) = ephemeris.query(t)
+            np.testing.assert_allclose(positions[k], r, atol=1e-14)
+            np.testing.assert_allclose(velocities[k], v, atol=1e-14)
+            np.testing.assert_allclose(jupiter[k], ephemeris.query(t, 'jupiter')[0], atol=1e-14)
+
+        self.assertEqual(positions.shape, (5, 5, 3))
+
+    def test_segment_cache(self):
+        """Verify that segments are cached up to the cache size and times out of range are refused."""
+
+        ephemeris = Ephemeris(self.path, cache_size=2)
+        for t in (1.0, 2.0, 5.0, 9.0, 1.5):
+            ephemeris.query(t)
+
+        info = ephemeris.segment.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 4, 2))
+
+        with self.assertRaises(ValueError):
+            ephemeris.query([10.0, 40.5])
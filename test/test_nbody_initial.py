@@ -0,0 +1,85 @@
+"""
+    Danny Vilela
+
+    Unit tests for the initial-condition generators and body-set files in
+    `nbody_initial.py`. To run these tests from the terminal, run the
+    following from the project's root directory
+
+        $ python -m unittest discover
+"""
+
+import os
+import tempfile
+import unittest
+import nbody_numpy
+from nbody_initial import *
+
+
+class GeneratorTest(unittest.TestCase):
+
+    def test_plummer_equilibrium(self):
+        """Verify that a Plummer sphere is virialized with the analytic energy -3 pi / 64."""
+
+        (r, v, m) = plummer(4000)
+        kinetic = 0.5 * np.dot(m, np.einsum('ij,ij->i', v, v))
+        energy = nbody_numpy.report_energy(r, v, m)
+
+        self.assertAlmostEqual(2 * kinetic / (kinetic - energy), 1.0, delta=0.05)
+        self.assertAlmostEqual(energy, -3 * np.pi / 64, delta=0.01)
+        np.testing.assert_allclose(np.dot(m, v), 0.0, atol=1e-15)
+
+    def test_disk_and_planets_are_bound(self):
+        """Verify that disk bodies move at circular speed and planets start bound, inside the axis range."""
+
+        (r, v, m) = disk(1001, central_mass=1.0, disk_mass=1e-6)
+        d = np.linalg.norm(r[1:] - r[0], axis=1)
+        np.testing.assert_allclose(np.linalg.norm(v[1:] - v[0], axis=1), d ** -0.5, rtol=1e-5)
+        np.testing.assert_allclose((r[1:] - r[0])[:, 2], 0.0)
+
+        (r, v, m) = planetary(500)
+        (d, w, mu) = (r[1:] - r[0], v[1:] - v[0], m[0] + m[1:])
+        energy = 0.5 * np.einsum('ij,ij->i', w, w) - mu / np.linalg.norm(d, axis=1)
+        a = -mu / (2 * energy)
+
+        self.assertTrue(np.all(energy < 0))
+        self.assertTrue(np.all((a > 0.3 - 1e-9) & (a < 50.0 + 1e-9)))
+
+
+class BodySetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'bodies.nbb')
+        (self.r, self.v, self.m) = plummer(333)
+        save(self.path, self.r, self.v, self.m, {'generator': 'plummer'})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Verify that a body set loads back as the arrays and metadata it was saved with."""
+
+        (r, v, m, metadata) = load(self.path, mode='r')
+
+        np.testing.assert_array_equal(r, self.r)
+        np.testing.assert_array_equal(v, self.v)
+        np.testing.assert_array_equal(m, self.m)
+        self.assertEqual(metadata, {'generator': 'plummer'})
+        self.assertEqual(read_header(self.path)[0], 333)
+        self.assertTrue(r.flags['C_CONTIGUOUS'] and r.ctypes.data % 64 == 0)
+
+    def test_copy_on_write(self):
+        """Verify that engines advance mapped arrays, writing back to the file only in 'r+' mode."""
+
+        (r, v, m, _) = load(self.path)
+        nbody_numpy.advance(1e-3, 2, r, v, m)
+        np.testing.assert_array_equal(load(self.path, mode='r')[0], self.r)
+
+        (r, v, m, _) = load(self.path, mode='r+')
+        nbody_numpy.advance(1e-3, 2, r, v, m)
+        r.flush()
+        del r, v, m
+
+        (r2, v2) = (self.r.copy(), self.v.copy())
+        nbody_numpy.advance(1e-3, 2, r2, v2, self.m)
+        np.testing.assert_array_equal(load(self.path, mode='r')[0], r2)
@@ -0,0 +1,115 @@
+"""
+    Danny Vilela
+
+    Unit tests for the instrumentation layer in `nbody_instrument.py`. To run
+    these tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from copy import deepcopy
+from importlib import import_module
+from nbody import BODIES
+import nbody_engines
+from nbody_instrument import *
+
+
+def _run(**kwargs):
+    """Run 3 loops of 10 steps of the solar system, returning the printed energies."""
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        nbody(3, 'sun', 10, deepcopy(BODIES), **kwargs)
+
+    return out.getvalue().split()
+
+
+class InstrumentTest(unittest.TestCase):
+
+    def test_phases_and_counts(self):
+        """Verify phase timers, pair counts and per-loop samples."""
+
+        seen = []
+        profile = Profile(callback=lambda p: seen.append(p.steps))
+        energies = _run(profile=profile)
+
+        summary = profile.summary()
+        self.assertEqual(set(summary['phases']), {'setup', 'advance', 'energy', 'io'})
+        self.assertEqual(summary['phases']['advance']['calls'], 3)
+        self.assertEqual(summary['pairs'], 3 * 10 * 10)
+        self.assertEqual(seen, [10, 20, 30])
+        self.assertEqual(len(energies), 3)
+
+    def test_split_matches_advance(self):
+        """Verify that timing kick and drift separately does not change the result."""
+
+        profile = Profile()
+        split = _run(profile=profile, split=True)
+
+        self.assertEqual(split, _run(profile=Profile()))
+        self.assertEqual(profile.summary()['phases']['kick']['calls'], 30)
+
+    def test_export(self):
+        """Verify that a profile round-trips through its JSON file."""
+
+        profile = Profile()
+        _run(profile=profile)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.json')
+            profile.export(path)
+
+            with open(path) as f:
+                self.assertEqual(json.load(f)['steps'], 30)
+
+
+class BackendTest(unittest.TestCase):
+
+    def assertBackend(self, name):
+        """Profile 3 loops on backend :name and check them against `nbody_numpy`, instrumented or not."""
+
+        backend = import_module(name)
+        profile = Profile()
+        energies = _run(backend=backend, profile=profile)
+
+        for e in (energies, _run(backend=backend)):
+            self.assertEqual(len(e), 3)
+            for (a, b) in zip(e, _run(profile=Profile())):
+                self.assertAlmostEqual(float(a) / float(b), 1.0, places=12)
+
+        summary = profile.summary()
+        self.assertEqual(set(summary['phases']), {'setup', 'advance', 'energy', 'io'})
+        self.assertEqual(summary['phases']['advance']['calls'], 3)
+        self.assertEqual(summary['pairs'], 3 * 10 * 10)
+
+    def test_python(self):
+        """Verify that the pure-Python dictionary engine is timed in its own loop, like the array engines."""
+
+        self.assertBackend('nbody_opt')
+
+        # Its own loop: loop energies come out of the fused force pass, one final sweep.
+        profile = Profile()
+        _run(backend=import_module('nbody_opt'), profile=profile)
+        self.assertEqual(profile.summary()['phases']['energy']['calls'], 1)
+
+        with self.assertRaises(ValueError):
+            _run(backend=import_module('nbody_opt'), profile=Profile(), split=True)
+
+    @unittest.skipUnless(nbody_engines.available('numba'), 'numba is not installed')
+    def test_numba(self):
+        """Verify that the Numba engine is timed like the NumPy one."""
+
+        self.assertBackend('nbody_numba')
+
+    @unittest.skipUnless(nbody_engines.available('cython'), 'nbody_cython is not built')
+    def test_cython(self):
+        """Verify that the Cython engine is timed like the NumPy one."""
+
+        self.assertBackend('nbody_cython')
@@ -0,0 +1,62 @@
+"""
+    Danny Vilela
+
+    Unit tests for the integrators in `nbody_integrators.py`. To run these
+    tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import contextlib
+import io
+import unittest
+from unittest import mock
+import numpy as np
+import nbody_integrators
+import nbody_numpy
+from nbody import BODIES
+from nbody_integrators import *
+
+
+class IntegratorTest(unittest.TestCase):
+
+    def test_euler_is_original_step(self):
+        """Verify that `euler` reproduces the array engine's kick-then-drift step."""
+
+        (r, v, m) = nbody_numpy.random_system(20)
+        (r2, v2) = (r.copy(), v.copy())
+
+        nbody_numpy.advance(1e-3, 10, r, v, m)
+        advance(1e-3, 10, r2, v2, m, integrator='euler')
+        np.testing.assert_allclose(r, r2, rtol=1e-13)
+
+    def test_order(self):
+        """Verify that halving dt shrinks the energy error by about 2 ** order."""
+
+        for (integrator, order) in (('leapfrog', 2), ('yoshida4', 4), ('yoshida6', 6)):
+            coarse = energy_drift(integrator, 0.08, 4.0, BODIES, samples=4)
+            fine = energy_drift(integrator, 0.04, 4.0, BODIES, samples=4)
+            self.assertGreater(coarse / fine, 2 ** order / 2)
+
+    def test_uneven_timestep_cost(self):
+        """Verify that the benchmark counts the steps it ran when dt does not divide the duration."""
+
+        self.assertEqual(sample_steps(0.16, 20.0, 20), 6)
+
+        with mock.patch.object(nbody_integrators, 'advance', wraps=advance) as stepped:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = benchmark(target=1.0, duration=20.0)
+
+        for (integrator, (dt, _, evaluations)) in results.items():
+            self.assertEqual(dt, 0.16)
+            self.assertEqual(evaluations, force_evaluations(integrator) * 120)
+
+        self.assertEqual(sum(call.args[1] for call in stepped.call_args_list), 4 * 120)
+
+    def test_unknown(self):
+        """Verify that an unknown integrator raises a ValueError."""
+
+        (r, v, m) = nbody_numpy.random_system(3)
+        with self.assertRaises(ValueError):
+            advance(0.1, 1, r, v, m, integrator='rk4')
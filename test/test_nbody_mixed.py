@@ -0,0 +1,62 @@
+"""
+    Danny Vilela
+
+    Unit tests for the mixed-precision force mode in `nbody_mixed.py`. To run
+    these tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+import nbody_engines
+import nbody_initial
+import nbody_numpy
+from nbody_mixed import *
+
+
+class MixedTest(unittest.TestCase):
+
+    def setUp(self):
+        (self.r, self.v, self.m) = nbody_initial.plummer(600)
+        self.reference = nbody_numpy.accelerations(self.r, self.m)
+
+    def assertForces(self, accelerations):
+        error = np.linalg.norm(accelerations - self.reference, axis=1)
+        self.assertLess(np.max(error / np.linalg.norm(self.reference, axis=1)), 1e-4)
+
+    def test_numpy_forces(self):
+        """Verify that float32 NumPy forces match float64 ones to float32 accuracy, with either accumulator."""
+
+        for mode in ACCUMULATORS:
+            acc = accelerations(self.r, self.m, accumulate=mode, block=128)
+            self.assertEqual(acc.dtype, np.float64)
+            self.assertForces(acc)
+
+        np.testing.assert_allclose(accelerations(self.r, self.m, accumulate='kahan', block=128),
+                                   accelerations(self.r, self.m, block=128), rtol=1e-5, atol=1e-6)
+
+    @unittest.skipUnless(nbody_engines.available('numba'), 'numba is not installed')
+    def test_numba_forces(self):
+        """Verify that the Numba kernel's single kick from rest matches float64 forces."""
+
+        for mode in ACCUMULATORS:
+            (r, v) = (self.r.copy(), np.zeros_like(self.v))
+            advance(1.0, 1, r, v, self.m, mode, 'numba', block=100)
+            self.assertForces(v)
+
+    def test_energy_tracks_float64(self):
+        """Verify that a mixed-precision run stays float64 and ends at the float64 run's energy."""
+
+        (r, v) = (self.r.copy(), self.v.copy())
+        (r64, v64) = (self.r.copy(), self.v.copy())
+        e0 = report_energy(r, v, self.m)
+
+        advance(1e-3, 20, r, v, self.m, 'kahan')
+        nbody_numpy.advance(1e-3, 20, r64, v64, self.m)
+
+        self.assertEqual((r.dtype, v.dtype), (np.float64, np.float64))
+        self.assertLess(abs(report_energy(r, v, self.m) - report_energy(r64, v64, self.m)), 1e-6 * abs(e0))
+
+        with self.assertRaises(ValueError):
+            advance(1e-3, 1, r, v, self.m, 'float16')
@@ -0,0 +1,56 @@
+"""
+    Danny Vilela
+
+    Unit tests for the MPI runner in `nbody_mpi.py`, on a single rank (the
+    communicator of a plain, non-`mpiexec` process). To run these tests from
+    the terminal, run the following from the project's root directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+from importlib.util import find_spec
+import numpy as np
+import nbody_numpy
+
+if find_spec('mpi4py') is not None:
+    from nbody_mpi import *
+
+
+@unittest.skipUnless(find_spec('mpi4py') is not None, 'mpi4py is not installed')
+class MPITest(unittest.TestCase):
+
+    def setUp(self):
+        if size != 1:
+            self.skipTest('these tests run on a single rank')
+
+        (self.r, self.v, self.m) = nbody_numpy.random_system(60)
+
+    def test_partition(self):
+        """Verify that slices are contiguous and cover every body once."""
+
+        for (n, parts) in ((60, 1), (10, 3), (2, 4)):
+            (counts, displs) = partition(n, parts)
+
+            self.assertEqual(counts.sum(), n)
+            np.testing.assert_array_equal(displs, np.concatenate([[0], np.cumsum(counts)[:-1]]))
+
+    def test_advance_matches_numpy(self):
+        """Verify that stepping through Allgatherv follows `nbody_numpy.advance`."""
+
+        state = share_system(self.r.copy(), self.v.copy(), self.m)
+        advance(1e-4, 5, *state)
+
+        (r, v) = (self.r.copy(), self.v.copy())
+        nbody_numpy.advance(1e-4, 5, r, v, self.m)
+
+        np.testing.assert_allclose(state[0], r, rtol=1e-12, atol=1e-14)
+        np.testing.assert_allclose(state[1], v, rtol=1e-12, atol=1e-14)
+
+    def test_report_energy(self):
+        """Verify that the Allreduce energy matches `nbody_numpy.report_energy`."""
+
+        state = share_system(self.r, self.v, self.m)
+
+        self.assertAlmostEqual(report_energy(*state) / nbody_numpy.report_energy(self.r, self.v, self.m),
+                               1.0, places=12)
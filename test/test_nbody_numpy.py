@@ -0,0 +1,98 @@
+"""
+    Danny Vilela
+
+    Unit tests for the structure-of-arrays engine in `nbody_numpy.py`. To run
+    these tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+from copy import deepcopy
+from nbody import BODIES
+import nbody_iter
+import nbody_opt
+from nbody_numpy import *
+
+
+def reference_state(iterations):
+    """Run `nbody_opt.advance` over a copy of BODIES and return it as arrays."""
+
+    bodies = deepcopy(BODIES)
+    body_names = list(bodies.keys())
+    key_pairs = [(a, b) for (i, a) in enumerate(body_names) for b in body_names[i + 1:]]
+    nbody_opt.advance(0.01, iterations, bodies, body_names, key_pairs)
+    return from_bodies(bodies, body_names)
+
+
+class NumpyEngineTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Verify that bodies survive conversion to arrays and back."""
+
+        bodies = deepcopy(BODIES)
+        (names, r, v, m) = from_bodies(bodies)
+        self.assertEqual(r.shape, (5, 3))
+        self.assertEqual(v.shape, (5, 3))
+        self.assertEqual(m.shape, (5,))
+
+        r += 1.0
+        to_bodies(bodies, names, r, v)
+        self.assertEqual(bodies['sun'][0], [1.0, 1.0, 1.0])
+
+    def test_advance_matches_dict_engine(self):
+        """Verify that our array step reproduces `nbody_opt.advance`."""
+
+        (names, r, v, m) = from_bodies(deepcopy(BODIES))
+        advance(0.01, 100, r, v, m)
+
+        (_, r_ref, v_ref, _) = reference_state(100)
+        np.testing.assert_allclose(r, r_ref, rtol=1e-10, atol=1e-12)
+        np.testing.assert_allclose(v, v_ref, rtol=1e-10, atol=1e-12)
+
+    def test_blocking(self):
+        """Verify that block size does not change the result."""
+
+        (r, v, m) = random_system(50)
+        full = accelerations(r, m, block=50)
+        blocked = accelerations(r, m, block=7)
+        np.testing.assert_allclose(full, blocked, rtol=1e-12)
+
+        self.assertAlmostEqual(potential_energy(r, m, block=50),
+                               potential_energy(r, m, block=7))
+
+    def test_energy(self):
+        """Verify that our energy matches `nbody_opt.report_energy`."""
+
+        bodies = deepcopy(BODIES)
+        body_names = list(bodies.keys())
+        key_pairs = [(a, b) for (i, a) in enumerate(body_names) for b in body_names[i + 1:]]
+        expected = nbody_opt.report_energy(bodies, body_names, key_pairs)
+
+        (_, r, v, m) = from_bodies(bodies, body_names)
+        self.assertAlmostEqual(report_energy(r, v, m), expected)
+
+    def test_reference(self):
+        """Verify that an unknown reference body raises a KeyError."""
+
+        with self.assertRaises(KeyError):
+            reference_index(['sun', 'jupiter'], 'pluto')
+
+    def test_fused_energy(self):
+        """Verify that the energy from the force pass matches a separate sweep."""
+
+        (r, v, m) = random_system(40)
+        expected = report_energy(r, v, m)
+        self.assertAlmostEqual(advance(1e-4, 2, r, v, m, energy=True), expected, places=12)
+
+        for module in (nbody_opt, nbody_iter):
+            (bodies, plain) = (deepcopy(BODIES), deepcopy(BODIES))
+            body_names = list(bodies.keys())
+            key_pairs = [(a, b) for (i, a) in enumerate(body_names) for b in body_names[i + 1:]]
+            expected = module.report_energy(bodies, body_names, key_pairs)
+
+            fused = module.advance(0.01, 2, bodies, body_names, key_pairs, energy=True)
+            module.advance(0.01, 2, plain, body_names, key_pairs)
+            self.assertAlmostEqual(fused, expected, places=12)
+            self.assertEqual(bodies, plain)
@@ -0,0 +1,60 @@
+"""
+    Danny Vilela
+
+    Unit tests for the shared-memory backend in `nbody_parallel.py`. To run
+    these tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import os
+import signal
+import unittest
+import nbody_numpy
+from nbody_parallel import *
+
+
+class SharedMemoryTest(unittest.TestCase):
+
+    def test_matches_serial(self):
+        """Verify that splitting bodies across workers does not change the result."""
+
+        (r, v, m) = nbody_numpy.random_system(200)
+        (r_par, v_par) = (r.copy(), v.copy())
+
+        nbody_numpy.advance(1e-4, 3, r, v, m)
+        advance(1e-4, 3, r_par, v_par, m, processes=3)
+
+        np.testing.assert_array_equal(r, r_par)
+        np.testing.assert_array_equal(v, v_par)
+
+    def test_release(self):
+        """Verify that closing a system unlinks its shared memory."""
+
+        (r, v, m) = nbody_numpy.random_system(10)
+
+        with SharedSystem(r, v, m, processes=2) as system:
+            names = [shm.name for shm in system._shm]
+
+        for name in names:
+            with self.assertRaises(FileNotFoundError):
+                SharedMemory(name=name)
+
+    def test_worker_failure(self):
+        """Verify that a worker that raises or is killed makes advance raise instead of hang."""
+
+        (r, v, m) = nbody_numpy.random_system(10)
+
+        with SharedSystem(r, v, m, processes=2) as system:
+            with self.assertRaises(TypeError):
+                system.advance('not a timestep', 1)
+
+        with SharedSystem(r, v, m, processes=2) as system:
+            system.advance(1e-4, 1)
+            os.kill(system._workers[0].pid, signal.SIGKILL)
+
+            with self.assertRaises(RuntimeError):
+                system.advance(1e-4, 1)
+
+        self.assertFalse(any(worker.is_alive() for worker in system._workers))
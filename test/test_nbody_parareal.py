@@ -0,0 +1,62 @@
+"""
+    Danny Vilela
+
+    Unit tests for the Parareal driver in `nbody_parareal.py`. To run these
+    tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+from copy import deepcopy
+import nbody_numpy
+from nbody import BODIES
+from nbody_parareal import *
+
+
+class _Serial(object):
+    """Executor that runs fine solves in this process."""
+
+    def map(self, function, tasks):
+        return [function(task) for task in tasks]
+
+
+def _solar():
+    (names, r, v, m) = nbody_numpy.from_bodies(deepcopy(BODIES))
+    nbody_numpy.offset_momentum(v, m, nbody_numpy.reference_index(names, 'sun'))
+    return r, v, m
+
+
+class PararealTest(unittest.TestCase):
+
+    def test_converges_to_fine_solution(self):
+        """Verify that Parareal reproduces the serial fine run, window by window."""
+
+        (r, v, m) = _solar()
+        (r2, v2) = (r.copy(), v.copy())
+        nbody_numpy.advance(0.01, 4000, r2, v2, m)
+
+        history = parareal(0.01, 4000, r, v, m, slices=4, window=2000, ratio=25,
+                           tolerance=1e-10, fine='numpy', executor=_Serial())
+
+        self.assertEqual(len(history), 2)
+        self.assertTrue(all(len(changes) <= 4 for changes in history))
+        np.testing.assert_allclose(r, r2, atol=1e-8)
+
+    def test_exact_after_all_slices(self):
+        """Verify that P iterations over P slices give the fine run exactly."""
+
+        (r, v, m) = _solar()
+        (r2, v2) = (r.copy(), v.copy())
+        nbody_numpy.advance(0.01, 400, r2, v2, m)
+
+        (changes,) = parareal(0.01, 400, r, v, m, slices=4, ratio=5, tolerance=0.0,
+                              fine='numpy', executor=_Serial())
+
+        self.assertEqual(len(changes), 4)
+        np.testing.assert_allclose(r, r2, atol=1e-12)
+
+    def test_uneven_split(self):
+        with self.assertRaises(ValueError):
+            parareal(0.01, 1000, *_solar(), slices=3, executor=_Serial())
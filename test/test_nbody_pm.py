@@ -0,0 +1,39 @@
+"""
+    Danny Vilela
+
+    Unit tests for the particle-mesh backend in `nbody_pm.py`. To run these
+    tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+from nbody_pm import *
+
+
+class ParticleMeshTest(unittest.TestCase):
+
+    def test_deposit(self):
+        """Verify that CIC deposit conserves mass, including across the boundary."""
+
+        positions = np.array([[0.0, 0.0, 0.0], [0.999, 0.5, 0.25], [0.3, 0.7, 0.1]])
+        masses = np.array([1.0, 2.0, 3.0])
+        rho = deposit(positions, masses, 1.0, grid=16)
+        self.assertAlmostEqual(rho.sum() / 16 ** 3, masses.sum())
+
+    def test_two_body(self):
+        """Verify that a well-resolved pair feels roughly an inverse-square force."""
+
+        positions = np.array([[0.45, 0.5, 0.5], [0.55, 0.5, 0.5]])
+        masses = np.array([1.0, 1e-9])
+        acc = accelerations(positions, masses, 1.0, grid=128)
+        self.assertAlmostEqual(acc[1, 0] / -100.0, 1.0, delta=0.05)
+
+    def test_momentum(self):
+        """Verify that the mesh forces conserve total momentum."""
+
+        positions = np.random.default_rng(1).uniform(0.0, 1.0, size=(500, 3))
+        masses = np.full(500, 1.0 / 500)
+        acc = accelerations(positions, masses, 1.0, grid=32, softening=0.01)
+        np.testing.assert_allclose(masses @ acc, 0.0, atol=1e-12)
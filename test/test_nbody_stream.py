@@ -0,0 +1,76 @@
+"""
+    Danny Vilela
+
+    Unit tests for the streaming API in `nbody_stream.py`. To run these tests
+    from the terminal, run the following from the project's root directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+from unittest import mock
+from copy import deepcopy
+from itertools import islice
+import numpy as np
+import nbody_numpy
+from nbody import BODIES
+from nbody_stream import *
+
+
+class StreamTest(unittest.TestCase):
+
+    def test_matches_advance(self):
+        """Verify that streaming follows the same trajectory as plain advance, and rejects every < 1."""
+
+        (r, v, m) = nbody_numpy.random_system(16)
+        (r0, v0) = (r.copy(), v.copy())
+
+        states = list(simulate(r, v, m, dt=0.001, every=4, steps=10))
+        self.assertEqual([state.step for state in states], [0, 4, 8, 10])
+
+        nbody_numpy.advance(0.001, 10, r0, v0, m)
+        np.testing.assert_array_equal(states[-1].positions, r0)
+
+        for every in (0, -2):
+            with self.assertRaises(ValueError):
+                simulate(r, v, m, every=every)
+
+    def test_views_are_read_only_and_lazy(self):
+        """Verify that states are uncopied, read-only and refuse stale energies."""
+
+        (r, v, m) = nbody_numpy.random_system(8)
+        states = simulate(r, v, m, dt=0.001, every=2)
+
+        first = next(states)
+        kept = first.copy()
+        self.assertTrue(np.shares_memory(first.positions, r))
+
+        with self.assertRaises(ValueError):
+            first.positions[0, 0] = 1.0
+
+        second = next(states)
+        next(states)
+        self.assertTrue(second.stale)
+        with self.assertRaises(RuntimeError):
+            second.energy
+
+        self.assertEqual(kept.energy, nbody_numpy.report_energy(kept.positions, kept.velocities, m))
+
+    def test_chained_stages(self):
+        """Verify that monitor passes states through and nbody matches the array engine, one energy per loop."""
+
+        states = list(islice(monitor(stream('sun', deepcopy(BODIES), every=100), 1e-3), 5))
+        self.assertEqual(states[-1].step, 400)
+
+        bodies = deepcopy(BODIES)
+        expected = []
+        (names, r, v, m) = nbody_numpy.from_bodies(bodies)
+        nbody_numpy.offset_momentum(v, m, nbody_numpy.reference_index(names, 'sun'))
+        for _ in range(3):
+            nbody_numpy.advance(0.01, 50, r, v, m)
+            expected.append(nbody_numpy.report_energy(r, v, m))
+
+        with mock.patch('nbody_numpy.report_energy', wraps=nbody_numpy.report_energy) as energy:
+            self.assertEqual(nbody(3, 'sun', 50, deepcopy(BODIES)), expected)
+
+        self.assertEqual(energy.call_count, 3)
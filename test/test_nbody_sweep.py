@@ -0,0 +1,73 @@
+"""
+    Danny Vilela
+
+    Unit tests for the cached parameter sweeps in `nbody_sweep.py`. To run
+    these tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import os
+import tempfile
+import unittest
+from nbody import BODIES
+from nbody_sweep import *
+
+
+class SweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_keys(self):
+        """Verify that keys follow the inputs: equal jobs share one, any change gives another."""
+
+        base = key(job(BODIES, 0.01, 100, 'numpy'))
+
+        self.assertEqual(base, key(job(perturbed(BODIES, 0.0), 0.01, 100, 'numpy')))
+        self.assertNotEqual(base, key(job(perturbed(BODIES, 1e-9), 0.01, 100, 'numpy')))
+        self.assertNotEqual(base, key(job(BODIES, 0.02, 100, 'numpy')))
+        self.assertNotEqual(base, key(job(BODIES, 0.01, 101, 'numpy')))
+        self.assertNotEqual(base, key(job(BODIES, 0.01, 100, 'python')))
+        self.assertNotEqual(base, key(job(dict(reversed(list(BODIES.items()))), 0.01, 100, 'numpy')))
+
+    def test_sweep_is_cached(self):
+        """Verify that a rerun sweep is served from the cache with identical results."""
+
+        cache = ResultCache(self.directory.name)
+        jobs = grid(BODIES, dts=(0.01, 0.02), steps=(50,), scales=(0.0, 1e-6), seeds=(0, 1),
+                    engine='numpy')
+
+        (results, hits) = sweep(jobs, cache, processes=2)
+        self.assertEqual(hits, 0)
+        self.assertEqual(len(os.listdir(self.directory.name)), 6)
+
+        (again, hits) = sweep(jobs, cache, processes=2)
+        self.assertEqual(hits, 8)
+        self.assertEqual(again, results)
+
+        # The cached result is the one a fresh run gives.
+        self.assertEqual(results[-1]['bodies'], run(jobs[-1])['bodies'])
+
+    def test_eviction(self):
+        """Verify that writes past the size limit evict the least recently used results."""
+
+        cache = ResultCache(self.directory.name, max_bytes=250)
+        result = {'payload': 'x' * 100}
+
+        for (t, name) in enumerate('abc'):
+            cache.put(name, result)
+            os.utime(os.path.join(self.directory.name, name + '.json'), (t, t))
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), result)
+
+        cache.put('d', result)
+
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.get('b'), result)
+        self.assertLessEqual(cache.size(), 250)
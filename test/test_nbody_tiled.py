@@ -0,0 +1,57 @@
+"""
+    Danny Vilela
+
+    Unit tests for the tiled force kernel in `nbody_tiled.py`. To run these
+    tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+import nbody_engines
+import nbody_numpy
+from nbody_tiled import *
+
+
+class TiledTest(unittest.TestCase):
+
+    def test_schedule(self):
+        """Verify that rounds cover every block pair once and never reuse a block."""
+
+        for blocks in (1, 2, 5, 8):
+            seen = set()
+
+            for round_pairs in schedule(blocks):
+                used = [b for pair in round_pairs for b in pair if b >= 0]
+                self.assertEqual(len(used), len(set(used)))
+                seen |= {tuple(sorted(pair)) for pair in round_pairs.tolist() if pair[0] >= 0}
+
+            self.assertEqual(len(seen), blocks * (blocks - 1) // 2)
+
+    def test_numpy_kernel(self):
+        """Verify the tiled kernel against direct summation, for ragged last tiles too."""
+
+        (r, _, m) = nbody_numpy.random_system(300)
+        expected = nbody_numpy.accelerations(r, m)
+
+        for tile in (32, 100, 512):
+            np.testing.assert_allclose(accelerations(r, m, tile=tile), expected, rtol=1e-10, atol=1e-12)
+
+    @unittest.skipUnless(nbody_engines.available('numba'), 'numba is not installed')
+    def test_numba_kernel(self):
+        """Verify that the threaded Numba kernel follows the same trajectory."""
+
+        (r, v, m) = nbody_numpy.random_system(200)
+        (r2, v2) = (r.copy(), v.copy())
+
+        advance(1e-3, 3, r, v, m, tile=48, kernel='numba')
+        nbody_numpy.advance(1e-3, 3, r2, v2, m)
+
+        np.testing.assert_allclose(r, r2, rtol=1e-10, atol=1e-12)
+
+    def test_unknown_kernel(self):
+        """Verify that an unknown kernel name is rejected."""
+
+        with self.assertRaises(ValueError):
+            advance(1e-3, 1, *nbody_numpy.random_system(4), kernel='fortran')
@@ -0,0 +1,114 @@
+"""
+    Danny Vilela
+
+    Unit tests for the trajectory recorder in `nbody_trajectory.py`. To run
+    these tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from copy import deepcopy
+import nbody_numpy
+from nbody import BODIES
+from nbody_trajectory import *
+
+
+class TrajectoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'run.traj')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_append_and_grow(self):
+        """Verify that snapshots survive the file growing past its first chunk."""
+
+        (r, v, m) = nbody_numpy.random_system(7)
+
+        with TrajectoryWriter(self.path, m, {'dt': 0.5}, chunk=2) as writer:
+            for step in range(5):
+                writer.append(0.5 * step, step, r + step, v - step)
+            self.assertEqual(len(writer), 5)
+
+        (masses, snapshots, metadata) = read_trajectory(self.path)
+        np.testing.assert_array_equal(masses, m)
+        np.testing.assert_array_equal(snapshots['step'], np.arange(5))
+        np.testing.assert_array_equal(snapshots['positions'][3], r + 3)
+        self.assertEqual(metadata, {'dt': 0.5})
+
+    def test_reopen_and_restart(self):
+        """Verify that a reopened file appends and restarts from its last snapshot."""
+
+        (r, v, m) = nbody_numpy.random_system(3)
+
+        with TrajectoryWriter(self.path, m) as writer:
+            writer.append(0.0, 0, r, v)
+
+        with TrajectoryWriter(self.path) as writer:
+            writer.append(1.0, 10, 2 * r, 2 * v)
+
+        (time, step, positions, velocities, masses, _) = restart(self.path)
+        self.assertEqual((time, step), (1.0, 10))
+        np.testing.assert_array_equal(positions, 2 * r)
+
+    def test_uncommitted_snapshot_is_ignored(self):
+        """Verify that data past the committed count is not visible."""
+
+        (r, v, m) = nbody_numpy.random_system(3)
+
+        with TrajectoryWriter(self.path, m) as writer:
+            writer.append(0.0, 0, r, v)
+
+            # Simulate a crash between writing data and bumping the index.
+            writer._data['step'][1] = 99
+
+        self.assertEqual(restart(self.path)[1], 0)
+
+    def test_not_a_trajectory(self):
+        """Verify that other files are rejected."""
+
+        with open(self.path, 'wb') as f:
+            f.write(b'not a trajectory')
+
+        with self.assertRaises(ValueError):
+            read_header(self.path)
+
+    def test_resume(self):
+        """Verify that a resumed run ends where an uninterrupted one does."""
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            nbody(2, 'sun', 5, deepcopy(BODIES), self.path)
+            nbody(4, 'sun', 5, deepcopy(BODIES), self.path)
+
+            other = os.path.join(self.directory.name, 'other.traj')
+            nbody(4, 'sun', 5, deepcopy(BODIES), other)
+
+        (_, resumed, _) = read_trajectory(self.path)
+        (_, straight, _) = read_trajectory(other)
+        np.testing.assert_array_equal(resumed['step'], straight['step'])
+        np.testing.assert_array_equal(resumed['positions'], straight['positions'])
+
+    def test_resume_mismatch(self):
+        """Verify that resuming with a different dt, iterations or body count is rejected."""
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            nbody(1, 'sun', 5, deepcopy(BODIES), self.path)
+
+        bodies = deepcopy(BODIES)
+        del bodies['neptune']
+
+        for (arguments, kwargs) in [((5, deepcopy(BODIES)), {'dt': 0.02}),
+                                    ((10, deepcopy(BODIES)), {}),
+                                    ((5, bodies), {})]:
+            with self.assertRaises(ValueError):
+                nbody(2, 'sun', *arguments, self.path, **kwargs)
+
+        self.assertEqual(len(read_trajectory(self.path)[1]), 2)
@@ -0,0 +1,49 @@
+"""
+    Danny Vilela
+
+    Unit tests for the Barnes-Hut backend in `nbody_tree.py`. To run these
+    tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+import nbody_numpy
+from nbody_tree import *
+
+
+class TreeTest(unittest.TestCase):
+
+    def test_build(self):
+        """Verify that every cell's mass and children add up."""
+
+        (r, _, m) = nbody_numpy.random_system(500)
+        tree = build_tree(r, m, leaf_size=4)
+
+        self.assertAlmostEqual(tree.mass[0], m.sum())
+        self.assertEqual(tree.count[0], 500)
+
+        for cell in np.flatnonzero(tree.n_children):
+            children = slice(tree.first_child[cell], tree.first_child[cell] + tree.n_children[cell])
+            self.assertEqual(tree.count[children].sum(), tree.count[cell])
+            self.assertAlmostEqual(tree.mass[children].sum(), tree.mass[cell])
+
+        self.assertTrue((tree.count[tree.n_children == 0] <= 4).all())
+
+    def test_theta_zero_is_exact(self):
+        """Verify that never accepting a cell reproduces direct summation."""
+
+        (r, v, m) = nbody_numpy.random_system(300)
+        np.testing.assert_allclose(accelerations(r, m, theta=0.0),
+                                   nbody_numpy.accelerations(r, m), rtol=1e-10)
+        self.assertAlmostEqual(report_energy(r, v, m, theta=0.0),
+                               nbody_numpy.report_energy(r, v, m))
+
+    def test_accuracy(self):
+        """Verify that the default opening angle stays close to the direct sum."""
+
+        (r, _, m) = nbody_numpy.random_system(1000)
+        exact = nbody_numpy.accelerations(r, m)
+        err = np.linalg.norm(accelerations(r, m) - exact, axis=1) / np.linalg.norm(exact, axis=1)
+        self.assertLess(np.median(err), 1e-2)
@@ -0,0 +1,64 @@
+"""
+    Danny Vilela
+
+    Unit tests for the Wisdom-Holman integrator in `nbody_wh.py`. To run
+    these tests from the terminal, run the following from the project's root
+    directory
+
+        $ python -m unittest discover
+"""
+
+import unittest
+from copy import deepcopy
+import nbody_integrators
+import nbody_numpy
+from nbody import BODIES
+from nbody_wh import *
+
+
+class WisdomHolmanTest(unittest.TestCase):
+
+    def test_kepler_period(self):
+        """Verify that a circular orbit returns to its start after one period."""
+
+        r = np.array([[1.0, 0.0, 0.0]])
+        v = np.array([[0.0, 1.0, 0.0]])
+        kepler_drift(2 * np.pi, r, v, np.array([1.0]))
+        np.testing.assert_allclose(r, [[1.0, 0.0, 0.0]], atol=1e-12)
+        np.testing.assert_allclose(v, [[0.0, 1.0, 0.0]], atol=1e-12)
+
+    def test_kepler_orbit_types(self):
+        """Verify the Kepler drift against direct integration for elliptic and hyperbolic orbits."""
+
+        for velocity in ([0.0, 0.9, 0.3], [0.0, 2.0, 0.0]):
+            r = np.array([[1.0, 0.0, 0.1]])
+            v = np.array([velocity])
+            kepler_drift(3.0, r, v, np.array([1.0]))
+
+            positions = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.1]])
+            velocities = np.array([[0.0, 0.0, 0.0], velocity])
+            nbody_integrators.advance(1e-3, 3000, positions, velocities,
+                                      np.array([1.0, 1e-300]), 'yoshida6')
+            np.testing.assert_allclose(r[0], positions[1], atol=1e-10)
+
+    def test_solar_system(self):
+        """Verify that both coordinate systems track an accurate reference run."""
+
+        (_, r_ref, v_ref, m) = nbody_numpy.from_bodies(deepcopy(BODIES))
+        nbody_numpy.offset_momentum(v_ref, m, 0)
+        e0 = nbody_numpy.report_energy(r_ref, v_ref, m)
+        (r0, v0) = (r_ref.copy(), v_ref.copy())
+        nbody_integrators.advance(0.01, 2000, r_ref, v_ref, m, 'yoshida6')
+
+        for coordinates in COORDINATES:
+            (r, v) = (r0.copy(), v0.copy())
+            advance(0.1, 200, r, v, m, coordinates)
+            np.testing.assert_allclose(r, r_ref, atol=1e-4)
+            self.assertLess(abs(nbody_numpy.report_energy(r, v, m) / e0 - 1), 1e-5)
+
+    def test_unknown(self):
+        """Verify that unknown coordinates raise a ValueError."""
+
+        (r, v, m) = nbody_numpy.random_system(3)
+        with self.assertRaises(ValueError):
+            advance(0.1, 1, r, v, m, coordinates='barycentric')